@@ -0,0 +1,493 @@
+# benchmarks/fake_salesforce.py
+
+import csv
+import io
+import itertools
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from simple_salesforce.exceptions import SalesforceGeneralError
+
+# Campos do describe que o fake preenche
+_FIELD_DEFAULTS = {
+    'relationshipName': None, 'nillable': True, 'defaultedOnCreate': False, 'externalId': False,
+    'idLookup': False, 'calculated': False, 'autoNumber': False,
+}
+
+_SELECT = re.compile(
+    r"^SELECT (?P<fields>.+?) FROM (?P<object>\w+)"
+    r"(?: WHERE (?P<where>.+?))?(?: ORDER BY (?P<order>\w+(?:, \w+)*))?(?: LIMIT (?P<limit>\d+))?$",
+    re.IGNORECASE | re.DOTALL,
+)
+_CONDITION = re.compile(r"^(?P<field>\w+) (?P<op>IN|!=|=|>|>=|<|<=) (?P<value>.+)$", re.IGNORECASE | re.DOTALL)
+_LITERAL = re.compile(r"'((?:[^'\\]|\\.)*)'|([\w:.+-]+)")
+
+
+def field(name, type='string', reference_to=None, createable=True, updateable=True, **extra):
+    """Monta a definição de um campo no formato do describe."""
+    definition = dict(_FIELD_DEFAULTS, name=name, type=type, referenceTo=[reference_to] if reference_to else [],
+                      createable=createable, updateable=updateable)
+    definition.update(extra)
+    return definition
+
+
+def standard_fields():
+    """Campos presentes em todo objeto do fake."""
+    return [
+        field('Id', 'id', createable=False, updateable=False),
+        field('Name'),
+        field('SystemModstamp', 'datetime', createable=False, updateable=False),
+        field('CreatedDate', 'datetime', createable=False, updateable=False),
+    ]
+
+
+class _Response:
+    """Resposta HTTP mínima, compatível com o que o código lê de `requests.Response`."""
+
+    def __init__(self, status_code, payload=None, text=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = text if text is not None else ''
+        self.headers = headers or {}
+        self.content = self.text.encode('utf-8')
+        self.url = ''
+
+    def json(self, **kwargs):
+        return self._payload
+
+
+class FakeOrg:
+    """
+    Org Salesforce em memória: esquema, registros e estatísticas de chamadas.
+    Uma instância pode ser compartilhada por vários `FakeSalesforce` (threads).
+    """
+
+    def __init__(self, name, schema, latency=0.0, row_error_rate=0.0, http_error_rate=0.0, seed=0):
+        self.name = name
+        self.schema = schema
+        self._fields = {obj: {item['name']: item for item in fields} for obj, fields in schema.items()}
+        self.latency = latency
+        self.row_error_rate = row_error_rate
+        self.http_error_rate = http_error_rate
+        self.records = defaultdict(dict)
+        self.deleted = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.latencies = defaultdict(list)
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._cursors = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def new_id(self, object_name):
+        prefix = (object_name[:3].upper() + 'XXX')[:3]
+        return f"{prefix}{next(self._ids):015d}"
+
+    def add_records(self, object_name, rows):
+        """Carrega registros de origem (sem passar pela contagem de chamadas)."""
+        stamp = '2024-01-01T00:00:00.000+0000'
+        for row in rows:
+            row.setdefault('Id', self.new_id(object_name))
+            row.setdefault('SystemModstamp', stamp)
+            row.setdefault('CreatedDate', stamp)
+            self.records[object_name][row['Id']] = row
+
+    def count(self, object_name):
+        return len(self.records.get(object_name, {}))
+
+    def call(self, endpoint, handler):
+        """Simula latência e erros de rede e registra a chamada."""
+        start = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[endpoint] += 1
+            fail = self.http_error_rate and self._random.random() < self.http_error_rate
+        if fail:
+            raise SalesforceGeneralError(endpoint, 503, endpoint, [{'errorCode': 'SERVER_UNAVAILABLE', 'message': 'Injected'}])
+        try:
+            with self._lock:
+                return handler()
+        finally:
+            self.latencies[endpoint].append(time.perf_counter() - start)
+
+    def row_fails(self):
+        return self.row_error_rate and self._random.random() < self.row_error_rate
+
+    # SOQL ------------------------------------------------------------------
+
+    def run_query(self, soql, batch_size=2000):
+        match = _SELECT.match(' '.join(soql.split()))
+        if not match:
+            raise ValueError(f"SOQL não suportada pelo fake: {soql}")
+        object_name = match['object']
+        rows = list(self.records.get(object_name, {}).values())
+        if match['where']:
+            rows = [row for row in rows if _matches(row, match['where'])]
+        if match['order']:
+            order = [name.strip() for name in match['order'].split(',')]
+            rows.sort(key=lambda row: [(row.get(name) is None, row.get(name) or '') for name in order])
+        if match['limit']:
+            rows = rows[:int(match['limit'])]
+
+        if match['fields'].strip().upper() == 'COUNT()':
+            return {'totalSize': len(rows), 'done': True, 'records': []}
+
+        fields = [name.strip() for name in match['fields'].split(',')]
+        records = [
+            dict({'attributes': {'type': object_name}}, **{name: row.get(name) for name in fields})
+            for row in rows
+        ]
+        return self._page(records, batch_size)
+
+    def next_page(self, locator):
+        records, batch_size = self._cursors.pop(locator)
+        return self._page(records, batch_size)
+
+    def _page(self, records, batch_size):
+        page, rest = records[:batch_size], records[batch_size:]
+        result = {'totalSize': len(records), 'done': not rest, 'records': page}
+        if rest:
+            locator = f"01g{next(self._ids):015d}"
+            self._cursors[locator] = (rest, batch_size)
+            result['nextRecordsUrl'] = f"/services/data/v59.0/query/{locator}"
+        return result
+
+    # Escrita ---------------------------------------------------------------
+
+    def insert(self, object_name, values):
+        if self.row_fails():
+            return _row_error('UNABLE_TO_LOCK_ROW', 'Injected lock error')
+        invalid = [name for name in values if not self._writable(object_name, name, 'createable')]
+        if invalid:
+            return _row_error('INVALID_FIELD_FOR_INSERT_UPDATE', 'Unable to create/update fields', invalid)
+        record_id = self.new_id(object_name)
+        self.records[object_name][record_id] = dict(values, Id=record_id, SystemModstamp=_now())
+        return {'id': record_id, 'success': True, 'errors': []}
+
+    def update(self, object_name, values):
+        if self.row_fails():
+            return _row_error('UNABLE_TO_LOCK_ROW', 'Injected lock error')
+        row = self.records.get(object_name, {}).get(values.get('Id'))
+        if row is None:
+            return _row_error('ENTITY_IS_DELETED', 'Registro inexistente')
+        row.update((k, v) for k, v in values.items() if k != 'Id')
+        row['SystemModstamp'] = _now()
+        return {'id': row['Id'], 'success': True, 'errors': []}
+
+    def upsert(self, object_name, external_id_field, values):
+        key = values.get(external_id_field)
+        for row in self.records.get(object_name, {}).values():
+            if key is not None and row.get(external_id_field) == key:
+                return dict(self.update(object_name, dict(values, Id=row['Id'])), created=False)
+        return dict(self.insert(object_name, values), created=True)
+
+    def insert_graph(self, graph):
+        """Insere os nós do grafo em ordem, resolvendo @{ref.id}; tudo ou nada."""
+        created = {}
+        for node in graph['compositeRequest']:
+            object_name = node['url'].rstrip('/').rsplit('/', 1)[-1]
+            values = {
+                k: created[v[2:-4]][0] if isinstance(v, str) and v.startswith('@{') else v
+                for k, v in node['body'].items()
+            }
+            result = self.insert(object_name, values)
+            if not result['success']:
+                for record_id, name in created.values():
+                    self.records[name].pop(record_id, None)
+                errors = [{'errorCode': e['statusCode'], 'message': e['message'], 'fields': e['fields']} for e in result['errors']]
+                halted = [{'errorCode': 'PROCESSING_HALTED', 'message': 'Grafo não processado'}]
+                return {'graphId': graph['graphId'], 'isSuccessful': False, 'graphResponse': {'compositeResponse': [
+                    {'referenceId': other['referenceId'], 'httpStatusCode': 400,
+                     'body': errors if other is node else halted}
+                    for other in graph['compositeRequest']
+                ]}}
+            created[node['referenceId']] = (result['id'], object_name)
+        return {'graphId': graph['graphId'], 'isSuccessful': True, 'graphResponse': {'compositeResponse': [
+            {'referenceId': ref, 'httpStatusCode': 201, 'body': {'id': record_id, 'success': True, 'errors': []}}
+            for ref, (record_id, _) in created.items()
+        ]}}
+
+    def delete(self, record_id):
+        for object_name, rows in self.records.items():
+            if rows.pop(record_id, None) is not None:
+                self.deleted[object_name].append({'id': record_id, 'deletedDate': _now()})
+                return {'id': record_id, 'success': True, 'errors': []}
+        return _row_error('ENTITY_IS_DELETED', 'Registro inexistente')
+
+    def _writable(self, object_name, name, flag):
+        definition = self._fields[object_name].get(name)
+        return definition is not None and definition[flag]
+
+    # Bulk API 2.0 ----------------------------------------------------------
+
+    def create_job(self, spec):
+        job_id = f"750{next(self._ids):015d}"
+        self._jobs[job_id] = dict(spec, state='Open', data='')
+        return {'id': job_id, 'state': 'Open'}
+
+    def upload_job(self, job_id, data):
+        self._jobs[job_id]['data'] += data
+
+    def close_job(self, job_id):
+        job = self._jobs[job_id]
+        reader = csv.DictReader(io.StringIO(job['data']))
+        columns = reader.fieldnames or []
+        successes, failures = [], []
+        for row in reader:
+            # Como no Bulk API 2.0: célula vazia não altera o campo e #N/A grava nulo
+            values = {k: (None if v == '#N/A' else v) for k, v in row.items() if v != ''}
+            if job['operation'] == 'insert':
+                result = self.insert(job['object'], values)
+            elif job['operation'] == 'update':
+                result = self.update(job['object'], values)
+            elif job['operation'] == 'delete':
+                result = self.delete(values['Id'])
+            else:
+                result = self.upsert(job['object'], job['externalIdFieldName'], values)
+            if result['success']:
+                successes.append([result['id'], 'true'] + [row[c] for c in columns])
+            else:
+                error = result['errors'][0]
+                failures.append(['', f"{error['statusCode']}:{error['message']}:{','.join(error['fields'])} --"]
+                                + [row[c] for c in columns])
+        job['results'] = {
+            'successfulResults': _csv(['sf__Id', 'sf__Created'] + columns, successes),
+            'failedResults': _csv(['sf__Id', 'sf__Error'] + columns, failures),
+        }
+        job['state'] = 'JobComplete'
+
+
+class FakeSalesforce:
+    """
+    Substituto de `simple_salesforce.Salesforce` ligado a uma `FakeOrg`.
+    Implementa as partes da API usadas pela ferramenta: describe, query/query_more,
+    restful (composite), sessão HTTP para jobs/ingest e describes condicionais, e limits.
+    """
+
+    def __init__(self, org, sf_version='59.0'):
+        self.org = org
+        self.sf_instance = f"{org.name}.my.salesforce.com"
+        self.sf_version = sf_version
+        self.base_url = f"https://{self.sf_instance}/services/data/v{sf_version}/"
+        self.headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer fake'}
+        self.session = _FakeSession(self)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _FakeSObject(self, name)
+
+    def query(self, query, include_deleted=False, **kwargs):
+        batch_size = _batch_size(kwargs.get('headers'))
+        endpoint = 'count' if 'COUNT()' in query.upper() else 'query'
+        return self.org.call(endpoint, lambda: self.org.run_query(query, batch_size))
+
+    def query_more(self, next_records_identifier, identifier_is_url=False, include_deleted=False, **kwargs):
+        locator = next_records_identifier.rstrip('/').rsplit('/', 1)[-1]
+        return self.org.call('query_more', lambda: self.org.next_page(locator))
+
+    def query_all(self, query, include_deleted=False, **kwargs):
+        result = self.query(query, **kwargs)
+        records = list(result['records'])
+        while not result['done']:
+            result = self.query_more(result['nextRecordsUrl'], identifier_is_url=True)
+            records.extend(result['records'])
+        return {'totalSize': len(records), 'done': True, 'records': records}
+
+    def limits(self, **kwargs):
+        return self.org.call('limits', lambda: {
+            'DataStorageMB': {'Max': 1024 * 1024, 'Remaining': 1024 * 1024},
+            'DailyApiRequests': {'Max': 10 ** 9, 'Remaining': 10 ** 9},
+        })
+
+    def restful(self, path, params=None, method='GET', **kwargs):
+        payload = kwargs.get('json')
+        if path == 'composite/batch':
+            return self.org.call('composite_batch', lambda: self._describe_batch(payload))
+        if path == 'composite/sobjects' and method == 'POST':
+            return self.org.call('collections_insert', lambda: [
+                self.org.insert(record['attributes']['type'], _body(record)) for record in payload['records']
+            ])
+        if path == 'composite/sobjects' and method == 'PATCH':
+            return self.org.call('collections_update', lambda: [
+                self.org.update(record['attributes']['type'], _body(record)) for record in payload['records']
+            ])
+        if path.startswith('composite/sobjects/') and method == 'PATCH':
+            object_name, external_id_field = path.split('/')[2:4]
+            return self.org.call('collections_upsert', lambda: [
+                self.org.upsert(object_name, external_id_field, _body(record)) for record in payload['records']
+            ])
+        if path == 'composite/graph' and method == 'POST':
+            return self.org.call('composite_graph', lambda: {
+                'graphs': [self.org.insert_graph(graph) for graph in payload['graphs']]
+            })
+        if path == 'composite/sobjects' and method == 'DELETE':
+            return self.org.call('collections_delete', lambda: [
+                self.org.delete(record_id) for record_id in params['ids'].split(',')
+            ])
+        raise NotImplementedError(f"{method} {path} não suportado pelo fake")
+
+    def _describe_batch(self, payload):
+        results = []
+        for request in payload['batchRequests']:
+            object_name = request['url'].split('/')[2]
+            if object_name in self.org.schema:
+                results.append({'statusCode': 200, 'result': _describe(object_name, self.org.schema)})
+            else:
+                results.append({'statusCode': 404, 'result': [{'errorCode': 'NOT_FOUND'}]})
+        return {'hasErrors': any(r['statusCode'] != 200 for r in results), 'results': results}
+
+
+class _FakeSObject:
+    def __init__(self, sf, name):
+        self.sf = sf
+        self.name = name
+
+    def describe(self, headers=None):
+        return self.sf.org.call('describe', lambda: _describe(self.name, self.sf.org.schema))
+
+    def deleted(self, start, end, headers=None):
+        def handler():
+            start_text, end_text = (value.strftime('%Y-%m-%dT%H:%M:%S') for value in (start, end))
+            records = [item for item in self.sf.org.deleted[self.name] if start_text <= item['deletedDate'][:19] <= end_text]
+            return {'deletedRecords': records, 'earliestDateAvailable': start_text + '.000+0000',
+                    'latestDateCovered': end_text + '.000+0000'}
+        return self.sf.org.call('deleted', handler)
+
+
+class _FakeSession:
+    """Sessão HTTP falsa: describes (com If-Modified-Since) e o endpoint jobs/ingest."""
+
+    def __init__(self, sf):
+        self.sf = sf
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def request(self, method, url, headers=None, **kwargs):
+        org = self.sf.org
+        path = url[len(self.sf.base_url):]
+        headers = headers or {}
+
+        if path == 'sobjects':
+            return org.call('describe_global', lambda: _Response(304 if 'If-Modified-Since' in headers else 200, {'sobjects': []}))
+        if path.startswith('sobjects/') and path.endswith('/describe'):
+            object_name = path.split('/')[1]
+            if 'If-Modified-Since' in headers:
+                return org.call('describe', lambda: _Response(304))
+            return org.call('describe', lambda: _Response(200, _describe(object_name, org.schema)))
+
+        if path.startswith('jobs/ingest'):
+            parts = path.split('/')[2:]
+            if method == 'POST':
+                return org.call('bulk', lambda: _Response(200, org.create_job(kwargs['json'])))
+            if method == 'PUT':
+                data = kwargs['data'].decode('utf-8')
+                return org.call('bulk', lambda: _Response(201, org.upload_job(parts[0], data)))
+            if method == 'PATCH':
+                return org.call('bulk', lambda: _Response(200, org.close_job(parts[0])))
+            if len(parts) == 1:
+                return org.call('bulk', lambda: _Response(200, {'id': parts[0], 'state': org._jobs[parts[0]]['state']}))
+            return org.call('bulk', lambda: _Response(200, text=org._jobs[parts[0]]['results'][parts[1]]))
+
+        raise NotImplementedError(f"{method} {url} não suportado pelo fake")
+
+
+def _describe(object_name, schema):
+    return {'name': object_name, 'fields': [dict(item) for item in schema[object_name]]}
+
+
+def _body(record):
+    return {k: v for k, v in record.items() if k != 'attributes'}
+
+
+def _row_error(status_code, message, fields=None):
+    return {'id': None, 'success': False, 'errors': [{'statusCode': status_code, 'message': message, 'fields': fields or []}]}
+
+
+def _csv(header, rows):
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(rows)
+    return output.getvalue()
+
+
+def _batch_size(headers):
+    options = (headers or {}).get('Sforce-Query-Options', '')
+    match = re.search(r'batchSize=(\d+)', options)
+    return int(match.group(1)) if match else 2000
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+
+
+def _literals(text):
+    values = []
+    for quoted, bare in _LITERAL.findall(text):
+        values.append(quoted.replace("\\'", "'").replace('\\\\', '\\') if quoted or not bare else bare)
+    return values
+
+
+def _strip_parens(condition):
+    """Remove parênteses que envolvem a condição inteira, ignorando os que estão entre aspas."""
+    while condition.startswith('('):
+        depth, quoted = 0, False
+        for index, char in enumerate(condition):
+            if char == "'" and condition[index - 1:index] != '\\':
+                quoted = not quoted
+            elif not quoted and char == '(':
+                depth += 1
+            elif not quoted and char == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        if index != len(condition) - 1:
+            return condition
+        condition = condition[1:-1].strip()
+    return condition
+
+
+def _matches(row, where):
+    """
+    Avalia uma cláusula WHERE simples: condições ligadas por AND, com IN, =, !=, >, >=, <, <=.
+    Uma condição entre parênteses pode juntar alternativas com OR (sem aninhar AND dentro delas).
+    """
+    for condition in re.split(r'\s+AND\s+', _strip_parens(where.strip()), flags=re.IGNORECASE):
+        condition = _strip_parens(condition.strip())
+        alternatives = re.split(r'\s+OR\s+', condition, flags=re.IGNORECASE)
+        if len(alternatives) > 1:
+            if not any(_matches(row, alternative) for alternative in alternatives):
+                return False
+            continue
+        match = _CONDITION.match(condition)
+        if not match:
+            raise ValueError(f"Condição não suportada pelo fake: {condition}")
+        value = row.get(match['field'])
+        literals = _literals(match['value'])
+        op = match['op'].upper()
+        if op == 'IN':
+            if value not in literals:
+                return False
+            continue
+        if op == '!=':
+            if value == (None if match['value'].lower() == 'null' else literals[0]):
+                return False
+            continue
+        if value is None or not _COMPARE[op](value, literals[0]):
+            return False
+    return True
+
+
+_COMPARE = {
+    '=': lambda a, b: a == b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+}
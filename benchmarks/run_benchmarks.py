@@ -0,0 +1,351 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmarks de ponta a ponta contra orgs falsas em memória.
+
+Cada cenário roda em um processo separado (para medir o pico de memória
+isoladamente), executa `main.py` ou `controller.start_migration` contra
+`FakeSalesforce` e mede registros/s, latência p50/p99 por fase, chamadas de
+API por registro migrado e pico de RSS. Com um baseline gravado com os mesmos
+parâmetros (escala, workers, latência, taxas de erro), a execução falha se as
+chamadas de API por registro piorarem além da tolerância; tempo e memória
+variam com a máquina e só são informados.
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --scenario deep_chain --scale 0.1
+    python -m benchmarks.run_benchmarks --update-baseline
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce, field, standard_fields  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Agrupamento das chamadas do fake em fases da migração
+PHASES = {
+    'describe': ('describe', 'describe_global', 'composite_batch'),
+    'query': ('query', 'query_more', 'count'),
+    'load': ('collections_insert', 'collections_upsert', 'bulk', 'composite_graph'),
+    'update': ('collections_update', 'collections_delete'),
+}
+
+# Parâmetros da execução gravados no baseline; com parâmetros diferentes não há comparação
+RUN_PARAMETERS = ('scale', 'workers', 'latency', 'row_error_rate', 'http_error_rate')
+
+# Métricas determinísticas que reprovam a execução: (nome, maior é melhor)
+CHECKED_METRICS = (
+    ('api_calls_per_record', False),
+)
+# Métricas que dependem da máquina: gravadas no baseline e apenas informadas
+REPORTED_METRICS = ('records_migrated', 'records_per_second', 'peak_rss_mb', 'tool_rss_mb')
+
+
+# Cenários --------------------------------------------------------------------
+
+def _schema_with(objects):
+    return {name: standard_fields() + extra for name, extra in objects.items()}
+
+
+def deep_chain(scale):
+    """Cadeia de 8 níveis de lookup: cada nível referencia o seguinte."""
+    depth = 8
+    schema = _schema_with({
+        f"Level{i}__c": [field('Parent__c', 'reference', f"Level{i + 1}__c")] if i < depth else []
+        for i in range(depth + 1)
+    })
+    source = FakeOrg('source', schema)
+    roots = max(1, int(5000 * scale))
+    parent_ids = []
+    for level in range(depth, -1, -1):
+        count = roots if level == 0 else max(1, roots // (2 ** (depth - level + 1)))
+        rows = [{'Name': f"L{level}-{i}"} for i in range(count)]
+        if parent_ids:
+            for i, row in enumerate(rows):
+                row['Parent__c'] = parent_ids[i % len(parent_ids)]
+        source.add_records(f"Level{level}__c", rows)
+        parent_ids = [row['Id'] for row in rows]
+    return source, schema, 'Level0__c', 'main'
+
+
+def cycles(scale, extra_objects=None):
+    """Auto-relacionamento e ciclo entre Account e Contact, a partir de Opportunity."""
+    schema = _schema_with({
+        'Opportunity': [field('AccountId', 'reference', 'Account')],
+        'Account': [field('ParentId', 'reference', 'Account'), field('PrimaryContact__c', 'reference', 'Contact')],
+        'Contact': [field('AccountId', 'reference', 'Account')],
+        **(extra_objects or {}),
+    })
+    source = FakeOrg('source', schema)
+    accounts = [{'Name': f"Account {i}"} for i in range(max(2, int(500 * scale)))]
+    source.add_records('Account', accounts)
+    contacts = [{'Name': f"Contact {i}", 'AccountId': accounts[i % len(accounts)]['Id']} for i in range(len(accounts))]
+    source.add_records('Contact', contacts)
+    for i, account in enumerate(accounts):
+        account['ParentId'] = accounts[i // 2]['Id'] if i else None
+        account['PrimaryContact__c'] = contacts[i]['Id']
+    source.add_records('Opportunity', [
+        {'Name': f"Opportunity {i}", 'AccountId': accounts[i % len(accounts)]['Id']} for i in range(max(1, int(5000 * scale)))
+    ])
+    return source, schema, 'Opportunity', 'main'
+
+
+def cycles_controller(scale):
+    """Os mesmos ciclos, pelo controlador: objetos inteiros, com os lookups adiados preenchidos por camada."""
+    source, schema, root, _ = cycles(scale)
+    return source, schema, root, 'controller'
+
+
+def wide(scale):
+    """Objeto com 300 campos de texto e alguns campos não graváveis."""
+    extra = [field(f"Text{i}__c") for i in range(300)] + [field(f"Formula{i}__c", createable=False, updateable=False) for i in range(5)]
+    schema = _schema_with({'Wide__c': extra})
+    source = FakeOrg('source', schema)
+    source.add_records('Wide__c', [
+        dict({f"Text{i}__c": f"valor {n}-{i}" for i in range(300)}, Name=f"Wide {n}") for n in range(max(1, int(5000 * scale)))
+    ])
+    return source, schema, 'Wide__c', 'controller'
+
+
+def large(scale):
+    """100 mil linhas com dois pais compartilhados, pelo controlador (objetos inteiros)."""
+    schema = _schema_with({
+        'Line__c': [field('Product__c', 'reference', 'Product__c'), field('Order__c', 'reference', 'Order__c')],
+        'Product__c': [],
+        'Order__c': [],
+    })
+    source = FakeOrg('source', schema)
+    lines = max(1, int(100000 * scale))
+    products = [{'Name': f"Product {i}"} for i in range(max(1, lines // 100))]
+    orders = [{'Name': f"Order {i}"} for i in range(max(1, lines // 10))]
+    source.add_records('Product__c', products)
+    source.add_records('Order__c', orders)
+    source.add_records('Line__c', [
+        {'Name': f"Line {i}", 'Product__c': products[i % len(products)]['Id'], 'Order__c': orders[i % len(orders)]['Id']}
+        for i in range(lines)
+    ])
+    return source, schema, 'Line__c', 'controller'
+
+
+def deep_chain_graph(scale):
+    """A mesma cadeia de 8 níveis, carregada pelo Composite Graph API."""
+    source, schema, root, _ = deep_chain(scale)
+    return source, schema, root, 'main --loader graph'
+
+
+def multi_root(scale):
+    """Opportunity e Contract no mesmo job, compartilhando Account e Contact."""
+    source, schema, root, _ = cycles(scale, {'Contract': [field('AccountId', 'reference', 'Account')]})
+    accounts = list(source.records['Account'])
+    source.add_records('Contract', [
+        {'Name': f"Contract {i}", 'AccountId': accounts[(7 * i) % len(accounts)]} for i in range(max(1, int(2000 * scale)))
+    ])
+    return source, schema, root, 'main --object Contract'
+
+
+SCENARIOS = {
+    'deep_chain': deep_chain,
+    'deep_chain_graph': deep_chain_graph,
+    'cycles': cycles,
+    'cycles_controller': cycles_controller,
+    'wide': wide,
+    'large': large,
+    'multi_root': multi_root,
+}
+
+
+# Execução de um cenário (processo filho) --------------------------------------
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_scenario(name, scale, workers, latency, row_error_rate, http_error_rate):
+    """Executa um cenário no processo atual e retorna as métricas."""
+    workdir = tempfile.mkdtemp(prefix=f"datasync-bench-{name}-")
+    os.environ['DATASYNC_CACHE_PATH'] = os.path.join(workdir, 'metadata.sqlite')
+    os.environ['DATASYNC_JOURNAL_PATH'] = os.path.join(workdir, 'journal.sqlite')
+
+    source, schema, root, entry = SCENARIOS[name](scale)
+    entry, *extra_args = entry.split()
+    target = FakeOrg('target', schema, row_error_rate=row_error_rate, http_error_rate=http_error_rate, seed=1)
+    source.latency = target.latency = latency
+    source.http_error_rate = http_error_rate
+    clients = {'source': FakeSalesforce(source), 'target': FakeSalesforce(target)}
+
+    sys.modules['config'] = types.SimpleNamespace(sandbox_credentials={'org': 'source'}, dev_credentials={'org': 'target'})
+    authenticate = lambda org, **kwargs: clients[org]  # noqa: E731
+    # Pico de memória com a org de origem montada, antes da migração (ru_maxrss vem em KB no Linux)
+    setup_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if entry == 'main':
+            import main
+            main.authenticate_salesforce = authenticate
+            sys.argv = ['main.py', '--object', root, '--workers', str(workers), '--log-level', 'WARNING', *extra_args]
+            main.main()
+        else:
+            import controller
+            controller.authenticate_salesforce = authenticate
+            controller.start_migration(root, max_workers=workers)
+    elapsed = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    migrated = sum(len(rows) for rows in target.records.values())
+    api_calls = sum(source.calls.values()) + sum(target.calls.values())
+    phases = {}
+    for phase, endpoints in PHASES.items():
+        latencies = [value for org in (source, target) for endpoint in endpoints for value in org.latencies.get(endpoint, [])]
+        if latencies:
+            phases[phase] = {
+                'calls': len(latencies),
+                'p50_ms': _percentile(latencies, 0.50) * 1000,
+                'p99_ms': _percentile(latencies, 0.99) * 1000,
+            }
+
+    return {
+        'scenario': name,
+        'entry': entry,
+        'records_migrated': migrated,
+        'elapsed_s': elapsed,
+        'records_per_second': migrated / elapsed if elapsed else 0.0,
+        'api_calls': api_calls,
+        'api_calls_per_record': api_calls / migrated if migrated else float('inf'),
+        'calls_by_endpoint': {'source': dict(source.calls), 'target': dict(target.calls)},
+        'phases': phases,
+        'peak_rss_mb': peak_rss_mb,
+        # O pico inclui as orgs falsas em memória; o acréscimo sobre a montagem aproxima o consumo da ferramenta
+        'tool_rss_mb': peak_rss_mb - setup_rss_mb,
+    }
+
+
+# Orquestração (processo pai) ---------------------------------------------------
+
+def run_in_subprocess(name, args):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as output:
+        path = output.name
+    command = [
+        sys.executable, '-m', 'benchmarks.run_benchmarks', '--child', name, '--output', path,
+        '--scale', str(args.scale), '--workers', str(args.workers), '--latency', str(args.latency),
+        '--row-error-rate', str(args.row_error_rate), '--http-error-rate', str(args.http_error_rate),
+    ]
+    subprocess.run(command, cwd=ROOT, check=True)
+    with open(path) as handle:
+        result = json.load(handle)
+    os.remove(path)
+    return result
+
+
+def print_report(results):
+    print(f"{'Cenário':<18} {'Registros':>10} {'Tempo (s)':>10} {'Reg/s':>10} {'API/reg':>9} {'RSS (MB)':>9} {'RSS ferramenta':>15}")
+    for result in results:
+        print(f"{result['scenario']:<18} {result['records_migrated']:>10} {result['elapsed_s']:>10.2f} "
+              f"{result['records_per_second']:>10.0f} {result['api_calls_per_record']:>9.3f} {result['peak_rss_mb']:>9.0f} {result['tool_rss_mb']:>15.0f}")
+        for phase, stats in result['phases'].items():
+            print(f"    {phase:<10} chamadas={stats['calls']:<7} p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+
+
+def run_parameters(args):
+    return {name: getattr(args, name) for name in RUN_PARAMETERS}
+
+
+def check_regressions(results, baseline, tolerance):
+    """
+    Compara as métricas com os cenários do baseline e retorna a lista de regressões.
+    Só as métricas de `CHECKED_METRICS` reprovam; as de `REPORTED_METRICS` são impressas ao lado do baseline.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline['scenarios'].get(result['scenario'])
+        if not reference:
+            continue
+        for metric, higher_is_better in CHECKED_METRICS:
+            current, expected = result[metric], reference[metric]
+            limit = expected * (1 - tolerance) if higher_is_better else expected * (1 + tolerance)
+            if (current < limit) if higher_is_better else (current > limit):
+                regressions.append(f"{result['scenario']}: {metric} = {current:.3f} (baseline {expected:.3f}, limite {limit:.3f})")
+        changes = ', '.join(f"{metric} {result[metric]:.0f} (baseline {reference[metric]:.0f})"
+                            for metric in REPORTED_METRICS if metric in reference)
+        print(f"{result['scenario']}: {changes}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks da migração contra orgs falsas")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Cenário a executar (padrão: todos)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplicador do volume de registros")
+    parser.add_argument('--workers', type=int, default=8, help="Workers passados para a migração")
+    parser.add_argument('--latency', type=float, default=0.002, help="Latência simulada por chamada (segundos)")
+    parser.add_argument('--row-error-rate', type=float, default=0.0, help="Fração de linhas que falham na carga")
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help="Fração de chamadas que falham com HTTP 503")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Arquivo de baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Piora máxima aceita em relação ao baseline")
+    parser.add_argument('--update-baseline', action='store_true', help="Grava os resultados como novo baseline")
+    parser.add_argument('--json', help="Grava os resultados completos neste arquivo")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.child:
+        result = run_scenario(args.child, args.scale, args.workers, args.latency, args.row_error_rate, args.http_error_rate)
+        with open(args.output, 'w') as handle:
+            json.dump(result, handle)
+        return 0
+
+    results = [run_in_subprocess(name, args) for name in (args.scenario or sorted(SCENARIOS))]
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+
+    if args.update_baseline:
+        # Com os mesmos parâmetros, só os cenários executados são substituídos
+        if not baseline or baseline.get('parameters') != run_parameters(args):
+            baseline = {'parameters': run_parameters(args), 'scenarios': {}}
+        metrics = [metric for metric, _ in CHECKED_METRICS] + list(REPORTED_METRICS)
+        baseline['scenarios'].update(
+            (result['scenario'], {metric: result[metric] for metric in metrics}) for result in results
+        )
+        with open(args.baseline, 'w') as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+        print(f"Baseline gravado em {args.baseline}")
+        return 0
+
+    if not baseline:
+        return 0
+    if baseline.get('parameters') != run_parameters(args):
+        print(f"Baseline gravado com outros parâmetros ({baseline.get('parameters')}); comparação ignorada.")
+        return 0
+    regressions = check_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
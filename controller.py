@@ -1,23 +1,32 @@
 # controller.py
 
-from utils.salesforce_utils import authenticate_salesforce, find_all_dependencies
-from services.migration_service import process_object_with_dependencies
+from utils.salesforce_utils import authenticate_salesforce, prefetch_object_fields
+from utils.migration_journal import MigrationJournal
+from services.job_runner import build_job_graph
+from services.migration_service import migrate_graph
+from services.migration_planner import plan_migration, print_plan
+from services.scheduler import DEFAULT_WORKERS, topological_layers
 from config import sandbox_credentials, dev_credentials  # Usando sandbox_credentials
 
-# Controlador para iniciar a migração de um objeto e suas dependências
-def start_migration(object_name):
+# Controlador para iniciar a migração de um ou mais objetos e suas dependências
+def start_migration(object_name, max_workers=DEFAULT_WORKERS):
+    # Aceita um objeto ou uma lista; objetos compartilhados entre as raízes são migrados uma só vez
+    object_names = [object_name] if isinstance(object_name, str) else list(object_name)
+
     # Autenticação na sandbox e na org de desenvolvimento
-    sf_sandbox = authenticate_salesforce(**sandbox_credentials)
-    sf_dev = authenticate_salesforce(**dev_credentials)
+    sf_sandbox = authenticate_salesforce(**sandbox_credentials, max_workers=max_workers)
+    sf_dev = authenticate_salesforce(**dev_credentials, max_workers=max_workers)
 
     # Buscar todas as dependências do objeto, incluindo dependências de dependências
-    dependencies = find_all_dependencies(sf_sandbox, object_name)
-    
-    # Inclui o objeto principal no final (depois das dependências)
-    ordered_objects = dependencies + [object_name]
-    
-    # Remover duplicatas mantendo a ordem
-    ordered_objects = list(dict.fromkeys(ordered_objects))
-    
-    # Processar o objeto e suas dependências
-    process_object_with_dependencies(sf_sandbox, sf_dev, object_name, ordered_objects)
+    relationship_graph = build_job_graph(sf_sandbox, object_names)
+    prefetch_object_fields(sf_sandbox, sf_dev, relationship_graph.nodes())
+
+    # Planejar antes de mover dados: recusa a migração se ela ultrapassar os limites das orgs
+    plan = plan_migration(sf_sandbox, sf_dev, topological_layers(relationship_graph))
+    print_plan(plan)
+    if plan['violations']:
+        return None
+
+    # Processar o objeto e suas dependências por camadas, com objetos e blocos independentes em paralelo
+    journal = MigrationJournal(sf_sandbox, sf_dev)
+    return migrate_graph(sf_sandbox, sf_dev, relationship_graph, journal, max_workers, plan)
@@ -1,43 +1,152 @@
 
-from simple_salesforce import Salesforce
-from utils.salesforce_utils import authenticate_salesforce, build_relationship_graph, get_direct_dependencies, get_edge_field_name, get_object_fields, get_reference_fields, process_record_with_dependencies, visualize_graph, selectObject
+from utils.salesforce_utils import authenticate_salesforce, prefetch_object_fields
+from utils.migration_journal import MigrationJournal
+from services.job_runner import (
+    build_job_graph, job_objects, job_roots, job_where_clauses, order_roots, run_delta_job, run_job,
+)
+from services.migration_planner import plan_migration, print_plan
+from services.scheduler import DEFAULT_WORKERS, topological_layers
+from utils.logging_utils import configure_logging
+from utils.metrics import metrics, profiled
 
 from config import sandbox_credentials, dev_credentials
 
 import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Migração de dados do Salesforce")
-    parser.add_argument('--object', required=True,help="Nome do objeto a ser migrado")
-    return parser.parse_args()
+    parser.add_argument('command', nargs='?', default='migrate', choices=['migrate', 'extract', 'load'],
+                        help="migrate: extrai e carrega; extract: grava a origem no staging local; load: carrega a partir do staging")
+    parser.add_argument('--object', action='append', help="Objeto raiz a ser migrado; repita para migrar vários em um só job")
+    parser.add_argument('--where', action='append', metavar='OBJETO=CONDIÇÃO',
+                        help="Filtro SOQL de um objeto raiz, ex.: \"Opportunity=StageName = 'Closed Won'\"; pode ser repetido")
+    parser.add_argument('--job', help="Especificação do job em JSON ou YAML com a lista de raízes (objeto, filtro, limite)")
+    parser.add_argument('--limit', type=int, help="Número máximo de registros de cada objeto raiz")
+    parser.add_argument('--reset', action='store_true',
+                        help="Descarta o diário da migração (ou, no extract, o staging do objeto) e começa do zero")
+    parser.add_argument('--staging', help="Diretório da área de staging usada por extract e load (padrão: DATASYNC_STAGING_PATH ou .datasync/staging)")
+    parser.add_argument('--plan', action='store_true', help="Apenas mostra o plano (volumes, armazenamento, chamadas de API) e sai")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Número máximo de chamadas em paralelo")
+    parser.add_argument('--loader', choices=['layers', 'graph'], default='layers',
+                        help="Carga das dependências: um lote por objeto ('layers') ou Composite Graph API ('graph')")
+    parser.add_argument('--delta', action='store_true',
+                        help="Sincronização incremental: só os registros alterados desde a última execução (SystemModstamp)")
+    parser.add_argument('--external-id', help="Campo de Id externo do destino usado no upsert da sincronização incremental")
+    parser.add_argument('--deletes', action='store_true', help="Com --delta, replica no destino as exclusões da origem (getDeleted)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Nível do log; DEBUG mostra cada query e cada erro de registro")
+    parser.add_argument('--metrics-out', help="Grava as métricas no fim da execução (.prom/.txt para Prometheus, senão JSON)")
+    parser.add_argument('--profile', help="Grava o perfil do cProfile neste arquivo (use --workers 1 para incluir a carga)")
+    args = parser.parse_args()
+    if not args.object and not args.job:
+        parser.error("informe ao menos um --object ou um --job")
+    try:
+        args.roots = job_roots(args.object, args.where, args.job, args.limit)
+    except (ValueError, ImportError, OSError) as e:
+        parser.error(str(e))
+    return args
 
 def main():
     args = parse_args()
-    object_name = args.object
+    configure_logging(args.log_level)
+    try:
+        with profiled(args.profile):
+            COMMANDS[args.command](args)
+    finally:
+        if args.metrics_out:
+            metrics.dump(args.metrics_out)
+
+def migrate(args):
+    roots = args.roots
 
     # Autenticar nas duas orgs
-    sf_sandbox = authenticate_salesforce(**sandbox_credentials)
-    sf_dev = authenticate_salesforce(**dev_credentials)
+    sf_sandbox = authenticate_salesforce(**sandbox_credentials, max_workers=args.workers)
+    sf_dev = authenticate_salesforce(**dev_credentials, max_workers=args.workers)
 
     if not sf_sandbox or not sf_dev:
-        print("Falha na autenticação. Verifique as credenciais e tente novamente.")
+        logger.error("Falha na autenticação. Verifique as credenciais e tente novamente.")
         return
     
 
-    relationship_graph = build_relationship_graph(sf_sandbox, object_name)
+    # Um único grafo para todas as raízes: objetos compartilhados aparecem uma só vez
+    relationship_graph = build_job_graph(sf_sandbox, [root['object'] for root in roots])
+
+    prefetch_object_fields(sf_sandbox, sf_dev, relationship_graph.nodes())
+
+    # O diário guarda o mapa de IDs e o progresso; uma execução interrompida retoma do último bloco confirmado
+    journal = MigrationJournal(sf_sandbox, sf_dev)
+
+    if args.plan:
+        # O plano não altera o diário. No modo incremental ele conta só os registros alterados desde a última
+        # sincronização; com --reset conta tudo, como a execução que vai descartar as marcas d'água
+        where_clauses = job_where_clauses(roots, journal if args.delta and not args.reset else None)
+        plan = plan_migration(sf_sandbox, sf_dev, topological_layers(relationship_graph, job_objects(relationship_graph, roots)),
+                              where_clauses)
+        print_plan(plan)
+        sys.exit(1 if plan['violations'] else 0)
+
+    if args.reset:
+        journal.reset()
+
+    if args.delta:
+        changed, deleted = run_delta_job(sf_sandbox, sf_dev, roots, relationship_graph, journal,
+                                         external_id_field=args.external_id, deletes=args.deletes, max_workers=args.workers)
+        logger.info("Sincronização incremental concluída: %d registros alterados, %d excluídos", changed, deleted)
+        return
+
+    id_map = run_job(sf_sandbox, sf_dev, roots, relationship_graph, journal, max_workers=args.workers, loader=args.loader)
+    logger.info("%d registros mapeados entre as orgs (incluindo dependências)", len(id_map))
+
+def open_staging(sf_sandbox, root, args):
+    # O pyarrow só é carregado pelos comandos que usam o staging
+    from utils.staging import DEFAULT_STAGING_PATH, StagingArea
+    return StagingArea(sf_sandbox, root['object'], args.staging or DEFAULT_STAGING_PATH, scope=root['where'])
+
+def extract(args):
+    from services.staging_service import extract_to_staging
+
+    # A extração só precisa da org de origem
+    sf_sandbox = authenticate_salesforce(**sandbox_credentials, max_workers=args.workers)
+    if not sf_sandbox:
+        logger.error("Falha na autenticação. Verifique as credenciais e tente novamente.")
+        return
+
+    relationship_graph = build_job_graph(sf_sandbox, [root['object'] for root in args.roots])
+    for root in args.roots:
+        staging = open_staging(sf_sandbox, root, args)
+        if args.reset:
+            staging.reset()
+        extract_to_staging(sf_sandbox, root['object'], relationship_graph, staging, limit=root['limit'],
+                           max_workers=args.workers)
 
-    direct_dependencies= get_direct_dependencies(relationship_graph, object_name)
+def load(args):
+    from services.staging_service import load_from_staging
 
-    rootObjectFields= get_object_fields(sf_sandbox, sf_dev, object_name)
+    sf_sandbox = authenticate_salesforce(**sandbox_credentials, max_workers=args.workers)
+    sf_dev = authenticate_salesforce(**dev_credentials, max_workers=args.workers)
+    if not sf_sandbox or not sf_dev:
+        logger.error("Falha na autenticação. Verifique as credenciais e tente novamente.")
+        return
 
-    records= selectObject(sf_sandbox, object_name, rootObjectFields)
+    # O grafo e os campos vêm do cache de describes; os dados vêm só do staging
+    relationship_graph = build_job_graph(sf_sandbox, [root['object'] for root in args.roots])
+    prefetch_object_fields(sf_sandbox, sf_dev, relationship_graph.nodes())
 
+    journal = MigrationJournal(sf_sandbox, sf_dev)
+    if args.reset:
+        journal.reset()
+    # Raízes pais primeiro e um só mapa de IDs: dependências já carregadas por uma raiz não são inseridas de novo
+    id_map = journal.load_id_map()
+    for root in order_roots(relationship_graph, args.roots):
+        load_from_staging(sf_sandbox, sf_dev, root['object'], relationship_graph, open_staging(sf_sandbox, root, args), journal,
+                          id_map, max_workers=args.workers, loader=args.loader)
+    logger.info("%d registros mapeados entre as orgs (incluindo dependências)", len(id_map))
 
-    for record in records:
-        result = process_record_with_dependencies(sf_sandbox, sf_dev, object_name, record, direct_dependencies)
-        print(f"Registro inserido com sucesso: {result['id']}")
-    # Processar migração
-    #process_object_with_dependencies(sf_sandbox, sf_dev, allObjects)
+COMMANDS = {'migrate': migrate, 'extract': extract, 'load': load}
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,227 @@
+# services/delta_sync.py
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from services.dependency_resolver import (
+    backfill_deferred_lookups, collect_dependency_records, load_dependency_records, plan_dependencies,
+)
+from services.migration_service import load_object_records
+from services.scheduler import DEFAULT_WORKERS
+from utils.bulk_utils import delete_records, update_records, upsert_records
+from utils.metrics import metrics
+from utils.salesforce_utils import (
+    add_condition, get_object_fields, iter_object_records, metadata_cache, prefetch, select_records_in,
+)
+
+logger = logging.getLogger(__name__)
+
+# Marca d'água das alterações: muda em qualquer gravação do registro, inclusive as feitas pelo sistema
+WATERMARK_FIELD = 'SystemModstamp'
+
+# O getDeleted só aceita inícios dentro dos últimos 30 dias (a retenção da lixeira)
+DELETED_LOOKBACK = timedelta(days=30)
+
+
+def changed_where_clause(journal, object_name, where_clause=''):
+    """
+    Acrescenta à cláusula WHERE o filtro de registros alterados desde a última sincronização.
+    A comparação é >=: linhas com o mesmo carimbo da marca d'água são regravadas, o que é
+    inofensivo (a escrita é idempotente) e evita perder linhas empatadas entre dois blocos.
+    """
+    watermark = journal.get_watermark(object_name, scope=where_clause)
+    if not watermark:
+        return where_clause
+    return add_condition(where_clause, f"{WATERMARK_FIELD} >= {watermark}")
+
+
+def iter_changed_chunks(sf_sandbox, object_name, fields, journal, where_clause=''):
+    """Extrai, em blocos ordenados pela marca d'água, os registros alterados desde a última sincronização."""
+    fields = list(dict.fromkeys(['Id', WATERMARK_FIELD] + list(fields)))
+    changed_where = changed_where_clause(journal, object_name, where_clause)
+    return iter_object_records(sf_sandbox, object_name, fields, changed_where, order_by=f"{WATERMARK_FIELD}, Id")
+
+
+def writable_fields(sf_dev, object_name, upsert=False):
+    """Campos que uma atualização (ou um upsert, que pode criar ou atualizar) consegue gravar no destino."""
+    return {
+        field['name'] for field in metadata_cache.describe(sf_dev, object_name)['fields']
+        if field['updateable'] and (field['createable'] or not upsert)
+    }
+
+
+def write_changed_records(sf_dev, object_name, records, lookup_fields, id_map, external_id_field=None):
+    """
+    Grava os registros alterados no destino.
+    Com `external_id_field` tudo vai por upsert; registros sem valor no campo
+    (ex.: o campo só existe no destino) usam o Id de origem. Sem ele, registros já presentes no mapa de IDs são
+    atualizados e os demais inseridos. Lookups cujo pai ainda não tem Id no destino
+    ficam vazios e são devolvidos para preenchimento posterior.
+    Retorna (novos mapeamentos, {Id de origem: campos de lookup pendentes}).
+    """
+    writable = writable_fields(sf_dev, object_name, upsert=bool(external_id_field))
+    rows, pending = [], {}
+    for record in records:
+        row = dict(record)
+        for field in lookup_fields:
+            value = record.get(field)
+            if value:
+                row[field] = id_map.get(value)
+                if row[field] is None:
+                    pending.setdefault(record['Id'], set()).add(field)
+        if external_id_field and not record.get(external_id_field):
+            row[external_id_field] = record['Id']
+        rows.append(row)
+
+    mappings = []
+    errors = Counter()
+    def for_update(row):
+        # Campos só de criação (ou sem permissão de edição) fariam a linha inteira falhar
+        return {k: v for k, v in row.items() if k in writable}
+
+    if external_id_field:
+        written = list(zip(rows, upsert_records(sf_dev, object_name, external_id_field, [for_update(row) for row in rows])))
+        to_insert = []
+    else:
+        to_update = [row for row in rows if row['Id'] in id_map]
+        to_insert = [row for row in rows if row['Id'] not in id_map]
+        results = update_records(sf_dev, object_name, [dict(for_update(row), Id=id_map[row['Id']]) for row in to_update])
+        written = []
+        for row, result in zip(to_update, results):
+            # O registro foi excluído no destino: volta a ser criado
+            if not result['success'] and any(e.get('statusCode') == 'ENTITY_IS_DELETED' for e in result['errors']):
+                to_insert.append(row)
+            else:
+                written.append((row, result))
+
+    for row, result in written:
+        if result['success']:
+            if id_map.get(row['Id']) != result['id']:
+                id_map[row['Id']] = result['id']
+                mappings.append((object_name, row['Id'], result['id']))
+        else:
+            errors.update(error.get('statusCode') for error in result['errors'])
+            logger.debug("Erro ao gravar registro alterado de %s: %s", object_name, result['errors'])
+    failed = sum(errors.values())
+    metrics.inc('rows_loaded_total', len(written) - failed, object=object_name)
+    metrics.inc('rows_failed_total', failed, object=object_name)
+    if errors:
+        logger.warning("%d registros alterados de %s falharam: %s", failed, object_name, dict(errors))
+
+    if to_insert:
+        # Os lookups já foram reescritos; o plano de carga só projeta os campos criáveis
+        results = load_object_records(sf_dev, object_name, to_insert)
+        for row, result in zip(to_insert, results):
+            if result['success']:
+                id_map[row['Id']] = result['id']
+                mappings.append((object_name, row['Id'], result['id']))
+
+    return mappings, pending
+
+
+def sync_changed_chunk(sf_sandbox, sf_dev, object_name, records, dependency_plan, id_map, external_id_field=None,
+                       max_workers=1):
+    """
+    Sincroniza um bloco de registros alterados.
+    Pais ainda inexistentes no destino são buscados e inseridos pelo fluxo normal
+    de dependências; os registros alterados vão por upsert/atualização e, no fim,
+    os lookups que apontavam para pais criados neste bloco são preenchidos.
+    Retorna os novos mapeamentos [(objeto, Id de origem, Id de destino)].
+    """
+    direct_dependencies, layers, deferred = dependency_plan
+    records = [{k: v for k, v in record.items() if k != WATERMARK_FIELD} for record in records]
+
+    collected = collect_dependency_records(sf_sandbox, sf_dev, object_name, records, direct_dependencies,
+                                           id_map=id_map, max_workers=max_workers)
+    for record in records:
+        collected[object_name].pop(record['Id'], None)
+    mappings = load_dependency_records(sf_dev, collected, direct_dependencies, layers, id_map, max_workers, deferred)
+
+    lookup_fields = [field for field, _ in direct_dependencies.get(object_name, [])]
+    changed_mappings, pending = write_changed_records(sf_dev, object_name, records, lookup_fields, id_map, external_id_field)
+    mappings += changed_mappings
+
+    if pending:
+        by_id = {record['Id']: record for record in records}
+        backfill_deferred_lookups(
+            sf_dev,
+            {object_name: by_id},
+            [(object_name, source_id, id_map[source_id]) for source_id in pending if source_id in id_map],
+            {object_name: set().union(*pending.values())},
+            id_map,
+        )
+    return mappings
+
+
+def sync_deletes(sf_sandbox, sf_dev, object_name, journal, id_map, external_id_field=None, scope=''):
+    """
+    Replica no destino as exclusões feitas na origem desde a última sincronização, via getDeleted.
+    Os registros são localizados pelo mapa de IDs e, na falta dele, pelo Id externo
+    preenchido com o Id de origem. Retorna o número de registros excluídos.
+    """
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    watermark = journal.get_watermark(object_name, scope=scope, kind='deleted')
+    if watermark is None:
+        # Primeira sincronização: só registra o ponto de partida
+        journal.commit_deletes(object_name, [], now.isoformat(), scope=scope)
+        return 0
+
+    start = datetime.fromisoformat(watermark)
+    if start < now - DELETED_LOOKBACK:
+        logger.warning("Última sincronização de exclusões de %s foi em %s; o getDeleted só cobre os últimos %d dias.",
+                       object_name, watermark, DELETED_LOOKBACK.days)
+        start = now - DELETED_LOOKBACK + timedelta(minutes=1)
+
+    response = getattr(sf_sandbox, object_name).deleted(start, now)
+    source_ids = [record['id'] for record in response.get('deletedRecords', [])]
+    targets = {source_id: id_map[source_id] for source_id in source_ids if source_id in id_map}
+    unmapped = [source_id for source_id in source_ids if source_id not in targets]
+    if unmapped and external_id_field:
+        for record in select_records_in(sf_dev, object_name, ['Id', external_id_field], external_id_field, unmapped):
+            targets[record[external_id_field]] = record['Id']
+
+    removed = []
+    for source_id, result in zip(list(targets), delete_records(sf_dev, object_name, list(targets.values()))):
+        if result['success'] or any(e.get('statusCode') == 'ENTITY_IS_DELETED' for e in result['errors']):
+            removed.append(source_id)
+            id_map.pop(source_id, None)
+        else:
+            logger.warning("Erro ao excluir registro de %s: %s", object_name, result['errors'])
+    metrics.inc('rows_deleted_total', len(removed), object=object_name)
+
+    # latestDateCovered é até onde o Salesforce garante que a lista de exclusões está completa
+    covered = response.get('latestDateCovered')
+    journal.commit_deletes(object_name, removed, datetime.fromisoformat(covered).isoformat() if covered else now.isoformat(),
+                           scope=scope)
+    logger.info("%d de %d registros excluídos na origem foram excluídos de %s no destino",
+                len(removed), len(source_ids), object_name)
+    return len(removed)
+
+
+def sync_object_delta(sf_sandbox, sf_dev, object_name, graph, journal, external_id_field=None, deletes=False,
+                      where_clause='', max_workers=DEFAULT_WORKERS):
+    """
+    Sincroniza um objeto de forma incremental: extrai só os registros alterados desde
+    a última execução (pela marca d'água de SystemModstamp), grava por upsert ou
+    atualização e, com `deletes`, replica as exclusões. A marca d'água avança a cada
+    bloco confirmado, então o custo acompanha o volume de alterações e não o tamanho
+    da tabela. Retorna (registros alterados, registros excluídos).
+    """
+    id_map = journal.load_id_map()
+    dependency_plan = plan_dependencies(graph, object_name)
+    fields = get_object_fields(sf_sandbox, sf_dev, object_name)
+
+    changed = 0
+    for records in prefetch(iter_changed_chunks(sf_sandbox, object_name, fields, journal, where_clause)):
+        mappings = sync_changed_chunk(sf_sandbox, sf_dev, object_name, records, dependency_plan, id_map,
+                                      external_id_field, max_workers)
+        # Os blocos vêm ordenados pela marca d'água, então o último registro tem a maior
+        journal.commit_chunk(object_name, mappings, scope=where_clause, watermark=records[-1][WATERMARK_FIELD])
+        changed += len(records)
+    logger.info("%d registros alterados de %s sincronizados", changed, object_name)
+
+    deleted = 0
+    if deletes:
+        deleted = sync_deletes(sf_sandbox, sf_dev, object_name, journal, id_map, external_id_field, scope=where_clause)
+    return changed, deleted
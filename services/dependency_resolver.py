@@ -0,0 +1,292 @@
+# services/dependency_resolver.py
+
+import logging
+from collections import defaultdict
+
+from services.migration_service import load_object_records
+from services.scheduler import DEFAULT_WORKERS, run_layers, run_parallel
+from utils.bulk_utils import update_records
+from utils.composite_graph import graph_requests, insert_graphs, pack_record_graphs, reference
+from utils.salesforce_utils import (
+    add_condition, get_direct_dependencies, get_load_plan, get_object_fields,
+    iter_object_records, rejected_fields, select_records_in, soql_quote,
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def collect_dependency_records(sf_sandbox, sf_dev, object_name, records, direct_dependencies, collected=None, id_map=None,
+                               max_workers=1):
+    """
+    Percorre as dependências por níveis a partir dos registros raiz.
+    Em cada nível junta os IDs distintos referenciados por objeto e busca todos
+    de uma vez com queries `WHERE Id IN (...)`. IDs que já estão em `id_map`
+    foram migrados antes e não são buscados de novo.
+    Retorna {objeto: {Id de origem: registro}}.
+    """
+    if collected is None:
+        collected = defaultdict(dict)
+    if id_map is None:
+        id_map = {}
+
+    for record in records:
+        collected[object_name][record['Id']] = record
+
+    wave = {object_name: records}
+    level = 0
+    while wave:
+        wanted = defaultdict(set)
+        for obj, obj_records in wave.items():
+            for field, dep_object in direct_dependencies.get(obj, []):
+                for record in obj_records:
+                    value = record.get(field)
+                    if value and value not in collected[dep_object] and value not in id_map:
+                        wanted[dep_object].add(value)
+
+        level += 1
+
+        def fetch(dep_object, ids):
+            logger.debug("Nível %d: buscando %d registros de %s", level, len(ids), dep_object)
+            fields = get_object_fields(sf_sandbox, sf_dev, dep_object)
+            if 'Id' not in fields:
+                fields = ['Id'] + fields
+            return select_records_in(sf_sandbox, dep_object, fields, 'Id', ids)
+
+        # Os objetos de um mesmo nível são buscados em paralelo
+        dep_objects = list(wanted)
+        with metrics.timed('lookup_resolution', object=object_name):
+            fetched_by_object = run_parallel([lambda obj=obj: fetch(obj, wanted[obj]) for obj in dep_objects], max_workers)
+
+        next_wave = {}
+        for dep_object, fetched in zip(dep_objects, fetched_by_object):
+            for record in fetched:
+                collected[dep_object][record['Id']] = record
+            if fetched:
+                next_wave[dep_object] = fetched
+        wave = next_wave
+
+    return collected
+
+
+def load_object_dependency_records(sf_dev, obj, collected, id_map, deferred=None):
+    """
+    Insere os registros coletados de um objeto, com os lookups reescritos para os IDs do destino.
+    Lookups adiados (ciclos e auto-relacionamentos) e lookups sem correspondente
+    (pais que falharam) ficam vazios; os adiados são preenchidos por `backfill_deferred_lookups`.
+    Registros já presentes no mapa de IDs não são inseridos de novo; a correspondência
+    entre as orgs vem só do diário, nunca do nome do registro, que pode se repetir.
+    Retorna os novos mapeamentos [(objeto, Id de origem, Id de destino)].
+    """
+    mappings = []
+    records = [record for source_id, record in collected.get(obj, {}).items() if source_id not in id_map]
+    if not records:
+        return mappings
+
+    results = load_object_records(sf_dev, obj, records, id_map=id_map, deferred=(deferred or {}).get(obj, {}))
+    for record, result in zip(records, results):
+        if result['success']:
+            id_map[record['Id']] = result['id']
+            mappings.append((obj, record['Id'], result['id']))
+    inserted = sum(1 for result in results if result['success'])
+    logger.info("%d de %d registros de %s inseridos com sucesso", inserted, len(records), obj)
+    return mappings
+
+
+def load_dependency_records(sf_dev, collected, direct_dependencies, layers, id_map=None, max_workers=1, deferred=None):
+    """
+    Insere os registros coletados camada por camada, das dependências para o objeto raiz.
+    Objetos da mesma camada são carregados em paralelo. No fim, os lookups
+    adiados dos registros inseridos são preenchidos em uma atualização em lote.
+    Atualiza `id_map` e retorna os novos mapeamentos [(objeto, Id de origem, Id de destino)].
+    """
+    if id_map is None:
+        id_map = {}
+
+    layers = [[obj for obj in layer if collected.get(obj)] for layer in layers]
+    results = run_layers(
+        [layer for layer in layers if layer],
+        lambda obj, _: load_object_dependency_records(sf_dev, obj, collected, id_map, deferred),
+        max_workers,
+    )
+    mappings = [mapping for obj_mappings in results.values() for mapping in obj_mappings]
+    if deferred:
+        backfill_deferred_lookups(sf_dev, collected, mappings, deferred, id_map, max_workers)
+    return mappings
+
+
+def load_dependency_graphs(sf_dev, collected, direct_dependencies, layers, id_map=None, max_workers=1, deferred=None):
+    """
+    Insere os registros coletados via Composite Graph API: cada registro vai na
+    mesma chamada que os pais ainda inexistentes no destino, com referências
+    @{ref.id}, sem uma ida e volta por nível de lookup. Cada grafo é tudo ou nada.
+    Registros de grafos que falharam, e os que não cabem em um grafo (profundos
+    demais ou com ancestrais demais), são carregados depois por
+    `load_dependency_records`, que remove campos rejeitados e aceita sucesso parcial.
+    Atualiza `id_map` e retorna os novos mapeamentos [(objeto, Id de origem, Id de destino)].
+    """
+    if id_map is None:
+        id_map = {}
+    deferred = deferred or {}
+
+    pending = {
+        source_id: (obj, record)
+        for obj, records in collected.items() for source_id, record in records.items() if source_id not in id_map
+    }
+    objects = list(dict.fromkeys(obj for obj, _ in pending.values()))
+    mappings = []
+
+    lookup_fields = {
+        obj: [(field, field in deferred.get(obj, {})) for field, _ in direct_dependencies.get(obj, [])]
+        for obj in collected
+    }
+
+    def parents_of(source_id):
+        obj, record = pending[source_id]
+        return [record[field] for field, is_deferred in lookup_fields[obj]
+                if not is_deferred and record.get(field) in pending and record[field] not in id_map]
+
+    plans = {obj: get_load_plan(sf_dev, obj) for obj in objects}
+
+    def graph_node(source_id, members):
+        obj, record = pending[source_id]
+        body = plans[obj].project(record, id_map, deferred.get(obj, {}))
+        for field, is_deferred in lookup_fields[obj]:
+            if not is_deferred and field in body and record[field] in members:
+                body[field] = reference(record[field])
+        return obj, source_id, body
+
+    remaining = list(pending)
+    blocked = set()
+    graph_count = 0
+    while remaining:
+        graphs, waiting = pack_record_graphs(remaining, parents_of, blocked)
+        if not graphs:
+            blocked.update(waiting)
+            break
+        nodes = [[graph_node(source_id, set(graph)) for source_id in graph] for graph in graphs]
+        batches = list(graph_requests(nodes))
+        results = [result for batch in run_parallel([lambda batch=batch: insert_graphs(sf_dev, batch) for batch in batches],
+                                                    max_workers) for result in batch]
+        for graph, graph_results in zip(graphs, results):
+            if all(result['success'] for result in graph_results.values()):
+                for source_id in graph:
+                    obj = pending[source_id][0]
+                    id_map[source_id] = graph_results[source_id]['id']
+                    mappings.append((obj, source_id, id_map[source_id]))
+                    metrics.inc('rows_loaded_total', object=obj)
+            else:
+                blocked.update(graph)
+                # Campos recusados saem do plano antes de os registros seguirem pelo fluxo por camadas
+                for source_id, result in graph_results.items():
+                    plans[pending[source_id][0]].reject(rejected_fields(result['errors']))
+                logger.debug("Grafo com %d registros falhou: %s", len(graph),
+                             [result['errors'] for result in graph_results.values() if result['errors']][:3])
+        graph_count += len(graphs)
+        remaining = [source_id for source_id in waiting if source_id not in blocked]
+
+    logger.info("%d registros inseridos em %d grafos; %d seguem pelo fluxo por camadas",
+                len(pending) - len(blocked), graph_count, len(blocked))
+    if blocked:
+        fallback = defaultdict(dict)
+        for source_id in blocked:
+            obj, record = pending[source_id]
+            fallback[obj][source_id] = record
+        mappings += load_dependency_records(sf_dev, fallback, direct_dependencies, layers, id_map, max_workers, deferred)
+    if deferred:
+        backfill_deferred_lookups(sf_dev, collected, [m for m in mappings if m[1] not in blocked], deferred, id_map, max_workers)
+    return mappings
+
+
+def backfill_deferred_lookups(sf_dev, collected, mappings, deferred, id_map, max_workers=1):
+    """
+    Preenche os lookups que formam ciclos depois que todos os registros da
+    componente foram inseridos, com uma atualização em lote por objeto.
+    """
+    updates = defaultdict(list)
+    for obj, source_id, target_id in mappings:
+        fields = deferred.get(obj)
+        record = collected.get(obj, {}).get(source_id)
+        if not fields or record is None:
+            continue
+        values = {field: id_map[record[field]] for field in fields if record.get(field) in id_map}
+        if values:
+            updates[obj].append(dict(values, Id=target_id))
+
+    def update(obj):
+        results = update_records(sf_dev, obj, updates[obj])
+        failed = [result['errors'] for result in results if not result['success']]
+        metrics.inc('rows_backfilled_total', len(results) - len(failed), object=obj)
+        metrics.inc('rows_failed_total', len(failed), object=obj)
+        logger.info("%d de %d lookups cíclicos de %s preenchidos", len(results) - len(failed), len(results), obj)
+        for errors in failed:
+            logger.debug("Erro ao preencher lookup: %s", errors)
+        if failed:
+            logger.warning("%d lookups cíclicos de %s não foram preenchidos", len(failed), obj)
+
+    run_parallel([lambda obj=obj: update(obj) for obj in updates], max_workers)
+
+
+def plan_dependencies(graph, object_name):
+    """
+    Calcula as dependências diretas, as camadas de inserção (pais primeiro) e os
+    lookups adiados por ciclos a partir do grafo.
+    """
+    direct_dependencies = get_direct_dependencies(graph, object_name)
+    layers, deferred = graph.insertion_plan(graph.reachable(object_name))
+    return direct_dependencies, layers, deferred
+
+
+def migrate_chunks_with_dependencies(sf_sandbox, sf_dev, object_name, chunks, graph, id_map=None, journal=None, scope='',
+                                     max_workers=DEFAULT_WORKERS, loader='layers'):
+    """
+    Migra os registros raiz bloco a bloco, à medida que são extraídos.
+    O mapa de IDs é compartilhado entre os blocos, então dependências já migradas
+    não são buscadas nem inseridas de novo. Com um `journal`, cada bloco é
+    confirmado no diário junto com o maior Id raiz processado; os blocos
+    precisam chegar ordenados por Id. `loader` escolhe a carga: 'layers' (um lote
+    por objeto, camada por camada) ou 'graph' (Composite Graph API).
+    """
+    if id_map is None:
+        id_map = journal.load_id_map() if journal else {}
+    direct_dependencies, _, _ = plan_dependencies(graph, object_name)
+
+    # Cada bloco é coletado só quando o anterior já foi carregado e está no mapa de IDs
+    collected_chunks = (
+        (records[-1]['Id'], collect_dependency_records(sf_sandbox, sf_dev, object_name, records, direct_dependencies,
+                                                       id_map=id_map, max_workers=max_workers))
+        for records in chunks if records
+    )
+    return load_collected_chunks(sf_sandbox, sf_dev, object_name, collected_chunks, graph, id_map, journal, scope,
+                                 max_workers, loader)
+
+
+def load_collected_chunks(sf_sandbox, sf_dev, object_name, collected_chunks, graph, id_map=None, journal=None, scope='',
+                          max_workers=DEFAULT_WORKERS, loader='layers'):
+    """
+    Carrega blocos já coletados, entregues como (maior Id raiz, {objeto: {Id: registro}}),
+    vindos da org de origem ou da área de staging. Registros já presentes no mapa de
+    IDs não são inseridos de novo. Com um `journal`, cada bloco é confirmado com o seu cursor.
+    """
+    if id_map is None:
+        id_map = journal.load_id_map() if journal else {}
+    direct_dependencies, layers, deferred = plan_dependencies(graph, object_name)
+    load = load_dependency_graphs if loader == 'graph' else load_dependency_records
+
+    for cursor, collected in collected_chunks:
+        mappings = load(sf_dev, collected, direct_dependencies, layers, id_map, max_workers, deferred)
+        if journal:
+            journal.commit_chunk(object_name, mappings, cursor=cursor, scope=scope)
+
+    if journal:
+        journal.mark_done(object_name, scope)
+    return id_map
+
+
+def iter_pending_root_chunks(sf_sandbox, object_name, fields, journal, where_clause='', limit=None):
+    """Extrai os registros raiz ordenados por Id, a partir do cursor salvo no diário."""
+    cursor, _ = journal.get_cursor(object_name, scope=where_clause)
+    if cursor:
+        logger.info("Retomando %s a partir do Id %s", object_name, cursor)
+        where_clause = add_condition(where_clause, f"Id > {soql_quote(cursor)}")
+    return iter_object_records(sf_sandbox, object_name, fields, where_clause, limit, order_by='Id')
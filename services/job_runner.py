@@ -0,0 +1,172 @@
+# services/job_runner.py
+
+import json
+import logging
+
+from services.delta_sync import changed_where_clause, sync_object_delta
+from services.dependency_resolver import iter_pending_root_chunks, migrate_chunks_with_dependencies
+from services.scheduler import DEFAULT_WORKERS, topological_layers
+from utils.graph_utils import DependencyGraph
+from utils.salesforce_utils import build_relationship_graph, get_object_fields, prefetch, where_condition
+
+logger = logging.getLogger(__name__)
+
+
+def where_clause(condition):
+    """Normaliza um filtro ("StageName = 'Closed Won'" ou "WHERE ...") para uma cláusula WHERE."""
+    condition = where_condition(condition)
+    return f"WHERE {condition}" if condition else ''
+
+
+def any_of(clauses):
+    """Junta cláusulas WHERE com OR; uma cláusula vazia (objeto inteiro) prevalece sobre as demais."""
+    conditions = [where_condition(clause) for clause in clauses]
+    if not all(conditions):
+        return ''
+    return "WHERE " + (conditions[0] if len(conditions) == 1 else ' OR '.join(f"({c})" for c in conditions))
+
+
+def parse_where_filters(filters):
+    """
+    Converte filtros `Objeto=condição` (do --where) em {objeto em minúsculas: cláusula WHERE},
+    já que os nomes de objeto do Salesforce não diferenciam maiúsculas. Filtros
+    repetidos para o mesmo objeto são combinados com OR.
+    """
+    conditions = {}
+    for item in filters or []:
+        object_name, separator, condition = item.partition('=')
+        if not separator or not object_name.strip() or not where_condition(condition):
+            raise ValueError(f"Filtro inválido: {item!r}. Use Objeto=condição, ex.: \"Opportunity=StageName = 'Closed Won'\"")
+        conditions.setdefault(object_name.strip().lower(), []).append(where_clause(condition))
+    return {object_name: any_of(clauses) for object_name, clauses in conditions.items()}
+
+
+def load_job_spec(path):
+    """
+    Lê a especificação de um job em JSON ou YAML (o YAML precisa do PyYAML):
+
+        roots:
+          - object: Opportunity
+            where: "StageName = 'Closed Won'"
+            limit: 1000
+          - Contract
+
+    Retorna a lista de raízes como dicionários {'object', 'where', 'limit'}.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("Especificações em YAML precisam do pacote PyYAML (pip install pyyaml); use JSON.") from e
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    roots = spec.get('roots') if isinstance(spec, dict) else None
+    if not roots:
+        raise ValueError(f"{path}: a especificação precisa de uma lista 'roots' com ao menos um objeto")
+    return [root if isinstance(root, dict) else {'object': root} for root in roots]
+
+
+def job_roots(objects=None, where_filters=None, spec_path=None, limit=None):
+    """
+    Monta a lista de raízes do job a partir da especificação e dos argumentos
+    (`--object` repetido, `--where Objeto=condição`, `--limit`). O filtro do --where
+    prevalece sobre o da especificação; raízes repetidas (mesmo objeto e filtro) são
+    unificadas. Objetos são comparados sem diferenciar maiúsculas, e um --where para
+    um objeto que não é raiz do job gera ValueError.
+    """
+    clauses = parse_where_filters(where_filters)
+    roots = (load_job_spec(spec_path) if spec_path else []) + [{'object': obj} for obj in objects or []]
+
+    job, names = {}, {}
+    for root in roots:
+        if not root.get('object'):
+            raise ValueError(f"Raiz sem objeto na especificação: {root}")
+        # A primeira grafia de cada objeto vale para o job inteiro
+        object_name = names.setdefault(root['object'].strip().lower(), root['object'].strip())
+        where = clauses.get(object_name.lower(), where_clause(root.get('where')))
+        job.setdefault((object_name.lower(), where), {
+            'object': object_name,
+            'where': where,
+            'limit': root.get('limit', limit),
+        })
+
+    unknown = sorted({item.partition('=')[0].strip() for item in where_filters or []
+                      if item.partition('=')[0].strip().lower() not in names})
+    if unknown:
+        raise ValueError(f"--where para objeto que não é raiz do job: {', '.join(unknown)}. Inclua-o com --object ou no --job.")
+    return list(job.values())
+
+
+def build_job_graph(sf_sandbox, object_names):
+    """Junta os grafos de relacionamento de todas as raízes; os describes já baixados vêm do cache."""
+    graph = DependencyGraph()
+    for object_name in dict.fromkeys(object_names):
+        graph.merge(build_relationship_graph(sf_sandbox, object_name))
+    return graph
+
+
+def order_roots(graph, roots):
+    """
+    Ordena as raízes pais primeiro: uma raiz que é dependência de outra é migrada
+    antes, e a outra já encontra esses registros no mapa de IDs.
+    """
+    layers = topological_layers(graph)
+    position = {obj: index for index, layer in enumerate(layers) for obj in layer}
+    return sorted(roots, key=lambda root: position.get(root['object'], len(layers)))
+
+
+def job_objects(graph, roots):
+    """Objetos alcançáveis a partir de qualquer raiz, cada um uma única vez."""
+    return list(dict.fromkeys(obj for root in roots for obj in graph.reachable(root['object'])))
+
+
+def job_where_clauses(roots, journal=None):
+    """
+    Cláusulas WHERE por objeto raiz para o planejamento. Raízes do mesmo objeto com
+    filtros diferentes são combinadas com OR; com um `journal`, valem só as alterações
+    desde a última sincronização incremental.
+    """
+    by_object = {}
+    for root in roots:
+        clause = changed_where_clause(journal, root['object'], root['where']) if journal else root['where']
+        by_object.setdefault(root['object'], []).append(clause)
+
+    # Sem cláusula, alguma raiz leva o objeto inteiro
+    clauses = {object_name: any_of(object_clauses) for object_name, object_clauses in by_object.items()}
+    return {object_name: clause for object_name, clause in clauses.items() if clause}
+
+
+def run_job(sf_sandbox, sf_dev, roots, graph, journal, max_workers=DEFAULT_WORKERS, loader='layers'):
+    """
+    Migra todas as raízes do job, pais primeiro, com um único mapa de IDs.
+    Dependências compartilhadas (ex.: Account para Opportunity e Contract) são
+    buscadas e inseridas uma só vez: as raízes seguintes já as encontram no mapa.
+    O progresso de cada raiz fica no diário sob o seu filtro.
+    Retorna o mapa de IDs.
+    """
+    id_map = journal.load_id_map()
+    for root in order_roots(graph, roots):
+        object_name, where = root['object'], root['where']
+        logger.info("Migrando %s%s", object_name, f" ({where})" if where else "")
+        fields = get_object_fields(sf_sandbox, sf_dev, object_name)
+        # Os blocos são carregados enquanto as próximas páginas ainda estão sendo baixadas
+        chunks = prefetch(iter_pending_root_chunks(sf_sandbox, object_name, fields, journal, where, root['limit']))
+        migrate_chunks_with_dependencies(sf_sandbox, sf_dev, object_name, chunks, graph, id_map=id_map, journal=journal,
+                                         scope=where, max_workers=max_workers, loader=loader)
+    return id_map
+
+
+def run_delta_job(sf_sandbox, sf_dev, roots, graph, journal, external_id_field=None, deletes=False,
+                  max_workers=DEFAULT_WORKERS):
+    """Sincroniza de forma incremental todas as raízes do job, pais primeiro. Retorna (alterados, excluídos)."""
+    changed = deleted = 0
+    for root in order_roots(graph, roots):
+        root_changed, root_deleted = sync_object_delta(sf_sandbox, sf_dev, root['object'], graph, journal,
+                                                       external_id_field=external_id_field, deletes=deletes,
+                                                       where_clause=root['where'], max_workers=max_workers)
+        changed += root_changed
+        deleted += root_deleted
+    return changed, deleted
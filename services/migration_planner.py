@@ -0,0 +1,98 @@
+# services/migration_planner.py
+
+import math
+
+from colorama import Fore, init
+
+from utils.bulk_utils import BULK_CHUNK_SIZE, COLLECTIONS_BATCH_SIZE, choose_load_mode
+from utils.salesforce_utils import QUERY_BATCH_SIZE
+from utils.storage_utils import estimate_storage_mb
+
+# O plano é impresso como relatório; as cores voltam ao normal a cada linha
+init(autoreset=True)
+
+# Chamadas de um job do Bulk API 2.0 além das consultas de estado: criar, enviar, fechar, sucessos, falhas
+BULK_JOB_CALLS = 5
+# Consultas de estado esperadas por job enquanto o Salesforce processa
+BULK_JOB_POLLS = 3
+
+
+def count_records(sf, object_name, where_clause=""):
+    """Conta os registros do objeto com SELECT COUNT(), sem trazer nenhum registro."""
+    return sf.query(f"SELECT COUNT() FROM {object_name} {where_clause}".strip())['totalSize']
+
+
+def estimate_api_calls(record_count, mode):
+    """Estima as chamadas de API na origem (extração) e no destino (carga) para um objeto."""
+    source_calls = 1 + math.ceil(record_count / QUERY_BATCH_SIZE)
+    if mode == 'bulk':
+        target_calls = math.ceil(record_count / BULK_CHUNK_SIZE) * (BULK_JOB_CALLS + BULK_JOB_POLLS)
+    else:
+        target_calls = math.ceil(record_count / COLLECTIONS_BATCH_SIZE)
+    return source_calls, target_calls
+
+
+def plan_migration(sf_sandbox, sf_dev, layers, where_clauses=None):
+    """
+    Monta o plano da migração antes de mover qualquer dado.
+    Para cada objeto, na ordem de inserção, conta os registros na origem,
+    estima o armazenamento pelas regras do Salesforce, escolhe a API de carga
+    e estima as chamadas de API. O total é comparado com `limits()` das duas orgs.
+    Para dependências o volume é um limite superior, já que só os registros
+    referenciados são de fato migrados.
+    """
+    where_clauses = where_clauses or {}
+    objects = []
+    for layer in layers:
+        for obj in layer:
+            count = count_records(sf_sandbox, obj, where_clauses.get(obj, ""))
+            mode = choose_load_mode(count)
+            source_calls, target_calls = estimate_api_calls(count, mode)
+            objects.append({
+                'object': obj,
+                'records': count,
+                'storage_mb': estimate_storage_mb(obj, count),
+                'mode': mode,
+                'source_api_calls': source_calls,
+                'target_api_calls': target_calls,
+            })
+
+    source_limits = sf_sandbox.limits()
+    target_limits = sf_dev.limits()
+    totals = {
+        'records': sum(item['records'] for item in objects),
+        'storage_mb': sum(item['storage_mb'] for item in objects),
+        # As contagens acima também consomem chamadas na origem
+        'source_api_calls': sum(item['source_api_calls'] for item in objects) + len(objects),
+        'target_api_calls': sum(item['target_api_calls'] for item in objects),
+    }
+    available = {
+        'storage_mb': target_limits['DataStorageMB']['Remaining'],
+        'source_api_calls': source_limits['DailyApiRequests']['Remaining'],
+        'target_api_calls': target_limits['DailyApiRequests']['Remaining'],
+    }
+    violations = [
+        f"{key}: necessário {totals[key]:.0f}, disponível {available[key]:.0f}"
+        for key in available if totals[key] > available[key]
+    ]
+    return {'objects': objects, 'totals': totals, 'available': available, 'violations': violations}
+
+
+def print_plan(plan):
+    """Mostra o plano como tabela e destaca os limites que seriam ultrapassados."""
+    print(Fore.CYAN + f"{'Objeto':<40} {'Registros':>12} {'MB':>10} {'API':<12} {'Chamadas':>10}")
+    for item in plan['objects']:
+        calls = item['source_api_calls'] + item['target_api_calls']
+        print(f"{item['object']:<40} {item['records']:>12} {item['storage_mb']:>10.2f} {item['mode']:<12} {calls:>10}")
+
+    totals, available = plan['totals'], plan['available']
+    print(Fore.CYAN + f"Total: {totals['records']} registros, {totals['storage_mb']:.2f} MB "
+                      f"(disponível: {available['storage_mb']} MB)")
+    print(Fore.CYAN + f"Chamadas de API: origem {totals['source_api_calls']} (disponível: {available['source_api_calls']}), "
+                      f"destino {totals['target_api_calls']} (disponível: {available['target_api_calls']})")
+
+    if plan['violations']:
+        for violation in plan['violations']:
+            print(Fore.RED + f"Limite ultrapassado - {violation}")
+    else:
+        print(Fore.GREEN + "A migração cabe nos limites das duas orgs.")
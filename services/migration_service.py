@@ -1,105 +1,205 @@
-from simple_salesforce import Salesforce
-from simple_salesforce.exceptions import SalesforceMalformedRequest, SalesforceError
-from colorama import init, Fore, Style
-
-from utils.salesforce_utils import get_edge_field_name, get_object_fields, system_fields
-
-from simple_salesforce.exceptions import SalesforceMalformedRequest
-
-from utils.storage_utils import estimate_data_size, get_storage_limits
-
-
-# Inicializa o Colorama
-init(autoreset=True)
-
-
-def selectObject(sf_sandbox, object_name, fields, where_clause=""):
-    """Seleciona um objeto no Salesforce e retorna os registros."""
-    fields_str = ', '.join(fields)
-
-    query = f"SELECT {fields_str} FROM {object_name} {where_clause} LIMIT 1"  # Limitando a 10 registros
-    print(Fore.GREEN + f"Executando query para buscar registros de {object_name}: {query}")
-    records = sf_sandbox.query(query)['records']
-    records = [{k: v for k, v in record.items() if k != 'attributes'} for record in records]
-
-    print(Fore.BLUE + f"Número de registros encontrados em {sf_sandbox._instance_url}: {len(records)} para o objeto {object_name}")
-    return records
-
-
-def process_object_with_dependencies(sf_sandbox, sf_dev, object_name, ordered_objects):
-    """Processa um objeto no Salesforce e migra os dados, lidando com dependências e erros de permissão."""
-    storage_remaining_mb = get_storage_limits(sf_dev)
-
-    # Lista de campos de sistema a serem sempre ignorados
-
-    for obj in ordered_objects:
-        fields_info_sandbox = get_object_fields(sf_sandbox, obj)
-        fields_info_dev = get_object_fields(sf_dev, obj)
-        
-        # Usar apenas campos que existem em ambos os ambientes
-        common_fields = set(fields_info_sandbox.keys()) & set(fields_info_dev.keys()) - set(system_fields)
-        fields_str = ', '.join(common_fields)
-
-        query = f"SELECT {fields_str} FROM {obj} LIMIT 1"  # Limitando a 10 registros
-        print(Fore.GREEN + f"Executando query para buscar registros de {obj}: {query}")
-        records = sf_sandbox.query(query)['records']
-        records = [{k: v for k, v in record.items() if k != 'attributes'} for record in records]
-
-        print(Fore.BLUE + f"Número de registros encontrados em {sf_sandbox._instance_url}: {len(records)} para o objeto {obj}")
-
+import logging
+from collections import Counter
+
+from utils.salesforce_utils import EXTRACT_CHUNK_SIZE, PREFETCH_DEPTH, add_condition, get_load_plan, get_object_fields, iter_object_records, prefetch, rejected_fields, soql_quote
+
+from services.scheduler import DEFAULT_WORKERS, run_layers, run_ordered, run_parallel
+from utils.bulk_utils import BULK_CHUNK_SIZE, BULK_MAX_IN_FLIGHT, load_records, update_records
+from utils.metrics import metrics
+from utils.storage_utils import estimate_storage_mb, get_storage_limits
+
+logger = logging.getLogger(__name__)
+
+def load_object_records(sf_dev, object_name, records, max_attempts=3, mode=None, id_map=None, deferred=()):
+    """
+    Insere os registros em lote no Salesforce de destino.
+    Cada registro é projetado em uma passada pelo plano de carga do objeto
+    (`get_load_plan`): só campos criáveis, com os lookups reescritos pelo `id_map`
+    e os lookups em `deferred` vazios. Campos que o Salesforce ainda recusar saem do
+    plano, valendo também para os próximos lotes, e só as linhas que falharam por
+    causa deles são reenviadas, até um máximo de tentativas.
+    Retorna os resultados na mesma ordem de `records`.
+    """
+    plan = get_load_plan(sf_dev, object_name)
+    rows = [plan.project(record, id_map, deferred) for record in records]
+    results = [None] * len(rows)
+    pending = list(range(len(rows)))
+    # Erros registrados por código; o detalhe de cada linha só aparece em DEBUG
+    error_codes = Counter()
+
+    for attempt in range(max_attempts):
+        logger.debug("Tentativa %d de inserir %d registros para o objeto %s", attempt + 1, len(pending), object_name)
+        batch_results = load_records(sf_dev, object_name, [rows[i] for i in pending], mode)
+
+        retry = []
+        error_fields = set()
+        for index, result in zip(pending, batch_results):
+            results[index] = result
+            if result['success']:
+                continue
+            fields = rejected_fields(result['errors'])
+            codes = {error.get('statusCode') for error in result['errors']}
+            if codes & {'INSUFFICIENT_ACCESS_ON_CROSS_REFERENCE_ENTITY', 'INSUFFICIENT_ACCESS_OR_READONLY'}:
+                logger.debug("Erro de permissão detectado. Ignorando registro: %s", result['errors'])
+            elif fields & rows[index].keys():
+                error_fields.update(fields)
+                retry.append(index)
+                continue
+            else:
+                logger.debug("Erro ao inserir registro: %s", result['errors'])
+            error_codes.update(codes)
+
+        if not retry:
+            break
+        removed = plan.reject(error_fields)
+        if removed:
+            logger.info("Campos removidos de %s: %s", object_name, ', '.join(sorted(removed)))
+        for index in retry:
+            rows[index] = {k: v for k, v in rows[index].items() if k not in plan.rejected}
+        pending = retry
+    else:
+        logger.warning("Falha ao inserir %d registros de %s após %d tentativas.", len(pending), object_name, max_attempts)
+
+    failed = sum(1 for result in results if not result['success'])
+    metrics.inc('rows_loaded_total', len(results) - failed, object=object_name)
+    metrics.inc('rows_failed_total', failed, object=object_name)
+    if error_codes:
+        logger.warning("%d registros de %s falharam: %s", failed, object_name, dict(error_codes))
+    return results
+
+
+def migrate_object(sf_sandbox, sf_dev, obj, journal=None, max_workers=1, load_mode=None, id_map=None, deferred=None):
+    """
+    Extrai e carrega todos os registros de um objeto, com até `max_workers` blocos carregando em paralelo
+    (no Bulk API 2.0, até `BULK_MAX_IN_FLIGHT`, porque cada bloco é bem maior).
+    Com um `journal`, o objeto é pulado se já foi concluído e retoma do último bloco confirmado.
+    `load_mode` ('collections' ou 'bulk') vem do plano; sem ele a API é escolhida por bloco.
+    Os lookups são reescritos pelo `id_map` (por padrão o do diário), que recebe os
+    registros inseridos; lookups para pais ainda não migrados ficam vazios. Registros
+    que já estão no `id_map` não são inseridos de novo.
+    Os lookups em `deferred` ({campo: alvo}, ciclos e auto-relacionamentos) são
+    inseridos vazios; nesse caso o objeto só é marcado como concluído por quem
+    preencher esses lookups (ver `migrate_graph`).
+    Retorna (total, inseridos, armazenamento estimado em MB).
+    """
+    where_clause = ""
+    if journal:
+        cursor, done = journal.get_cursor(obj)
+        if done:
+            logger.info("Objeto %s já migrado segundo o diário. Pulando.", obj)
+            return 0, 0, 0
+        if cursor:
+            where_clause = add_condition(where_clause, f"Id > {soql_quote(cursor)}")
+    if id_map is None:
+        id_map = journal.load_id_map() if journal else {}
+
+    # Usar apenas campos que existem em ambos os ambientes
+    common_fields = get_object_fields(sf_sandbox, sf_dev, obj)
+    totals = {'total': 0, 'inserted': 0}
+
+    def load_chunk(records):
+        # Registros já no mapa de IDs (dependências de outra raiz, por exemplo) não são inseridos de novo
+        pending = [record for record in records if record['Id'] not in id_map]
+        return records, pending, load_object_records(sf_dev, obj, pending, mode=load_mode, id_map=id_map,
+                                                     deferred=deferred or {})
+
+    def commit_chunk(_, loaded):
+        # Chamado na ordem de extração, então o cursor só avança sobre blocos já confirmados
+        records, pending, results = loaded
+        mappings = [(obj, record['Id'], result['id']) for record, result in zip(pending, results) if result['success']]
+        id_map.update((source_id, target_id) for _, source_id, target_id in mappings)
+        if journal:
+            journal.commit_chunk(obj, mappings, cursor=records[-1]['Id'])
+        totals['total'] += len(records)
+        totals['inserted'] += sum(1 for result in results if result['success'])
+        logger.info("%d registros de %s processados.", totals['total'], obj)
+
+    # A carga de um bloco acontece enquanto os próximos ainda estão sendo baixados
+    chunk_size, depth = EXTRACT_CHUNK_SIZE, PREFETCH_DEPTH
+    if load_mode == 'bulk':
+        # No Bulk API 2.0 blocos maiores evitam um job por página; em troca, poucos ficam em memória ao mesmo tempo
+        chunk_size, depth, max_workers = BULK_CHUNK_SIZE, BULK_MAX_IN_FLIGHT, min(max_workers, BULK_MAX_IN_FLIGHT)
+    chunks = prefetch(iter_object_records(sf_sandbox, obj, common_fields, where_clause, chunk_size=chunk_size, order_by='Id'),
+                      depth)
+    run_ordered(chunks, load_chunk, commit_chunk, max_workers)
+
+    logger.info("%d de %d registros de %s inseridos com sucesso", totals['inserted'], totals['total'], obj)
+    if journal and not deferred:
+        journal.mark_done(obj)
+    return totals['total'], totals['inserted'], estimate_storage_mb(obj, totals['inserted'])
+
+
+def backfill_object_lookups(sf_sandbox, sf_dev, obj, fields, id_map, max_workers=1):
+    """
+    Preenche os lookups adiados (`fields`, {campo: alvo}) de um objeto já migrado,
+    com atualizações em lote. Os valores são lidos de novo da origem, só dos
+    registros com algum desses lookups preenchido, então o preenchimento também
+    cobre os blocos confirmados antes de uma retomada.
+    """
+    fields = sorted(fields)
+    where_clause = "WHERE " + ' OR '.join(f"{field} != null" for field in fields)
+    totals = {'updated': 0, 'failed': 0}
+
+    def update_chunk(records):
+        updates = []
         for record in records:
-            # Remover campos do sistema
-            record = {k: v for k, v in record.items() if k not in system_fields}
-
-            problematic_fields = set()
-            max_attempts = 3
-            attempt = 0
-
-            while attempt < max_attempts:
-                try:
-                    # Remover campos problemáticos identificados em tentativas anteriores
-                    record = {k: v for k, v in record.items() if k not in problematic_fields}
-
-                    # Remover campos de lookup (que terminam com '__c' e contêm IDs)
-                    record = {k: v for k, v in record.items() if not (k.endswith('__c') and isinstance(v, str) and v.startswith('001'))}
-
-                    # Tentar inserir o registro
-                    print(Fore.YELLOW + f"Tentativa {attempt + 1} de inserir registro para o objeto {obj}: {record}")
-                    result = sf_dev.__getattr__(obj).create(record)
-                    
-                    if result['success']:
-                        print(Fore.GREEN + f"Registro inserido com sucesso: {result['id']}")
-                        print(Fore.MAGENTA + f"Dados inseridos: {record}")  # Novo print colorido
-                        break  # Sair do loop se a inserção for bem-sucedida
-                    else:
-                        print(Fore.RED + f"Erro ao inserir registro: {result['errors']}")
-                        # Adicionar campos problemáticos à lista
-                        for error in result['errors']:
-                            if 'fields' in error:
-                                problematic_fields.update(error['fields'])
-                
-                except SalesforceMalformedRequest as e:
-                    print(Fore.RED + f"Erro ao processar registro: {str(e)}")
-                    # Extrair campos problemáticos da mensagem de erro
-                    if 'Unable to create/update fields:' in str(e):
-                        error_fields = str(e).split('Unable to create/update fields:')[1].split('.')[0].strip().split(', ')
-                        problematic_fields.update(error_fields)
-                    elif 'INSUFFICIENT_ACCESS_ON_CROSS_REFERENCE_ENTITY' in str(e):
-                        print(Fore.YELLOW + "Erro de permissão detectado. Ignorando este registro.")
-                        break  # Sair do loop, pois não podemos inserir este registro devido a restrições de permissão
-                
-                except SalesforceError as e:
-                    print(Fore.RED + f"Erro do Salesforce: {str(e)}")
-                    if 'INSUFFICIENT_ACCESS_OR_READONLY' in str(e):
-                        print(Fore.YELLOW + "Erro de permissão detectado. Ignorando este registro.")
-                        break  # Sair do loop, pois não podemos inserir este registro devido a restrições de permissão
-                    
-                attempt += 1
-
-                if attempt == max_attempts:
-                    print(Fore.RED + f"Falha ao inserir registro após {max_attempts} tentativas.")
-
-            storage_remaining_mb -= estimate_data_size([record])
-            print(Fore.CYAN + f"Registro de {obj} processado. Espaço restante: {storage_remaining_mb} MB.")
-
-        print(Fore.GREEN + f"Processamento concluído para o objeto {obj}")
\ No newline at end of file
+            values = {field: id_map[record[field]] for field in fields if record.get(field) in id_map}
+            if values and record['Id'] in id_map:
+                updates.append(dict(values, Id=id_map[record['Id']]))
+        return update_records(sf_dev, obj, updates)
+
+    def commit_chunk(_, results):
+        failed = [result['errors'] for result in results if not result['success']]
+        totals['updated'] += len(results) - len(failed)
+        totals['failed'] += len(failed)
+        for errors in failed:
+            logger.debug("Erro ao preencher lookup: %s", errors)
+
+    chunks = prefetch(iter_object_records(sf_sandbox, obj, ['Id'] + fields, where_clause, order_by='Id'))
+    run_ordered(chunks, update_chunk, commit_chunk, max_workers)
+
+    metrics.inc('rows_backfilled_total', totals['updated'], object=obj)
+    metrics.inc('rows_failed_total', totals['failed'], object=obj)
+    logger.info("%d lookups cíclicos de %s preenchidos", totals['updated'], obj)
+    if totals['failed']:
+        logger.warning("%d lookups cíclicos de %s não foram preenchidos", totals['failed'], obj)
+
+
+def migrate_graph(sf_sandbox, sf_dev, graph, journal=None, max_workers=DEFAULT_WORKERS, plan=None):
+    """
+    Migra todos os objetos do grafo por camadas topológicas.
+    Objetos independentes (mesma camada) e blocos de um mesmo objeto rodam em
+    paralelo, respeitando o limite total de `max_workers`; uma camada só começa
+    depois que os pais da camada anterior foram confirmados. Os lookups dentro
+    de uma componente (ciclos e auto-relacionamentos) são inseridos vazios e
+    preenchidos quando a camada termina. Com um `plan` (ver `plan_migration`),
+    cada objeto usa a API de carga escolhida no plano.
+    """
+    storage_remaining_mb = get_storage_limits(sf_dev)
+    layers, deferred = graph.insertion_plan()
+    modes = {item['object']: item['mode'] for item in plan['objects']} if plan else {}
+    # Um único mapa de IDs para todos os objetos: os filhos encontram os pais inseridos nas camadas anteriores
+    id_map = journal.load_id_map() if journal else {}
+
+    results = {}
+    for layer in layers:
+        # Objetos concluídos em uma execução anterior já tiveram os lookups adiados preenchidos
+        backfill = [obj for obj in layer if deferred.get(obj) and not (journal and journal.get_cursor(obj)[1])]
+        results.update(run_layers(
+            [layer],
+            lambda obj, workers: migrate_object(sf_sandbox, sf_dev, obj, journal, workers, modes.get(obj), id_map,
+                                                deferred.get(obj)),
+            max_workers,
+        ))
+        if not backfill:
+            continue
+        workers = max(1, max_workers // len(backfill))
+        run_parallel([lambda obj=obj: backfill_object_lookups(sf_sandbox, sf_dev, obj, deferred[obj], id_map, workers)
+                      for obj in backfill], max_workers)
+        if journal:
+            for obj in backfill:
+                journal.mark_done(obj)
+
+    storage_remaining_mb -= sum(size_mb for _, _, size_mb in results.values())
+    logger.info("Migração concluída para %d objetos. Espaço restante estimado: %.2f MB.", len(results), storage_remaining_mb)
+    return results
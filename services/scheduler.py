@@ -0,0 +1,67 @@
+# services/scheduler.py
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Número padrão de workers; cada worker passa a maior parte do tempo esperando a rede
+DEFAULT_WORKERS = int(os.environ.get('DATASYNC_WORKERS', 8))
+
+
+def topological_layers(graph, objects=None):
+    """
+    Divide os objetos do grafo em camadas, pais primeiro.
+    Objetos da mesma camada não dependem uns dos outros (fora de ciclos, cujos
+    lookups são adiados) e podem ser migrados em paralelo.
+    """
+    layers, _ = graph.insertion_plan(objects)
+    return layers
+
+
+def run_parallel(tasks, max_workers=DEFAULT_WORKERS):
+    """Executa os callables em paralelo e retorna os resultados na mesma ordem; repassa o primeiro erro."""
+    tasks = list(tasks)
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [task() for task in tasks]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def run_layers(layers, task, max_workers=DEFAULT_WORKERS):
+    """
+    Executa `task(obj, workers)` para cada objeto, camada por camada.
+    Uma camada só começa quando a anterior terminou, então os pais sempre são
+    confirmados antes dos filhos. `workers` é a fatia do limite de concorrência
+    que cada objeto pode usar internamente (ex.: para blocos).
+    """
+    results = {}
+    for layer in layers:
+        workers = max(1, max_workers // len(layer))
+        layer_results = run_parallel([lambda obj=obj: task(obj, workers) for obj in layer], max_workers)
+        results.update(zip(layer, layer_results))
+    return results
+
+
+def run_ordered(items, task, on_result, max_workers=DEFAULT_WORKERS):
+    """
+    Aplica `task` aos itens (ex.: blocos de registros) em paralelo, com no máximo
+    2 x `max_workers` itens em andamento para manter a memória limitada.
+    `on_result(item, result)` é chamado na ordem original dos itens, o que permite
+    avançar cursores de forma segura mesmo quando os blocos terminam fora de ordem.
+    """
+    if max_workers <= 1:
+        for item in items:
+            on_result(item, task(item))
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for item in items:
+            in_flight.append((item, executor.submit(task, item)))
+            if len(in_flight) >= 2 * max_workers:
+                done_item, future = in_flight.popleft()
+                on_result(done_item, future.result())
+        while in_flight:
+            done_item, future = in_flight.popleft()
+            on_result(done_item, future.result())
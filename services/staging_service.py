@@ -0,0 +1,79 @@
+# services/staging_service.py
+
+import logging
+
+from services.dependency_resolver import collect_dependency_records, load_collected_chunks, plan_dependencies
+from services.scheduler import DEFAULT_WORKERS
+from utils.salesforce_utils import (
+    add_condition, get_object_fields, iter_object_records, metadata_cache, prefetch, soql_quote,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def extract_to_staging(sf_sandbox, object_name, graph, staging, limit=None, max_workers=DEFAULT_WORKERS):
+    """
+    Extrai os registros raiz (com o filtro da área de staging) e as dependências de
+    cada bloco para a área de staging. Só a org de origem é consultada: são gravados todos os campos da origem e a
+    projeção para cada destino fica para a carga. Uma extração interrompida
+    retoma do último bloco gravado, e dependências já gravadas não são buscadas de novo.
+    Retorna o número de registros raiz extraídos.
+    """
+    if staging.done:
+        logger.info("Extração de %s já está completa em %s. Use --reset para extrair de novo.", object_name, staging.directory)
+        return 0
+
+    direct_dependencies, _, _ = plan_dependencies(graph, object_name)
+    describes = {obj: metadata_cache.describe(sf_sandbox, obj) for obj in graph.reachable(object_name)}
+    # Os Ids já gravados fazem o papel do mapa de IDs: a coleta não busca de novo o que já está no staging
+    staged = set().union(*staging.staged_ids().values())
+
+    where_clause = staging.scope
+    if staging.cursor:
+        logger.info("Retomando a extração de %s a partir do Id %s", object_name, staging.cursor)
+        where_clause = add_condition(where_clause, f"Id > {soql_quote(staging.cursor)}")
+
+    # Campos da própria origem (e não os comuns com um destino), para poder carregar em qualquer org
+    fields = get_object_fields(sf_sandbox, sf_sandbox, object_name)
+    total = 0
+    for records in prefetch(iter_object_records(sf_sandbox, object_name, fields, where_clause, limit, order_by='Id')):
+        collected = collect_dependency_records(sf_sandbox, sf_sandbox, object_name, records, direct_dependencies,
+                                               id_map=staged, max_workers=max_workers)
+        staging.write_chunk(records[-1]['Id'], collected, describes)
+        staged.update(source_id for obj_records in collected.values() for source_id in obj_records)
+        total += len(records)
+        logger.info("%d registros de %s gravados no staging", total, object_name)
+
+    # Com `limit` a extração é parcial: uma nova execução continua do cursor
+    if not limit:
+        staging.mark_done()
+        logger.info("Extração de %s concluída em %s", object_name, staging.directory)
+    return total
+
+
+def load_from_staging(sf_sandbox, sf_dev, object_name, graph, staging, journal, id_map=None, max_workers=DEFAULT_WORKERS,
+                      loader='layers'):
+    """
+    Carrega no destino os blocos gravados na área de staging, sem consultar os dados da origem.
+    O diário do par de orgs guarda o progresso como na migração direta: a carga
+    retoma depois do último bloco confirmado e pode ser repetida em outras orgs de destino.
+    O `id_map` pode ser compartilhado entre raízes. Retorna o mapa de IDs.
+    """
+    if not staging.manifest['chunks']:
+        logger.warning("Nada extraído para %s em %s. Rode o comando extract antes.", object_name, staging.directory)
+        return id_map if id_map is not None else {}
+    if not staging.done:
+        logger.warning("A extração de %s não foi concluída; só os blocos já gravados serão carregados.", object_name)
+
+    cursor, _ = journal.get_cursor(object_name, scope=staging.scope)
+    if cursor and not staging.has_cursor(cursor):
+        # O diário avançou por outro caminho (migração direta ou uma extração anterior, já descartada)
+        logger.error("Diário e staging de %s não correspondem: o diário está no Id %s, que não é o fim de nenhum "
+                     "bloco em %s. Nada foi carregado.", object_name, cursor, staging.directory)
+        return id_map if id_map is not None else {}
+    if cursor:
+        logger.info("Retomando a carga de %s a partir do Id %s", object_name, cursor)
+    # A leitura do próximo bloco do disco acontece enquanto o atual é carregado
+    chunks = prefetch(staging.iter_chunks(after=cursor))
+    return load_collected_chunks(sf_sandbox, sf_dev, object_name, chunks, graph, id_map, journal, staging.scope, max_workers,
+                                 loader)
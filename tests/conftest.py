@@ -0,0 +1,20 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Os módulos do projeto são importados a partir da raiz do repositório (utils.*, services.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def metadata_cache(tmp_path, monkeypatch):
+    """Cache de describes novo e isolado para o teste, no lugar do compartilhado pelo processo."""
+    from utils.metadata_cache import MetadataCache
+
+    cache = MetadataCache(str(tmp_path / 'metadata.sqlite'))
+    for module in ('utils.salesforce_utils', 'services.delta_sync', 'services.staging_service'):
+        monkeypatch.setattr(f'{module}.metadata_cache', cache)
+    return cache
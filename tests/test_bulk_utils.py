@@ -0,0 +1,104 @@
+# tests/test_bulk_utils.py
+
+import utils.bulk_utils as bulk_utils
+from utils.bulk_utils import _build_csv_uploads, _map_job_results, _parse_bulk_error, choose_load_mode
+
+
+def _job_results(monkeypatch, successful, failed):
+    rows = {'successfulResults': successful, 'failedResults': failed}
+    monkeypatch.setattr(bulk_utils, '_read_results', lambda sf, job_id, kind: rows[kind])
+
+
+def test_map_job_results_matches_rows_by_values_not_order(monkeypatch):
+    columns = ['Name', 'Amount']
+    records = [{'Name': 'A', 'Amount': 1}, {'Name': 'B', 'Amount': None}, {'Name': 'C', 'Amount': 3}]
+    _job_results(
+        monkeypatch,
+        successful=[{'sf__Id': 'id-c', 'Name': 'C', 'Amount': '3'}, {'sf__Id': 'id-a', 'Name': 'A', 'Amount': '1'}],
+        failed=[{'sf__Error': 'REQUIRED_FIELD_MISSING:Required fields are missing: [Amount]:Amount --', 'Name': 'B', 'Amount': ''}],
+    )
+    results = [None] * 3
+
+    _map_job_results(None, 'job', columns, records, [0, 1, 2], results)
+
+    assert [result['id'] for result in results] == ['id-a', None, 'id-c']
+    assert results[1]['errors'] == [{'statusCode': 'REQUIRED_FIELD_MISSING',
+                                     'message': 'Required fields are missing: [Amount]', 'fields': ['Amount']}]
+
+
+def test_map_job_results_identical_rows_each_get_one_result(monkeypatch):
+    records = [{'Name': 'X'}, {'Name': 'X'}]
+    _job_results(monkeypatch, successful=[{'sf__Id': 'id-1', 'Name': 'X'}, {'sf__Id': 'id-2', 'Name': 'X'}], failed=[])
+    results = [None] * 2
+
+    _map_job_results(None, 'job', ['Name'], records, [0, 1], results)
+
+    assert sorted(result['id'] for result in results) == ['id-1', 'id-2']
+
+
+def test_map_job_results_marks_missing_rows_not_processed(monkeypatch):
+    records = [{'Name': 'A'}, {'Name': 'B'}]
+    _job_results(monkeypatch, successful=[{'sf__Id': 'id-a', 'Name': 'A'}], failed=[])
+    results = [None] * 2
+
+    _map_job_results(None, 'job', ['Name'], records, [0, 1], results)
+
+    assert results[0]['success']
+    assert results[1]['errors'][0]['statusCode'] == 'NOT_PROCESSED'
+
+
+def test_parse_bulk_error_without_fields():
+    assert _parse_bulk_error('UNABLE_TO_LOCK_ROW:unable to obtain exclusive access') == {
+        'statusCode': 'UNABLE_TO_LOCK_ROW', 'message': 'unable to obtain exclusive access', 'fields': []}
+
+
+def test_build_csv_uploads_splits_at_max_bytes(monkeypatch):
+    monkeypatch.setattr(bulk_utils, 'BULK_MAX_UPLOAD_BYTES', 100)
+    records = [{'Name': f'registro {i:03d}'} for i in range(20)]
+
+    uploads = list(_build_csv_uploads(records, ['Name']))
+
+    assert len(uploads) > 1
+    assert [index for indices, _ in uploads for index in indices] == list(range(20))
+    assert all(csv_data.startswith('Name\n') and len(csv_data) <= 100 for _, csv_data in uploads)
+
+
+def test_choose_load_mode_by_volume():
+    assert choose_load_mode(10) == 'collections'
+    assert choose_load_mode(10 ** 6) == 'bulk'
+
+
+def test_retry_locked_rows_resends_only_locked_rows(monkeypatch):
+    monkeypatch.setattr(bulk_utils.time, 'sleep', lambda seconds: None)
+    locked = {'success': False, 'errors': [{'statusCode': 'UNABLE_TO_LOCK_ROW', 'message': 'locked'}]}
+    invalid = {'success': False, 'errors': [{'statusCode': 'REQUIRED_FIELD_MISSING', 'message': 'Name'}]}
+    calls = []
+
+    def operation(records, mode):
+        calls.append(([record['Name'] for record in records], mode))
+        if len(calls) == 1:
+            return [{'success': True, 'id': 'a', 'errors': []}, dict(locked), dict(invalid), dict(locked)]
+        if len(calls) == 2:
+            return [dict(locked), {'success': True, 'id': 'd', 'errors': []}]
+        return [{'success': True, 'id': 'b', 'errors': []}]
+
+    results = bulk_utils._retry_locked_rows(operation, [{'Name': name} for name in 'abcd'], 'bulk')
+
+    assert calls == [(['a', 'b', 'c', 'd'], 'bulk'), (['b', 'd'], 'collections'), (['b'], 'collections')]
+    assert [result.get('id') for result in results] == ['a', 'b', None, 'd']
+    assert results[2] == invalid
+
+
+def test_retry_locked_rows_gives_up_after_lock_retries(monkeypatch):
+    monkeypatch.setattr(bulk_utils.time, 'sleep', lambda seconds: None)
+    locked = {'success': False, 'errors': [{'statusCode': 'UNABLE_TO_LOCK_ROW', 'message': 'locked'}]}
+    calls = []
+
+    def operation(records, mode):
+        calls.append(len(records))
+        return [dict(locked) for _ in records]
+
+    results = bulk_utils._retry_locked_rows(operation, [{'Name': 'a'}], 'collections')
+
+    assert len(calls) == 1 + bulk_utils.LOCK_RETRIES
+    assert not results[0]['success']
@@ -0,0 +1,97 @@
+# tests/test_composite_graph.py
+
+import pytest
+
+import utils.composite_graph as composite_graph
+from utils.composite_graph import GRAPH_MAX_DEPTH, _graph_results, graph_requests, pack_record_graphs
+
+
+def _parents(mapping):
+    return lambda node: mapping.get(node, [])
+
+
+def test_parents_come_before_children_in_the_same_graph():
+    graphs, waiting = pack_record_graphs(['child'], _parents({'child': ['parent'], 'parent': ['grandparent']}), set())
+
+    assert graphs == [['grandparent', 'parent', 'child']]
+    assert waiting == []
+
+
+def test_shared_parent_is_inserted_once():
+    parents = _parents({'c1': ['p'], 'c2': ['p']})
+
+    graphs, waiting = pack_record_graphs(['c1', 'c2'], parents, set())
+
+    assert graphs == [['p', 'c1', 'c2']]
+    assert waiting == []
+
+
+def test_independent_trees_are_packed_up_to_pack_size(monkeypatch):
+    monkeypatch.setattr(composite_graph, 'GRAPH_PACK_NODES', 4)
+
+    graphs, _ = pack_record_graphs([f"r{i}" for i in range(10)], _parents({}), set())
+
+    assert [len(graph) for graph in graphs] == [4, 4, 2]
+
+
+def test_record_whose_parents_are_in_two_graphs_waits(monkeypatch):
+    monkeypatch.setattr(composite_graph, 'GRAPH_PACK_NODES', 2)
+    parents = _parents({'a': ['pa'], 'b': ['pb'], 'both': ['pa', 'pb']})
+
+    graphs, waiting = pack_record_graphs(['a', 'b', 'both'], parents, set())
+
+    assert graphs == [['pa', 'a'], ['pb', 'b']]
+    assert waiting == ['both']
+
+
+def test_full_graph_sends_record_to_next_round(monkeypatch):
+    monkeypatch.setattr(composite_graph, 'GRAPH_MAX_NODES', 3)
+    parents = _parents({'c1': ['p'], 'c2': ['p'], 'c3': ['p']})
+
+    graphs, waiting = pack_record_graphs(['c1', 'c2', 'c3'], parents, set())
+
+    assert graphs == [['p', 'c1', 'c2']]
+    assert waiting == ['c3']
+
+
+def test_too_many_pending_ancestors_blocks_the_record(monkeypatch):
+    monkeypatch.setattr(composite_graph, 'GRAPH_MAX_NODES', 3)
+    blocked = set()
+
+    graphs, waiting = pack_record_graphs(['c'], _parents({'c': ['p1', 'p2', 'p3']}), blocked)
+
+    assert graphs == [] and waiting == []
+    assert blocked == {'c'}
+
+
+def test_too_deep_chain_and_descendants_of_blocked_records_are_blocked():
+    chain = {f"n{i}": [f"n{i + 1}"] for i in range(GRAPH_MAX_DEPTH)}
+    blocked = {'bad'}
+
+    graphs, _ = pack_record_graphs(['n0', 'child'], _parents(dict(chain, child=['bad'])), blocked)
+
+    assert graphs == []
+    assert blocked == {'bad', 'n0', 'child'}
+
+
+@pytest.mark.parametrize('sizes, expected', [
+    ([1] * 80, [75, 5]),
+    ([300, 300], [1, 1]),
+    ([200, 200, 100], [3]),
+])
+def test_graph_requests_respect_graph_and_node_limits(sizes, expected):
+    batches = list(graph_requests([['x'] * size for size in sizes]))
+    assert [len(batch) for batch in batches] == expected
+
+
+def test_failed_graph_reports_processing_halted_for_innocent_nodes():
+    graph = [('Account', 'a1', {}), ('Contact', 'c1', {})]
+    response = {'isSuccessful': False, 'graphResponse': {'compositeResponse': [
+        {'referenceId': 'refa1', 'body': {'id': '001x'}},
+        {'referenceId': 'refc1', 'body': [{'errorCode': 'REQUIRED_FIELD_MISSING', 'message': 'LastName', 'fields': ['LastName']}]},
+    ]}}
+
+    results = _graph_results(graph, response)
+
+    assert results['a1']['errors'][0]['statusCode'] == 'PROCESSING_HALTED'
+    assert results['c1']['errors'] == [{'statusCode': 'REQUIRED_FIELD_MISSING', 'message': 'LastName', 'fields': ['LastName']}]
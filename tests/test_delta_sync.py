@@ -0,0 +1,151 @@
+# tests/test_delta_sync.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce, field
+from benchmarks.run_benchmarks import _schema_with
+from services.delta_sync import changed_where_clause, sync_deletes, sync_object_delta, write_changed_records
+from services.job_runner import build_job_graph
+from utils.bulk_utils import BULK_API_THRESHOLD
+from utils.migration_journal import MigrationJournal
+
+
+def test_changed_where_clause_filters_from_watermark_of_same_scope(tmp_path):
+    journal = MigrationJournal(SimpleNamespace(sf_instance='source'), SimpleNamespace(sf_instance='target'),
+                               str(tmp_path / 'journal.sqlite'))
+    assert changed_where_clause(journal, 'Account') == ''
+
+    journal.commit_chunk('Account', [], watermark='2024-05-01T10:00:00.000+0000')
+    journal.commit_chunk('Account', [], scope="WHERE Type = 'Customer'", watermark='2024-06-01T10:00:00.000+0000')
+
+    assert changed_where_clause(journal, 'Account') == "WHERE SystemModstamp >= 2024-05-01T10:00:00.000+0000"
+    clause = changed_where_clause(journal, 'Account', "WHERE Type = 'Customer'")
+    assert 'SystemModstamp >= 2024-06-01T10:00:00.000+0000' in clause and "Type = 'Customer'" in clause
+
+
+SCHEMA = _schema_with({
+    'Account': [field('Description'), field('ParentId', 'reference', 'Account'),
+                field('Legacy_Id__c', externalId=True, idLookup=True)],
+})
+
+
+def _target_accounts(count, **values):
+    """Org de destino com `count` contas já migradas e o mapa de IDs {Id de origem: Id de destino}."""
+    target = FakeOrg('target', SCHEMA)
+    parent = {'Name': 'Parent'}
+    target.add_records('Account', [parent])
+    rows = [dict(values, Name=f"Account {i}", ParentId=parent['Id'], Description='antiga', Legacy_Id__c=f"S{i:05d}")
+            for i in range(count)]
+    target.add_records('Account', rows)
+    return target, {row['Legacy_Id__c']: row['Id'] for row in rows}
+
+
+@pytest.mark.parametrize('external_id_field', [None, 'Legacy_Id__c'])
+def test_bulk_sync_clears_fields_nulled_in_the_source(metadata_cache, external_id_field):
+    target, id_map = _target_accounts(BULK_API_THRESHOLD)
+    changed = [{'Id': source_id, 'Name': 'Renomeada', 'Description': None, 'ParentId': None, 'Legacy_Id__c': source_id}
+               for source_id in id_map]
+
+    mappings, pending = write_changed_records(FakeSalesforce(target), 'Account', changed, ['ParentId'], dict(id_map),
+                                              external_id_field)
+
+    assert target.calls['bulk'] and not pending and not mappings
+    for target_id in id_map.values():
+        row = target.records['Account'][target_id]
+        assert (row['Name'], row.get('Description'), row.get('ParentId')) == ('Renomeada', None, None)
+
+
+@pytest.fixture
+def delta(tmp_path, metadata_cache):
+    """Orgs falsas de origem e destino com um diário novo e uma função que roda a sincronização de Account."""
+    source, target = FakeOrg('source', SCHEMA), FakeOrg('target', SCHEMA)
+    sf_sandbox, sf_dev = FakeSalesforce(source), FakeSalesforce(target)
+    journal = MigrationJournal(sf_sandbox, sf_dev, str(tmp_path / 'journal.sqlite'))
+    graph = build_job_graph(sf_sandbox, ['Account'])
+
+    def sync(**kwargs):
+        return sync_object_delta(sf_sandbox, sf_dev, 'Account', graph, journal, max_workers=1, **kwargs)
+
+    return SimpleNamespace(source=source, target=target, sf_sandbox=sf_sandbox, sf_dev=sf_dev, journal=journal, sync=sync)
+
+
+def _touch(org, record_id, **values):
+    """Altera um registro da origem com um SystemModstamp posterior ao da carga inicial."""
+    org.records['Account'][record_id].update(values, SystemModstamp='2024-02-01T00:00:00.000+0000')
+
+
+def test_upsert_matches_by_external_id_and_only_reads_changed_rows(delta):
+    delta.source.add_records('Account', [
+        {'Name': f"Account {i}", 'SystemModstamp': f"2024-01-0{i + 1}T00:00:00.000+0000"} for i in range(3)
+    ])
+    first, *_ = delta.source.records['Account']
+
+    assert delta.sync(external_id_field='Legacy_Id__c') == (3, 0)
+    assert {row['Legacy_Id__c'] for row in delta.target.records['Account'].values()} == set(delta.source.records['Account'])
+
+    # A linha alterada e a que empata com a marca d'água (>=); a do meio não é lida de novo
+    _touch(delta.source, first, Name='Renomeada')
+    assert delta.sync(external_id_field='Legacy_Id__c') == (2, 0)
+
+    rows = list(delta.target.records['Account'].values())
+    assert len(rows) == 3
+    assert [row['Name'] for row in rows if row['Legacy_Id__c'] == first] == ['Renomeada']
+
+
+def test_update_reinserts_records_deleted_in_the_target(delta):
+    delta.source.add_records('Account', [{'Name': 'Acme'}, {'Name': 'Globex'}])
+    acme, globex = delta.source.records['Account']
+    delta.sync()
+    old_target = delta.journal.load_id_map()[acme]
+    delta.target.records['Account'].pop(old_target)
+
+    _touch(delta.source, acme, Name='Acme 2')
+    _touch(delta.source, globex, Name='Globex 2')
+    delta.sync()
+
+    id_map = delta.journal.load_id_map()
+    assert id_map[acme] != old_target
+    assert delta.target.records['Account'][id_map[acme]]['Name'] == 'Acme 2'
+    assert delta.target.records['Account'][id_map[globex]]['Name'] == 'Globex 2'
+    assert len(delta.target.records['Account']) == 2
+
+
+def test_lookups_to_parents_created_in_the_same_chunk_are_backfilled(delta):
+    parent, child = {'Name': 'Matriz'}, {'Name': 'Filial'}
+    delta.source.add_records('Account', [parent])
+    child['ParentId'] = parent['Id']
+    delta.source.add_records('Account', [child])
+
+    delta.sync()
+
+    id_map = delta.journal.load_id_map()
+    assert delta.target.records['Account'][id_map[child['Id']]]['ParentId'] == id_map[parent['Id']]
+
+
+def test_deletes_start_at_first_sync_and_follow_the_watermark(delta):
+    delta.source.add_records('Account', [{'Name': 'Acme'}, {'Name': 'Globex'}])
+    acme, globex = delta.source.records['Account']
+    assert delta.sync(deletes=True) == (2, 0)
+    assert delta.journal.get_watermark('Account', kind='deleted')
+
+    delta.source.delete(acme)
+    assert delta.sync(deletes=True)[1] == 1
+
+    id_map = delta.journal.load_id_map()
+    assert acme not in id_map and list(delta.target.records['Account']) == [id_map[globex]]
+    # O getDeleted seguinte começa na cobertura gravada e não exclui nada de novo
+    assert delta.sync(deletes=True)[1] == 0
+
+
+def test_deletes_fall_back_to_the_external_id(delta):
+    delta.source.add_records('Account', [{'Name': 'Acme'}])
+    acme, = delta.source.records['Account']
+    delta.target.add_records('Account', [{'Name': 'Acme', 'Legacy_Id__c': acme}])
+    delta.journal.commit_deletes('Account', [], '2024-01-01T00:00:00+00:00')
+    delta.source.delete(acme)
+
+    removed = sync_deletes(delta.sf_sandbox, delta.sf_dev, 'Account', delta.journal, {}, 'Legacy_Id__c')
+
+    assert removed == 1 and not delta.target.records['Account']
@@ -0,0 +1,27 @@
+# tests/test_dependency_resolver.py
+
+import pytest
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce
+from benchmarks.run_benchmarks import cycles
+from services.dependency_resolver import load_dependency_graphs, load_dependency_records, plan_dependencies
+from services.job_runner import build_job_graph
+
+
+@pytest.mark.parametrize('load', [load_dependency_records, load_dependency_graphs])
+def test_dependencies_are_not_matched_by_name(metadata_cache, load):
+    source, schema, root, _ = cycles(0.01)
+    target = FakeOrg('target', schema)
+    target.add_records('Account', [{'Name': 'Acme'}])
+    sf_dev = FakeSalesforce(target)
+    # Dois registros distintos com o mesmo nome de um que já existe no destino
+    accounts = {source_id: dict(row, Name='Acme', ParentId=None, PrimaryContact__c=None)
+                for source_id, row in list(source.records['Account'].items())[:2]}
+    direct_dependencies, layers, deferred = plan_dependencies(build_job_graph(FakeSalesforce(source), [root]), root)
+
+    mappings = load(sf_dev, {'Account': accounts}, direct_dependencies, layers, {}, 1, deferred)
+
+    targets = {source_id: target_id for _, source_id, target_id in mappings}
+    assert set(targets) == set(accounts)
+    assert len(set(targets.values())) == 2
+    assert target.count('Account') == 3
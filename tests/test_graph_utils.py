@@ -0,0 +1,73 @@
+# tests/test_graph_utils.py
+
+from utils.graph_utils import DependencyGraph
+
+
+def _graph(*edges):
+    graph = DependencyGraph()
+    for source, target, field in edges:
+        graph.add_edge(source, target, field)
+    return graph
+
+
+def test_insertion_plan_puts_parents_first():
+    graph = _graph(('Opportunity', 'Account', 'AccountId'), ('Account', 'User__c', 'Owner__c'))
+
+    layers, deferred = graph.insertion_plan()
+
+    assert layers == [['User__c'], ['Account'], ['Opportunity']]
+    assert deferred == {}
+
+
+def test_insertion_plan_defers_self_lookup():
+    graph = _graph(('Account', 'Account', 'ParentId'))
+
+    layers, deferred = graph.insertion_plan()
+
+    assert layers == [['Account']]
+    assert deferred == {'Account': {'ParentId': 'Account'}}
+
+
+def test_insertion_plan_keeps_cycle_in_one_layer_and_defers_its_lookups():
+    graph = _graph(
+        ('Opportunity', 'Account', 'AccountId'),
+        ('Account', 'Contact', 'PrimaryContact__c'),
+        ('Contact', 'Account', 'AccountId'),
+        ('Account', 'Account', 'ParentId'),
+    )
+
+    layers, deferred = graph.insertion_plan()
+
+    assert layers == [['Account', 'Contact'], ['Opportunity']]
+    assert deferred == {
+        'Account': {'PrimaryContact__c': 'Contact', 'ParentId': 'Account'},
+        'Contact': {'AccountId': 'Account'},
+    }
+
+
+def test_insertion_plan_restricted_to_objects():
+    graph = _graph(('Opportunity', 'Account', 'AccountId'), ('Contract', 'Account', 'AccountId'),
+                   ('Account', 'Account', 'ParentId'))
+
+    layers, deferred = graph.insertion_plan(graph.reachable('Opportunity'))
+
+    assert layers == [['Account'], ['Opportunity']]
+    assert deferred == {'Account': {'ParentId': 'Account'}}
+
+
+def test_strongly_connected_components_handles_long_chain_without_recursion():
+    graph = _graph(*((f"Level{i}__c", f"Level{i + 1}__c", 'Parent__c') for i in range(5000)))
+
+    components = graph.strongly_connected_components()
+
+    assert len(components) == 5001
+    assert components[0] == ['Level5000__c']
+
+
+def test_remove_edge_single_field_keeps_other_fields():
+    graph = _graph(('Case', 'Contact', 'ContactId'), ('Case', 'Contact', 'Reviewer__c'))
+
+    graph.remove_edge('Case', 'Contact', 'ContactId')
+
+    assert graph.fields('Case', 'Contact') == ['Reviewer__c']
+    assert graph.number_of_edges() == 1
@@ -0,0 +1,96 @@
+# tests/test_job_runner.py
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services.job_runner import job_roots, job_where_clauses, order_roots, parse_where_filters, where_clause
+from utils.graph_utils import DependencyGraph
+from utils.migration_journal import MigrationJournal
+
+CLOSED_WON = "StageName = 'Closed Won'"
+
+
+@pytest.mark.parametrize('condition, expected', [
+    (CLOSED_WON, f"WHERE {CLOSED_WON}"),
+    (f"WHERE {CLOSED_WON}", f"WHERE {CLOSED_WON}"),
+    (f"where\t{CLOSED_WON}", f"WHERE {CLOSED_WON}"),
+    (f"  WHERE\n{CLOSED_WON}", f"WHERE {CLOSED_WON}"),
+    ("Whereabouts__c = 'x'", "WHERE Whereabouts__c = 'x'"),
+    ('', ''),
+    (None, ''),
+])
+def test_where_clause_normalizes_keyword(condition, expected):
+    assert where_clause(condition) == expected
+
+
+def test_parse_where_filters_matches_objects_case_insensitively_and_ors_duplicates():
+    clauses = parse_where_filters([f"opportunity={CLOSED_WON}", "Opportunity=Amount > 1000"])
+
+    assert clauses == {'opportunity': f"WHERE ({CLOSED_WON}) OR (Amount > 1000)"}
+
+
+@pytest.mark.parametrize('item', ['Opportunity', '=Amount > 0', 'Opportunity=', 'Opportunity=WHERE '])
+def test_parse_where_filters_rejects_malformed_filters(item):
+    with pytest.raises(ValueError):
+        parse_where_filters([item])
+
+
+def test_job_roots_applies_filter_regardless_of_case():
+    assert job_roots(['Opportunity'], [f"opportunity={CLOSED_WON}"]) == [
+        {'object': 'Opportunity', 'where': f"WHERE {CLOSED_WON}", 'limit': None}]
+
+
+def test_job_roots_rejects_filter_for_object_that_is_not_a_root():
+    with pytest.raises(ValueError, match='Opportunity'):
+        job_roots(['Contract'], [f"Opportunity={CLOSED_WON}"])
+
+
+def test_job_roots_merges_spec_and_arguments(tmp_path):
+    spec = tmp_path / 'job.json'
+    spec.write_text(json.dumps({'roots': [
+        {'object': 'Opportunity', 'where': CLOSED_WON, 'limit': 100},
+        'Contract',
+        {'object': 'Account'},
+    ]}))
+
+    roots = job_roots(['contract', 'Case'], ['Account=Type = \'Customer\''], str(spec), limit=10)
+
+    assert roots == [
+        {'object': 'Opportunity', 'where': f"WHERE {CLOSED_WON}", 'limit': 100},
+        {'object': 'Contract', 'where': '', 'limit': 10},
+        {'object': 'Account', 'where': "WHERE Type = 'Customer'", 'limit': 10},
+        {'object': 'Case', 'where': '', 'limit': 10},
+    ]
+
+
+def test_job_where_clauses_ors_roots_of_same_object_and_drops_unfiltered():
+    roots = [
+        {'object': 'Opportunity', 'where': f"WHERE {CLOSED_WON}"},
+        {'object': 'Opportunity', 'where': "WHERE\tAmount > 1000"},
+        {'object': 'Account', 'where': "WHERE Type = 'Customer'"},
+        {'object': 'Account', 'where': ''},
+    ]
+
+    assert job_where_clauses(roots) == {'Opportunity': f"WHERE ({CLOSED_WON}) OR (Amount > 1000)"}
+
+
+def test_job_where_clauses_with_journal_adds_watermark_of_each_root(tmp_path):
+    journal = MigrationJournal(SimpleNamespace(sf_instance='source'), SimpleNamespace(sf_instance='target'),
+                               str(tmp_path / 'journal.sqlite'))
+    journal.commit_chunk('Opportunity', [], scope=f"WHERE {CLOSED_WON}", watermark='2024-05-01T10:00:00.000+0000')
+
+    clauses = job_where_clauses([{'object': 'Opportunity', 'where': f"WHERE {CLOSED_WON}"}], journal)
+
+    assert clauses == {'Opportunity': f"WHERE ({CLOSED_WON}) AND SystemModstamp >= 2024-05-01T10:00:00.000+0000"}
+
+
+def test_order_roots_puts_parent_roots_first():
+    graph = DependencyGraph()
+    graph.add_edge('Opportunity', 'Account', 'AccountId')
+    graph.add_edge('Contract', 'Account', 'AccountId')
+
+    roots = order_roots(graph, [{'object': 'Opportunity'}, {'object': 'Account'}, {'object': 'Contract'}])
+
+    assert roots[0] == {'object': 'Account'}
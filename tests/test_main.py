@@ -0,0 +1,31 @@
+# tests/test_main.py
+
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce
+from benchmarks.run_benchmarks import cycles
+from utils.migration_journal import MigrationJournal
+
+
+def test_plan_with_reset_leaves_the_journal_untouched(tmp_path, monkeypatch, metadata_cache):
+    source, schema, root, _ = cycles(0.01)
+    clients = {'source': FakeSalesforce(source), 'target': FakeSalesforce(FakeOrg('target', schema))}
+    monkeypatch.setitem(sys.modules, 'config', SimpleNamespace(sandbox_credentials={'org': 'source'},
+                                                                dev_credentials={'org': 'target'}))
+    import main
+
+    monkeypatch.setattr(main, 'authenticate_salesforce', lambda org, **kwargs: clients[org])
+    monkeypatch.setattr(main, 'MigrationJournal', lambda sf_sandbox, sf_dev: journal)
+    journal = MigrationJournal(clients['source'], clients['target'], str(tmp_path / 'journal.sqlite'))
+    journal.commit_chunk(root, [(root, 'o1', 't1')], cursor='o1', watermark='2024-05-01T10:00:00.000+0000')
+    monkeypatch.setattr(sys, 'argv', ['main.py', '--object', root, '--plan', '--reset', '--delta'])
+
+    with pytest.raises(SystemExit):
+        main.main()
+
+    assert journal.load_id_map() == {'o1': 't1'}
+    assert journal.get_cursor(root) == ('o1', False)
+    assert journal.get_watermark(root)
@@ -0,0 +1,132 @@
+# tests/test_metadata_cache.py
+
+import sqlite3
+
+import pytest
+
+from utils.metadata_cache import MetadataCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeOrg:
+    """
+    Responde ao describe global, aos describes de objeto e ao /composite/batch, registrando as chamadas.
+    `changed` diz se algo mudou na org; `modified`, quais objetos mudaram.
+    """
+
+    sf_instance = 'org.my.salesforce.com'
+    sf_version = '59.0'
+    base_url = 'https://org.my.salesforce.com/services/data/v59.0/'
+    headers = {}
+
+    def __init__(self):
+        self.changed = False
+        self.modified = set()
+        self.calls = []
+        self.session = self
+
+    def get(self, url, headers):
+        path = url[len(self.base_url):]
+        self.calls.append((path, 'If-Modified-Since' in headers))
+        if path == 'sobjects':
+            return FakeResponse(200 if self.changed else 304)
+        object_name = path.split('/')[1]
+        if 'If-Modified-Since' in headers and object_name not in self.modified:
+            return FakeResponse(304)
+        return FakeResponse(200, _describe(object_name))
+
+    def restful(self, path, method, json):
+        object_names = tuple(request['url'].split('/')[2] for request in json['batchRequests'])
+        self.calls.append((path, object_names))
+        return {'results': [{'statusCode': 200, 'result': _describe(name)} for name in object_names]}
+
+
+def _describe(object_name):
+    return {'name': object_name, 'fields': [{'name': 'Id', 'type': 'id'}]}
+
+
+def _age(path, seconds):
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE orgs SET validated_at = validated_at - ?", (seconds,))
+    conn.execute("UPDATE describes SET fetched_at = fetched_at - ?", (seconds,))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def org():
+    return FakeOrg()
+
+
+def test_fresh_cache_is_served_from_disk_without_calls(tmp_path, org):
+    path = str(tmp_path / 'cache.sqlite')
+    MetadataCache(path).describe(org, 'Account')
+    org.calls.clear()
+
+    assert MetadataCache(path).describe(org, 'Account')['name'] == 'Account'
+    assert org.calls == []
+
+
+def test_unchanged_org_after_max_age_costs_one_global_call(tmp_path, org):
+    path = str(tmp_path / 'cache.sqlite')
+    MetadataCache(path, max_age=60).describe(org, 'Account')
+    _age(path, 120)
+    org.calls.clear()
+
+    MetadataCache(path, max_age=60).describe(org, 'Account')
+    assert org.calls == [('sobjects', True)]
+
+
+def test_changed_org_keeps_unrevalidated_describes_stale_across_runs(tmp_path, org):
+    path = str(tmp_path / 'cache.sqlite')
+    first = MetadataCache(path, max_age=60)
+    first.describe(org, 'Account')
+    first.describe(org, 'Contact')
+    _age(path, 120)
+
+    # A org mudou; esta execução só revalida Account
+    org.changed = True
+    MetadataCache(path, max_age=60).describe(org, 'Account')
+    org.changed = False
+    org.calls.clear()
+
+    # Dentro de max_age, Account sai do disco, mas Contact ainda precisa ser revalidado
+    cache = MetadataCache(path, max_age=60)
+    cache.describe(org, 'Account')
+    cache.describe(org, 'Contact')
+    assert org.calls == [('sobjects/Contact/describe', True)]
+
+    org.calls.clear()
+    MetadataCache(path, max_age=60).describe(org, 'Contact')
+    assert org.calls == []
+
+
+def test_prefetch_revalidates_stale_describes_instead_of_downloading_them(tmp_path, org):
+    path = str(tmp_path / 'cache.sqlite')
+    MetadataCache(path, max_age=60).prefetch(org, ['Account', 'Contact'])
+    _age(path, 120)
+    org.changed, org.modified = True, {'Contact'}
+    org.calls.clear()
+
+    cache = MetadataCache(path, max_age=60)
+    cache.prefetch(org, ['Account', 'Contact', 'Lead'])
+
+    assert sorted(org.calls) == [
+        ('composite/batch', ('Lead',)),
+        ('sobjects', True),
+        ('sobjects/Account/describe', True),
+        ('sobjects/Contact/describe', True),
+    ]
+    org.calls.clear()
+    assert [cache.describe(org, name)['name'] for name in ('Account', 'Contact', 'Lead')] == ['Account', 'Contact', 'Lead']
+    assert org.calls == []
+    MetadataCache(path, max_age=60).prefetch(org, ['Account', 'Contact', 'Lead'])
+    assert org.calls == []
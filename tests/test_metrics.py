@@ -0,0 +1,92 @@
+# tests/test_metrics.py
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from utils.metrics import Metrics, classify_endpoint
+
+BASE = 'https://org.my.salesforce.com/services/data/v59.0'
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/jobs/ingest/750000000000001/batches', 'bulk_ingest'),
+    ('/composite/batch', 'composite_batch'),
+    ('/composite/graph', 'composite_graph'),
+    ('/composite/sobjects/Account/External_Id__c', 'collections'),
+    ('/sobjects', 'describe_global'),
+    ('/sobjects/Account/describe', 'describe'),
+    ('/sobjects/Account/deleted/?start=2024-01-01T00%3A00%3A00Z', 'deleted'),
+    ('/sobjects/Account/001000000000001', 'sobject'),
+    ('/query/?q=SELECT+Id+FROM+Account', 'query'),
+    ('/queryAll/01g000000000001-2000', 'query'),
+    ('/limits', 'limits'),
+    ('/analytics/reports', 'other'),
+])
+def test_classify_endpoint(path, endpoint):
+    assert classify_endpoint(BASE + path) == endpoint
+
+
+def _histogram(durations, buckets=(0.1, 1, 10)):
+    metrics = Metrics(buckets)
+    for seconds in durations:
+        metrics.observe('phase_seconds', seconds, phase='load')
+    return metrics, metrics._histograms[('phase_seconds', (('phase', 'load'),))]
+
+
+def test_quantile_is_the_upper_bound_of_the_bucket():
+    metrics, histogram = _histogram([0.05] * 90 + [0.5] * 9 + [20])
+
+    assert metrics.quantile(histogram, 0.50) == 0.1
+    assert metrics.quantile(histogram, 0.99) == 1
+    assert metrics.quantile(histogram, 1.0) == float('inf')
+    assert metrics.quantile({'count': 0, 'buckets': [0, 0, 0, 0]}, 0.5) == 0.0
+
+
+def test_to_prometheus_writes_cumulative_buckets_and_escapes_labels():
+    metrics, _ = _histogram([0.05, 0.5, 0.5, 20])
+    metrics.inc('rows_loaded_total', 3, object='Conta "A"\\B\nC')
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert lines[:2] == ['# TYPE datasync_rows_loaded_total counter',
+                         'datasync_rows_loaded_total{object="Conta \\"A\\"\\\\B\\nC"} 3']
+    assert lines[2:] == [
+        '# TYPE datasync_phase_seconds histogram',
+        'datasync_phase_seconds_bucket{phase="load",le="0.1"} 1',
+        'datasync_phase_seconds_bucket{phase="load",le="1"} 3',
+        'datasync_phase_seconds_bucket{phase="load",le="10"} 3',
+        'datasync_phase_seconds_bucket{phase="load",le="+Inf"} 4',
+        'datasync_phase_seconds_sum{phase="load"} 21.05',
+        'datasync_phase_seconds_count{phase="load"} 4',
+    ]
+
+
+class _Adapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200 if request.method == 'GET' else 201
+        response.url = request.url
+        response.request = request
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+
+def test_instrument_session_counts_calls_by_endpoint_method_and_status():
+    metrics = Metrics()
+    session = metrics.instrument_session(requests.Session(), org='target')
+    session.mount('https://', _Adapter())
+
+    session.get(BASE + '/sobjects/Account/describe')
+    session.get(BASE + '/sobjects/Contact/describe')
+    session.post(BASE + '/composite/sobjects', json={'records': []})
+
+    snapshot = metrics.snapshot()
+    calls = {(c['labels']['endpoint'], c['labels']['method'], c['labels']['status']): c['value']
+             for c in snapshot['counters'] if c['name'] == 'api_calls_total'}
+    assert calls == {('describe', 'GET', 200): 2, ('collections', 'POST', 201): 1}
+    assert all(c['labels']['org'] == 'target' for c in snapshot['counters'])
+    assert sorted((h['labels']['endpoint'], h['count']) for h in snapshot['histograms']) == [('collections', 1), ('describe', 2)]
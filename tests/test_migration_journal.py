@@ -0,0 +1,79 @@
+# tests/test_migration_journal.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.migration_journal import MigrationJournal
+
+SOURCE = SimpleNamespace(sf_instance='source.my.salesforce.com')
+TARGET = SimpleNamespace(sf_instance='target.my.salesforce.com')
+OTHER_TARGET = SimpleNamespace(sf_instance='other.my.salesforce.com')
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'journal.sqlite')
+
+
+def test_resume_from_last_committed_chunk(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    journal.commit_chunk('Account', [('Account', 'a1', 't1'), ('Account', 'a2', 't2')], cursor='a2')
+
+    # Nova execução: o cursor e o mapa de IDs são lidos do disco
+    resumed = MigrationJournal(SOURCE, TARGET, path)
+    assert resumed.get_cursor('Account') == ('a2', False)
+    assert resumed.load_id_map() == {'a1': 't1', 'a2': 't2'}
+    assert resumed.get_cursor('Contact') == (None, False)
+
+
+def test_mark_done_keeps_cursor(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    journal.commit_chunk('Account', [], cursor='a9')
+    journal.mark_done('Account')
+
+    assert journal.get_cursor('Account') == ('a9', True)
+
+
+def test_progress_is_kept_per_scope(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    journal.commit_chunk('Opportunity', [], cursor='o5', scope="WHERE StageName = 'Closed Won'")
+    journal.mark_done('Opportunity', scope="WHERE StageName = 'Closed Won'")
+
+    assert journal.get_cursor('Opportunity') == (None, False)
+    assert journal.get_cursor('Opportunity', scope="WHERE StageName = 'Closed Won'") == ('o5', True)
+
+
+def test_each_target_org_has_its_own_map_and_reset_only_clears_its_pair(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    other = MigrationJournal(SOURCE, OTHER_TARGET, path)
+    journal.commit_chunk('Account', [('Account', 'a1', 't1')], cursor='a1')
+    other.commit_chunk('Account', [('Account', 'a1', 'x1')], cursor='a1')
+
+    journal.reset()
+
+    assert journal.load_id_map() == {}
+    assert journal.get_cursor('Account') == (None, False)
+    assert other.load_id_map() == {'a1': 'x1'}
+
+
+def test_watermarks_are_kept_per_scope_and_kind(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    closed_won = "WHERE StageName = 'Closed Won'"
+    journal.commit_chunk('Opportunity', [('Opportunity', 'o1', 't1')], scope=closed_won, watermark='2024-05-01T10:00:00.000+0000')
+    journal.commit_deletes('Opportunity', [], '2024-05-01T11:00:00Z', scope=closed_won)
+
+    assert journal.get_watermark('Opportunity', scope=closed_won) == '2024-05-01T10:00:00.000+0000'
+    assert journal.get_watermark('Opportunity', scope=closed_won, kind='deleted') == '2024-05-01T11:00:00Z'
+    assert journal.get_watermark('Opportunity') is None
+
+
+def test_commit_deletes_removes_mappings(path):
+    journal = MigrationJournal(SOURCE, TARGET, path)
+    journal.commit_chunk('Account', [('Account', 'a1', 't1'), ('Account', 'a2', 't2')], watermark='2024-05-01T10:00:00.000+0000')
+
+    journal.commit_deletes('Account', ['a1'], '2024-05-02T00:00:00Z')
+
+    assert journal.load_id_map() == {'a2': 't2'}
+    # Só a marca d'água de alterações avança com os blocos; o cursor de migração não é tocado
+    assert journal.get_cursor('Account') == (None, False)
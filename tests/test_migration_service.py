@@ -0,0 +1,123 @@
+# tests/test_migration_service.py
+
+import functools
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce
+from benchmarks.run_benchmarks import cycles
+import services.migration_service as migration_service
+from utils.migration_journal import MigrationJournal
+from utils.salesforce_utils import LoadPlan
+
+
+@pytest.fixture
+def controller(tmp_path, monkeypatch, metadata_cache):
+    """Controlador ligado a uma org de origem com ciclos e a uma org de destino vazia, ambas falsas."""
+    source, schema, root, _ = cycles(0.02)
+    target = FakeOrg('target', schema)
+    clients = {'source': FakeSalesforce(source), 'target': FakeSalesforce(target)}
+    monkeypatch.setitem(sys.modules, 'config', SimpleNamespace(sandbox_credentials={'org': 'source'},
+                                                                dev_credentials={'org': 'target'}))
+    import controller
+
+    monkeypatch.setattr(controller, 'authenticate_salesforce', lambda org, **kwargs: clients[org])
+    monkeypatch.setattr(controller, 'MigrationJournal', functools.partial(MigrationJournal, path=str(tmp_path / 'journal.sqlite')))
+    return SimpleNamespace(module=controller, source=source, target=target, root=root)
+
+
+def _lookups_by_name(org, object_name, field):
+    """{Nome do registro: Nome do registro referenciado} para os lookups preenchidos."""
+    rows = org.records[object_name]
+    names = {record_id: row['Name'] for rows_of in org.records.values() for record_id, row in rows_of.items()}
+    return {row['Name']: names.get(row[field]) for row in rows.values() if row.get(field)}
+
+
+def test_controller_backfills_cyclic_and_self_lookups(controller):
+    controller.module.start_migration(controller.root, max_workers=4)
+
+    for object_name, field in (('Account', 'ParentId'), ('Account', 'PrimaryContact__c'), ('Contact', 'AccountId'),
+                               ('Opportunity', 'AccountId')):
+        expected = _lookups_by_name(controller.source, object_name, field)
+        assert expected
+        assert _lookups_by_name(controller.target, object_name, field) == expected, (object_name, field)
+
+
+def test_controller_rerun_does_not_duplicate_or_backfill_again(controller):
+    controller.module.start_migration(controller.root, max_workers=4)
+    counts = {obj: len(rows) for obj, rows in controller.target.records.items()}
+    updates = controller.target.calls['collections_update']
+
+    controller.module.start_migration(controller.root, max_workers=4)
+
+    assert {obj: len(rows) for obj, rows in controller.target.records.items()} == counts
+    assert controller.target.calls['collections_update'] == updates
+
+
+def test_controller_skips_records_already_migrated_by_a_job(controller, tmp_path):
+    from services.job_runner import build_job_graph, job_roots, run_job
+
+    sf_sandbox, sf_dev = FakeSalesforce(controller.source), FakeSalesforce(controller.target)
+    journal = MigrationJournal(sf_sandbox, sf_dev, str(tmp_path / 'journal.sqlite'))
+    run_job(sf_sandbox, sf_dev, job_roots(['Contact']), build_job_graph(sf_sandbox, ['Contact']), journal, max_workers=2)
+    assert controller.target.count('Account') == controller.source.count('Account')
+
+    controller.module.start_migration(controller.root, max_workers=4)
+
+    for object_name in ('Account', 'Contact', 'Opportunity'):
+        assert controller.target.count(object_name) == controller.source.count(object_name), object_name
+
+
+def test_bulk_chunks_are_loaded_one_at_a_time(monkeypatch, metadata_cache):
+    source, schema, _, _ = cycles(0.1)
+    target = FakeOrg('target', schema)
+    monkeypatch.setattr(migration_service, 'BULK_CHUNK_SIZE', 10)
+    load = migration_service.load_object_records
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def load_object_records(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        try:
+            return load(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(migration_service, 'load_object_records', load_object_records)
+
+    total, inserted, _ = migration_service.migrate_object(FakeSalesforce(source), FakeSalesforce(target), 'Contact',
+                                                          max_workers=8, load_mode='bulk')
+
+    assert total == inserted == source.count('Contact') > 10
+    assert peak[0] == migration_service.BULK_MAX_IN_FLIGHT
+
+
+def test_load_object_records_retries_only_rows_that_sent_a_rejected_field(monkeypatch):
+    plan = LoadPlan('Account', ['Name', 'Legacy__c'], {})
+    monkeypatch.setattr(migration_service, 'get_load_plan', lambda sf, object_name: plan)
+    batches = []
+
+    def load_records(sf, object_name, rows, mode):
+        batches.append(rows)
+        return [
+            {'id': None, 'success': False, 'errors': [{'statusCode': 'INVALID_FIELD', 'fields': ['Legacy__c']}]}
+            if 'Legacy__c' in row else {'id': f"t{row['Name']}", 'success': True, 'errors': []}
+            for row in rows
+        ]
+
+    monkeypatch.setattr(migration_service, 'load_records', load_records)
+    records = [{'Id': 's1', 'Name': '1', 'Legacy__c': 'x'}, {'Id': 's2', 'Name': '2'}]
+
+    results = migration_service.load_object_records(None, 'Account', records)
+
+    assert [result['id'] for result in results] == ['t1', 't2']
+    assert batches[1] == [{'Name': '1'}]
+    assert plan.rejected == {'Legacy__c'}
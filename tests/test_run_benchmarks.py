@@ -0,0 +1,28 @@
+# tests/test_run_benchmarks.py
+
+from benchmarks.run_benchmarks import check_regressions
+
+BASELINE = {
+    'parameters': {'scale': 1.0},
+    'scenarios': {'cycles': {'api_calls_per_record': 0.01, 'records_per_second': 3000, 'peak_rss_mb': 60}},
+}
+
+
+def _result(**metrics):
+    result = {'scenario': 'cycles', 'records_migrated': 6000, 'api_calls_per_record': 0.01,
+              'records_per_second': 3000, 'peak_rss_mb': 60, 'tool_rss_mb': 10}
+    result.update(metrics)
+    return result
+
+
+def test_machine_dependent_metrics_do_not_fail_the_gate():
+    assert check_regressions([_result(records_per_second=500, peak_rss_mb=600)], BASELINE, 0.25) == []
+
+
+def test_more_api_calls_per_record_fail_the_gate():
+    regressions = check_regressions([_result(api_calls_per_record=0.02)], BASELINE, 0.25)
+    assert len(regressions) == 1 and regressions[0].startswith('cycles: api_calls_per_record')
+
+
+def test_scenarios_missing_from_baseline_are_skipped():
+    assert check_regressions([_result(scenario='new', api_calls_per_record=1.0)], BASELINE, 0.25) == []
@@ -0,0 +1,159 @@
+# tests/test_salesforce_utils.py
+
+import itertools
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_salesforce import FakeOrg, FakeSalesforce, standard_fields
+import utils.salesforce_utils as salesforce_utils
+from utils.salesforce_utils import (
+    IN_CLAUSE_MIN_LENGTH, LoadPlan, add_condition, build_in_queries, get_load_plan, iter_query_chunks, prefetch,
+    rejected_fields, soql_quote,
+)
+
+
+def test_soql_quote_escapes_quotes_and_backslashes():
+    assert soql_quote("O'Brien\\x") == "'O\\'Brien\\\\x'"
+
+
+def test_build_in_queries_single_query_when_values_fit():
+    queries = list(build_in_queries("SELECT Id FROM Account", 'Id', ['b', 'a']))
+    assert queries == ["SELECT Id FROM Account WHERE Id IN ('a', 'b')"]
+
+
+def test_build_in_queries_splits_by_length_without_losing_values():
+    values = [f"001{i:015d}" for i in range(2000)]
+    queries = list(build_in_queries("SELECT Id FROM Account", 'Id', values, max_length=3000))
+
+    assert len(queries) > 1
+    assert all(len(query) <= 3000 for query in queries)
+    found = [value.strip("' ") for query in queries for value in query.split('IN (')[1].rstrip(')').split(',')]
+    assert sorted(found) == sorted(values)
+
+
+def test_build_in_queries_reserves_minimum_space_for_long_select():
+    select_clause = "SELECT " + ', '.join(f"Field{i}__c" for i in range(1000)) + " FROM Account"
+    queries = list(build_in_queries(select_clause, 'Id', [f"001{i:015d}" for i in range(500)]))
+
+    in_lists = [query[query.index(' IN (') + 5:-1] for query in queries]
+    assert all(0 < len(in_list) <= IN_CLAUSE_MIN_LENGTH for in_list in in_lists)
+    assert len(in_lists) > 1
+
+
+def test_build_in_queries_without_values_yields_nothing():
+    assert list(build_in_queries("SELECT Id FROM Account", 'Id', [])) == []
+
+
+def _plan():
+    return LoadPlan('Account', ['Name', 'ParentId', 'Owner__c', 'PrimaryContact__c'],
+                    {'ParentId': 'Account', 'Owner__c': 'Employee__c', 'PrimaryContact__c': 'Contact'})
+
+
+def test_load_plan_project_keeps_plan_fields_and_remaps_lookups():
+    record = {'Id': 's1', 'Name': 'Acme', 'ParentId': 's0', 'Owner__c': 'e9', 'Formula__c': 'x', 'PrimaryContact__c': 'c1'}
+
+    row = _plan().project(record, id_map={'s0': 't0', 'c1': 'tc1'}, deferred={'PrimaryContact__c': 'Contact'})
+
+    # Owner__c sem correspondente fica vazio; o lookup adiado também
+    assert row == {'Name': 'Acme', 'ParentId': 't0', 'Owner__c': None, 'PrimaryContact__c': None}
+
+
+def test_load_plan_project_without_id_map_keeps_lookups():
+    assert _plan().project({'Name': 'Acme', 'ParentId': 's0'}) == {'Name': 'Acme', 'ParentId': 's0'}
+
+
+def test_load_plan_reject_removes_fields_once():
+    plan = _plan()
+
+    assert plan.reject({'Owner__c', 'Unknown__c'}) == {'Owner__c'}
+    assert plan.reject({'Owner__c'}) == set()
+    assert plan.rejected == {'Owner__c'}
+    assert 'Owner__c' not in plan.project({'Name': 'Acme', 'Owner__c': 'e9'})
+
+
+def test_rejected_fields_reads_rest_and_bulk_error_formats():
+    errors = [
+        {'statusCode': 'INVALID_FIELD_FOR_INSERT_UPDATE', 'fields': ['Formula__c']},
+        {'errorCode': 'INVALID_FIELD', 'fields': ['Legacy__c']},
+        {'statusCode': 'REQUIRED_FIELD_MISSING', 'fields': ['LastName']},
+    ]
+    assert rejected_fields(errors) == {'Formula__c', 'Legacy__c'}
+
+
+def test_get_load_plan_uses_createable_non_system_fields(metadata_cache):
+    sf = SimpleNamespace(sf_instance='target.my.salesforce.com')
+    metadata_cache.store_describe(sf, 'Contact', {'name': 'Contact', 'fields': [
+        {'name': 'Id', 'type': 'id', 'createable': False, 'referenceTo': []},
+        {'name': 'LastName', 'type': 'string', 'createable': True, 'referenceTo': []},
+        {'name': 'OwnerId', 'type': 'reference', 'createable': True, 'referenceTo': ['User']},
+        {'name': 'AccountId', 'type': 'reference', 'createable': True, 'referenceTo': ['Account']},
+        {'name': 'ReportsToId', 'type': 'reference', 'createable': True, 'referenceTo': ['Contact']},
+        {'name': 'Approver__c', 'type': 'reference', 'createable': True, 'referenceTo': ['User']},
+    ]})
+
+    plan = get_load_plan(sf, 'Contact')
+
+    assert plan.fields == {'LastName', 'AccountId', 'ReportsToId', 'Approver__c'}
+    # Lookups para objetos de sistema (User) não são remapeados
+    assert plan.lookups == {'AccountId': 'Account', 'ReportsToId': 'Contact'}
+    assert get_load_plan(sf, 'Contact') is plan
+
+
+def test_add_condition_handles_any_whitespace_after_where():
+    assert add_condition('', "Id > '001'") == "WHERE Id > '001'"
+    assert add_condition("where\tType = 'Customer'", "Id > '001'") == "WHERE (Type = 'Customer') AND Id > '001'"
+
+
+def test_iter_query_chunks_follows_pages_and_cuts_at_chunk_size(monkeypatch):
+    monkeypatch.setattr(salesforce_utils, 'QUERY_BATCH_SIZE', 3)
+    org = FakeOrg('source', {'Account': standard_fields()})
+    org.add_records('Account', [{'Name': f"Account {i:02d}"} for i in range(10)])
+
+    chunks = list(iter_query_chunks(FakeSalesforce(org), "SELECT Id, Name FROM Account ORDER BY Name", chunk_size=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert [record['Name'] for chunk in chunks for record in chunk] == [f"Account {i:02d}" for i in range(10)]
+    assert all(set(record) == {'Id', 'Name'} for chunk in chunks for record in chunk)
+    assert (org.calls['query'], org.calls['query_more']) == (1, 3)
+
+
+def test_iter_query_chunks_without_records_yields_nothing():
+    org = FakeOrg('source', {'Account': standard_fields()})
+
+    assert list(iter_query_chunks(FakeSalesforce(org), "SELECT Id FROM Account")) == []
+
+
+def test_prefetch_passes_producer_errors_to_the_consumer():
+    def produce():
+        yield 1
+        yield 2
+        raise RuntimeError('query falhou')
+
+    received = []
+    with pytest.raises(RuntimeError, match='query falhou'):
+        for item in prefetch(produce()):
+            received.append(item)
+
+    assert received == [1, 2]
+
+
+def test_prefetch_stops_the_producer_when_the_consumer_quits_early():
+    produced = []
+
+    def produce():
+        for item in itertools.count():
+            produced.append(item)
+            yield item
+
+    consumer = prefetch(produce(), depth=2)
+    assert next(consumer) == 0
+    consumer.close()
+    time.sleep(0.3)
+    count = len(produced)
+    time.sleep(0.3)
+
+    # Só o que cabia na fila (mais o item que estava sendo entregue) foi produzido, e nada depois do fechamento
+    assert count <= 2 + 2
+    assert len(produced) == count
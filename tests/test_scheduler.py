@@ -0,0 +1,106 @@
+# tests/test_scheduler.py
+
+import threading
+import time
+
+import pytest
+
+from services.scheduler import run_layers, run_ordered, run_parallel, topological_layers
+from utils.graph_utils import DependencyGraph
+
+
+def test_run_ordered_delivers_results_in_input_order_when_tasks_finish_out_of_order():
+    finished = []
+
+    def task(item):
+        # Os primeiros itens demoram mais, então terminam depois dos seguintes
+        time.sleep(0.02 * (5 - item))
+        finished.append(item)
+        return item * 10
+
+    delivered = []
+    run_ordered(range(6), task, lambda item, result: delivered.append((item, result)), max_workers=3)
+
+    assert finished != sorted(finished)
+    assert delivered == [(item, item * 10) for item in range(6)]
+
+
+def test_run_ordered_keeps_in_flight_items_bounded():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def items():
+        for item in range(20):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            yield item
+
+    def on_result(item, result):
+        with lock:
+            running[0] -= 1
+
+    run_ordered(items(), lambda item: time.sleep(0.001), on_result, max_workers=2)
+
+    assert peak[0] <= 2 * 2
+
+
+def test_run_ordered_raises_and_stops_committing_at_the_failed_item():
+    delivered = []
+
+    def task(item):
+        if item == 2:
+            raise RuntimeError('falhou')
+        return item
+
+    with pytest.raises(RuntimeError, match='falhou'):
+        run_ordered(range(6), task, lambda item, result: delivered.append(item), max_workers=3)
+
+    # O cursor nunca passa do item que falhou, mesmo que os seguintes tenham terminado
+    assert delivered == [0, 1]
+
+
+def test_run_ordered_sequential_path_raises_too():
+    delivered = []
+
+    with pytest.raises(ZeroDivisionError):
+        run_ordered([1, 0, 2], lambda item: 1 / item, lambda item, result: delivered.append(item), max_workers=1)
+
+    assert delivered == [1]
+
+
+def test_run_parallel_keeps_order_and_propagates_errors():
+    assert run_parallel([lambda i=i: (time.sleep(0.01 * (3 - i)), i)[1] for i in range(4)], max_workers=4) == [0, 1, 2, 3]
+
+    with pytest.raises(ValueError):
+        run_parallel([lambda: 1, lambda: int('x')], max_workers=2)
+
+
+def test_run_layers_finishes_each_layer_before_the_next_and_splits_workers():
+    events = []
+    lock = threading.Lock()
+
+    def task(obj, workers):
+        with lock:
+            events.append(('start', obj, workers))
+        time.sleep(0.01)
+        with lock:
+            events.append(('end', obj, workers))
+        return obj.lower()
+
+    results = run_layers([['Account', 'User__c'], ['Contact']], task, max_workers=4)
+
+    assert results == {'Account': 'account', 'User__c': 'user__c', 'Contact': 'contact'}
+    first_layer = [event for event in events if event[1] != 'Contact']
+    assert events.index(('start', 'Contact', 4)) > max(events.index(event) for event in first_layer)
+    assert {workers for _, obj, workers in first_layer} == {2}
+
+
+def test_topological_layers_puts_parents_first_and_restricts_to_objects():
+    graph = DependencyGraph()
+    graph.add_edge('Opportunity', 'Account', 'AccountId')
+    graph.add_edge('Contact', 'Account', 'AccountId')
+    graph.add_edge('Account', 'User__c', 'OwnerId')
+
+    assert topological_layers(graph) == [['User__c'], ['Account'], ['Contact', 'Opportunity']]
+    assert topological_layers(graph, ['Opportunity', 'Account']) == [['Account'], ['Opportunity']]
@@ -0,0 +1,102 @@
+# tests/test_staging.py
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import services.staging_service as staging_service  # noqa: E402
+from utils.staging import StagingArea, arrow_schema  # noqa: E402
+
+SOURCE = SimpleNamespace(sf_instance='source.my.salesforce.com')
+
+DESCRIBES = {
+    'Account': {'name': 'Account', 'fields': [
+        {'name': 'Id', 'type': 'id'},
+        {'name': 'Name', 'type': 'string'},
+        {'name': 'NumberOfEmployees', 'type': 'int'},
+        {'name': 'AnnualRevenue', 'type': 'currency'},
+        {'name': 'IsActive__c', 'type': 'boolean'},
+        {'name': 'BillingAddress', 'type': 'address'},
+    ]},
+    'Contact': {'name': 'Contact', 'fields': [
+        {'name': 'Id', 'type': 'id'},
+        {'name': 'LastName', 'type': 'string'},
+        {'name': 'AccountId', 'type': 'reference'},
+    ]},
+}
+
+
+def _chunk(*accounts):
+    return {'Account': {account['Id']: account for account in accounts}}
+
+
+def test_round_trip_keeps_values_and_types(tmp_path):
+    staging = StagingArea(SOURCE, 'Contact', str(tmp_path))
+    account = {'Id': 'a1', 'Name': 'Acme', 'NumberOfEmployees': 10, 'AnnualRevenue': 1.5, 'IsActive__c': True,
+               'BillingAddress': {'city': 'Recife'}}
+    contact = {'Id': 'c1', 'LastName': 'Silva', 'AccountId': 'a1'}
+    staging.write_chunk('c1', {'Account': {'a1': account}, 'Contact': {'c1': contact}, 'Case': {}}, DESCRIBES)
+
+    reopened = StagingArea(SOURCE, 'Contact', str(tmp_path))
+    (cursor, collected), = reopened.iter_chunks()
+
+    assert cursor == 'c1'
+    assert collected['Contact'] == {'c1': contact}
+    # Campos compostos não são gravados: repetem os campos que os formam
+    assert collected['Account'] == {'a1': {k: v for k, v in account.items() if k != 'BillingAddress'}}
+    assert reopened.staged_ids() == {'Account': {'a1'}, 'Contact': {'c1'}}
+
+
+def test_fields_missing_from_first_record_are_kept(tmp_path):
+    staging = StagingArea(SOURCE, 'Account', str(tmp_path))
+    staging.write_chunk('a2', _chunk({'Id': 'a1', 'Name': 'Acme'}, {'Id': 'a2', 'Name': 'Beta', 'NumberOfEmployees': 7}),
+                        DESCRIBES)
+
+    (_, collected), = staging.iter_chunks()
+
+    assert collected['Account']['a1'] == {'Id': 'a1', 'Name': 'Acme', 'NumberOfEmployees': None}
+    assert collected['Account']['a2']['NumberOfEmployees'] == 7
+
+
+def test_arrow_schema_uses_describe_types_for_present_fields():
+    schema = arrow_schema(DESCRIBES['Account'], [{'Id': 'a1'}, {'AnnualRevenue': 2.0, 'IsActive__c': False}])
+
+    assert [(field.name, str(field.type)) for field in schema] == [
+        ('Id', 'string'), ('AnnualRevenue', 'double'), ('IsActive__c', 'bool')]
+
+
+def test_iter_chunks_after_cursor_skips_loaded_chunks(tmp_path):
+    staging = StagingArea(SOURCE, 'Account', str(tmp_path))
+    for record_id in ('a1', 'a2', 'a3'):
+        staging.write_chunk(record_id, _chunk({'Id': record_id, 'Name': record_id}), DESCRIBES)
+
+    assert [cursor for cursor, _ in staging.iter_chunks(after='a1')] == ['a2', 'a3']
+    assert list(staging.iter_chunks(after='a3')) == []
+    with pytest.raises(ValueError):
+        list(staging.iter_chunks(after='a0'))
+
+
+def test_each_scope_has_its_own_area_and_reset_clears_it(tmp_path):
+    won = StagingArea(SOURCE, 'Opportunity', str(tmp_path), scope="WHERE StageName = 'Closed Won'")
+    everything = StagingArea(SOURCE, 'Opportunity', str(tmp_path))
+    won.write_chunk('a1', _chunk({'Id': 'a1', 'Name': 'Acme'}), DESCRIBES)
+    won.mark_done()
+
+    assert won.directory != everything.directory
+    assert everything.cursor is None
+    assert StagingArea(SOURCE, 'Opportunity', str(tmp_path), scope="WHERE StageName = 'Closed Won'").done
+
+    won.reset()
+    assert won.cursor is None and not won.done
+    assert StagingArea(SOURCE, 'Opportunity', str(tmp_path), scope="WHERE StageName = 'Closed Won'").cursor is None
+
+
+def test_load_refuses_journal_cursor_that_is_not_a_staged_chunk(tmp_path, monkeypatch):
+    staging = StagingArea(SOURCE, 'Account', str(tmp_path))
+    staging.write_chunk('a2', _chunk({'Id': 'a2', 'Name': 'Acme'}), DESCRIBES)
+    journal = SimpleNamespace(get_cursor=lambda object_name, scope='': ('a9', False))
+    monkeypatch.setattr(staging_service, 'load_collected_chunks', lambda *args, **kwargs: pytest.fail("carga não esperada"))
+
+    assert staging_service.load_from_staging(None, None, 'Account', None, staging, journal, {'x': 'y'}) == {'x': 'y'}
@@ -0,0 +1,22 @@
+# tests/test_storage_utils.py
+
+import pytest
+
+from utils.storage_utils import estimate_storage_mb, record_size_kb
+
+
+@pytest.mark.parametrize('object_name, size_kb', [
+    ('Account', 2),
+    ('Campaign', 8),
+    ('CampaignMember', 1),
+    ('FAQ__kav', 4),
+    ('Telemetry__b', 0),
+    ('Invoice__c', 2),
+])
+def test_record_size_kb(object_name, size_kb):
+    assert record_size_kb(object_name) == size_kb
+
+
+def test_estimate_storage_mb():
+    assert estimate_storage_mb('Campaign', 1024) == 8
+    assert estimate_storage_mb('Telemetry__b', 10 ** 6) == 0
@@ -0,0 +1,188 @@
+# tests/test_transport.py
+
+import gzip
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import utils.transport as transport
+from utils.transport import ApiBudgetExhausted, ApiGovernor, GovernedSession, backoff_delay, is_transient
+
+URL = 'https://org.my.salesforce.com/services/data/v59.0/composite/sobjects'
+
+
+def _response(status_code, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload if payload is not None else {}).encode('utf-8')
+    response.headers.update(headers or {})
+    return response
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Devolve as respostas (ou exceções) na ordem dada e guarda as requisições recebidas."""
+
+    def __init__(self, *outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        outcome.request = request
+        return outcome
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    monkeypatch.setattr(transport, 'backoff_delay', lambda attempt: 0)
+    monkeypatch.setattr(transport.time, 'sleep', lambda seconds: None)
+
+
+def _session(*outcomes):
+    session = GovernedSession('test', max_retries=3)
+    adapter = ScriptedAdapter(*outcomes)
+    session.mount('https://', adapter)
+    return session, adapter
+
+
+LOCKED = [{'errorCode': 'UNABLE_TO_LOCK_ROW', 'message': 'unable to obtain exclusive access to this record'}]
+CONCURRENT = [{'errorCode': 'REQUEST_LIMIT_EXCEEDED', 'message': 'ConcurrentPerOrgLongTxn Limit exceeded.'}]
+DAILY = [{'errorCode': 'REQUEST_LIMIT_EXCEEDED', 'message': 'TotalRequests Limit exceeded.'}]
+
+
+@pytest.mark.parametrize('response, method, expected', [
+    (_response(503), 'POST', True),
+    (_response(502), 'GET', True),
+    (_response(504), 'DELETE', True),
+    (_response(502), 'POST', False),
+    (_response(504), 'PATCH', False),
+    (_response(400, LOCKED), 'POST', True),
+    (_response(403, CONCURRENT), 'POST', True),
+    (_response(403, DAILY), 'GET', False),
+    (_response(400, [{'errorCode': 'MALFORMED_QUERY'}]), 'GET', False),
+    (_response(404), 'GET', False),
+])
+def test_is_transient(response, method, expected):
+    assert is_transient(response, method) is expected
+
+
+def test_503_is_retried_even_for_post():
+    session, adapter = _session(_response(503), _response(200, [{'id': '001', 'success': True}]))
+
+    assert session.post(URL, json={'records': []}).status_code == 200
+    assert len(adapter.requests) == 2
+
+
+def test_gateway_timeout_on_post_is_not_retried():
+    session, adapter = _session(_response(504), _response(504), _response(200))
+
+    assert session.post(URL, json={'records': []}).status_code == 504
+    assert len(adapter.requests) == 1
+
+
+def test_gateway_timeout_on_get_is_retried():
+    session, adapter = _session(_response(504), _response(502), _response(200))
+
+    assert session.get(URL).status_code == 200
+    assert len(adapter.requests) == 3
+
+
+def test_retries_stop_at_max_retries():
+    session, adapter = _session(*[_response(400, LOCKED)] * 5)
+
+    assert session.post(URL, json={}).status_code == 400
+    assert len(adapter.requests) == 4
+
+
+def test_connection_errors_are_retried_only_for_idempotent_methods():
+    session, adapter = _session(requests.ConnectionError(), _response(200))
+    assert session.get(URL).status_code == 200
+
+    session, adapter = _session(requests.ConnectionError(), _response(200))
+    with pytest.raises(requests.ConnectionError):
+        session.post(URL, json={})
+    assert len(adapter.requests) == 1
+
+
+def test_limit_info_header_updates_governor():
+    session, _ = _session(_response(200, headers={'Sforce-Limit-Info': 'api-usage=900/1000'}))
+
+    session.get(URL)
+
+    assert (session.governor.used, session.governor.limit) == (900, 1000)
+    assert session.governor.rate == pytest.approx(transport.MAX_REQUESTS_PER_SECOND / 2)
+
+
+def test_large_bodies_are_gzipped_and_small_ones_are_not():
+    records = [{'attributes': {'type': 'Account'}, 'Name': 'x' * 100}] * 1000
+    session, adapter = _session(_response(200), _response(200))
+
+    session.post(URL, json={'records': records[:1]})
+    session.post(URL, json={'records': records})
+
+    small, large = adapter.requests
+    assert 'Content-Encoding' not in small.headers
+    assert large.headers['Content-Encoding'] == 'gzip'
+    assert large.headers['Content-Type'] == 'application/json'
+    assert json.loads(gzip.decompress(large.body)) == {'records': records}
+
+
+def test_governor_refuses_calls_inside_the_reserve():
+    governor = ApiGovernor('org', max_rate=10, reserve=0.05)
+    governor.record_usage(940, 1000)
+    governor.acquire()
+
+    governor.record_usage(950, 1000)
+    with pytest.raises(ApiBudgetExhausted):
+        governor.acquire()
+
+
+def test_governor_slows_down_as_budget_runs_out():
+    governor = ApiGovernor('org', max_rate=10)
+
+    governor.record_usage(100, 1000)
+    assert governor.rate == 10
+    governor.record_usage(900, 1000)
+    assert governor.rate == pytest.approx(5)
+    governor.record_usage(999, 1000)
+    assert governor.rate == transport.MIN_REQUESTS_PER_SECOND
+
+
+def test_governor_halves_rate_when_throttled_and_recovers_on_success():
+    governor = ApiGovernor('org', max_rate=10)
+
+    governor.on_throttled()
+    governor.on_throttled()
+    assert governor.rate == pytest.approx(2.5)
+    for _ in range(10):
+        governor.on_success()
+    assert governor.rate == pytest.approx(10 * (0.25 + 10 * transport.RECOVERY_STEP))
+    for _ in range(100):
+        governor.on_success()
+    assert governor.rate == 10
+
+
+def test_governor_waits_once_the_bucket_is_empty(monkeypatch):
+    waits = []
+    monkeypatch.setattr(transport.time, 'sleep', waits.append)
+    governor = ApiGovernor('org', max_rate=5)
+
+    for _ in range(6):
+        governor.acquire()
+
+    assert len(waits) == 1 and 0 < waits[0] <= 0.2
+
+
+def test_backoff_delay_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(transport.random, 'uniform', lambda low, high: high)
+
+    assert [backoff_delay(attempt, base=1, cap=5) for attempt in range(5)] == [1, 2, 4, 5, 5]
@@ -0,0 +1,345 @@
+# utils/bulk_utils.py
+
+import csv
+import io
+import time
+from collections import defaultdict, deque
+
+from simple_salesforce.util import exception_handler
+
+from utils.metrics import metrics
+from utils.transport import backoff_delay
+
+# Máximo de registros aceitos por chamada do sObject Collections
+COLLECTIONS_BATCH_SIZE = 200
+
+# A partir deste volume um job do Bulk API 2.0 compensa o custo fixo (criar, enviar, aguardar, baixar resultados)
+BULK_API_THRESHOLD = 2000
+
+# Tamanho dos blocos extraídos quando o objeto é carregado pelo Bulk API 2.0
+BULK_CHUNK_SIZE = 50000
+
+# Blocos do Bulk API 2.0 de um mesmo objeto carregados ao mesmo tempo: cada um tem até BULK_CHUNK_SIZE
+# registros em memória, e jobs simultâneos no mesmo objeto disputam os bloqueios dos mesmos pais
+BULK_MAX_IN_FLIGHT = 1
+
+# O Bulk API 2.0 aceita até 150 MB de CSV por job; ficamos abaixo para ter margem
+BULK_MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+
+# No update e no upsert do Bulk API 2.0 uma célula vazia mantém o valor atual; este marcador grava nulo
+BULK_NULL = '#N/A'
+
+# Linhas recusadas por bloqueio de registro (UNABLE_TO_LOCK_ROW) são reenviadas até este número de vezes
+LOCK_RETRIES = 3
+
+BULK_POLL_INTERVAL = 2
+BULK_JOB_TIMEOUT = 3600
+
+
+def chunked(items, size):
+    """Divide uma lista em blocos de no máximo `size` itens."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def choose_load_mode(record_count):
+    """Escolhe a API de carga de acordo com o volume de registros."""
+    return 'bulk' if record_count >= BULK_API_THRESHOLD else 'collections'
+
+
+def load_records(sf, object_name, records, mode=None):
+    """
+    Insere os registros no Salesforce usando sObject Collections ou Bulk API 2.0.
+    Retorna uma lista de resultados na mesma ordem de `records`, no formato
+    {'id': ..., 'success': ..., 'errors': [...]} usado pelo `create`.
+    """
+    if not records:
+        return []
+    mode = mode or choose_load_mode(len(records))
+
+    def insert(batch, batch_mode):
+        if batch_mode == 'bulk':
+            return insert_records_bulk(sf, object_name, batch)
+        return insert_records_collections(sf, object_name, batch)
+
+    with metrics.timed('insert', object=object_name, mode=mode):
+        return _retry_locked_rows(insert, records, mode)
+
+
+def insert_records_collections(sf, object_name, records, all_or_none=False):
+    """Insere registros em lotes de 200 via POST composite/sobjects."""
+    results = []
+    for batch in chunked(records, COLLECTIONS_BATCH_SIZE):
+        payload = {
+            'allOrNone': all_or_none,
+            'records': [_with_type(object_name, record) for record in batch],
+        }
+        response = sf.restful('composite/sobjects', method='POST', json=payload)
+        results.extend(_normalize_result(result) for result in response)
+    return results
+
+
+def insert_records_bulk(sf, object_name, records):
+    """Insere registros através de um ou mais jobs de ingestão do Bulk API 2.0."""
+    return _run_bulk_operation(sf, object_name, 'insert', records)
+
+
+def update_records(sf, object_name, records, mode=None):
+    """
+    Atualiza registros (que precisam ter `Id`) no Salesforce, em lote.
+    Retorna os resultados na mesma ordem de `records`.
+    """
+    if not records:
+        return []
+    mode = mode or choose_load_mode(len(records))
+
+    def update(batch, batch_mode):
+        if batch_mode == 'bulk':
+            return _run_bulk_operation(sf, object_name, 'update', batch)
+        return update_records_collections(sf, object_name, batch)
+
+    with metrics.timed('update', object=object_name, mode=mode):
+        return _retry_locked_rows(update, records, mode)
+
+
+def update_records_collections(sf, object_name, records, all_or_none=False):
+    """Atualiza registros em lotes de 200 via PATCH composite/sobjects."""
+    results = []
+    for batch in chunked(records, COLLECTIONS_BATCH_SIZE):
+        payload = {
+            'allOrNone': all_or_none,
+            'records': [_with_type(object_name, record, keep_id=True) for record in batch],
+        }
+        response = sf.restful('composite/sobjects', method='PATCH', json=payload)
+        results.extend(_normalize_result(result) for result in response)
+    return results
+
+
+def upsert_records(sf, object_name, external_id_field, records, mode=None):
+    """
+    Insere ou atualiza registros casando pelo campo de Id externo, em lote.
+    O `Id` dos registros é ignorado. Retorna os resultados na mesma ordem de `records`.
+    """
+    if not records:
+        return []
+    mode = mode or choose_load_mode(len(records))
+    records = [{k: v for k, v in record.items() if k != 'Id'} for record in records]
+
+    def upsert(batch, batch_mode):
+        if batch_mode == 'bulk':
+            return _run_bulk_operation(sf, object_name, 'upsert', batch, external_id_field)
+        return upsert_records_collections(sf, object_name, external_id_field, batch)
+
+    with metrics.timed('upsert', object=object_name, mode=mode):
+        return _retry_locked_rows(upsert, records, mode)
+
+
+def upsert_records_collections(sf, object_name, external_id_field, records, all_or_none=False):
+    """Insere ou atualiza registros em lotes de 200 via PATCH composite/sobjects/{objeto}/{campo}."""
+    results = []
+    for batch in chunked(records, COLLECTIONS_BATCH_SIZE):
+        payload = {
+            'allOrNone': all_or_none,
+            'records': [_with_type(object_name, record) for record in batch],
+        }
+        response = sf.restful(f'composite/sobjects/{object_name}/{external_id_field}', method='PATCH', json=payload)
+        results.extend(_normalize_result(result) for result in response)
+    return results
+
+
+def delete_records(sf, object_name, ids, mode=None):
+    """Exclui registros pelo Id, em lote. Retorna os resultados na mesma ordem de `ids`."""
+    if not ids:
+        return []
+    mode = mode or choose_load_mode(len(ids))
+
+    def delete(batch, batch_mode):
+        if batch_mode == 'bulk':
+            return _run_bulk_operation(sf, object_name, 'delete', [{'Id': record_id} for record_id in batch])
+        return delete_records_collections(sf, batch)
+
+    with metrics.timed('delete', object=object_name, mode=mode):
+        return _retry_locked_rows(delete, ids, mode)
+
+
+def delete_records_collections(sf, ids, all_or_none=False):
+    """Exclui registros em lotes de 200 via DELETE composite/sobjects."""
+    results = []
+    for batch in chunked(ids, COLLECTIONS_BATCH_SIZE):
+        params = {'ids': ','.join(batch), 'allOrNone': str(all_or_none).lower()}
+        response = sf.restful('composite/sobjects', method='DELETE', params=params)
+        results.extend(_normalize_result(result) for result in response)
+    return results
+
+
+def _retry_locked_rows(operation, records, mode):
+    """
+    Executa `operation(registros, modo)` e reenvia, com backoff exponencial e jitter,
+    só as linhas que falharam por bloqueio de registro (UNABLE_TO_LOCK_ROW), que
+    acontece quando lotes paralelos atualizam o mesmo pai. As demais falhas são definitivas.
+    Retorna os resultados na mesma ordem de `records`.
+    """
+    results = operation(records, mode)
+    locked = [index for index, result in enumerate(results) if _is_locked(result)]
+    for attempt in range(LOCK_RETRIES):
+        if not locked:
+            break
+        time.sleep(backoff_delay(attempt))
+        metrics.inc('rows_lock_retries_total', len(locked))
+        # Poucas linhas não justificam um novo job do Bulk API
+        retry_mode = 'collections' if mode != 'bulk' else choose_load_mode(len(locked))
+        for index, result in zip(locked, operation([records[index] for index in locked], retry_mode)):
+            results[index] = result
+        locked = [index for index in locked if _is_locked(results[index])]
+    return results
+
+
+def _is_locked(result):
+    return not result['success'] and any(error.get('statusCode') == 'UNABLE_TO_LOCK_ROW' for error in result['errors'])
+
+
+def _run_bulk_operation(sf, object_name, operation, records, external_id_field=None):
+    """Executa a operação em um ou mais jobs do Bulk API 2.0 e associa os resultados às linhas."""
+    keep_id = operation != 'insert'
+    columns = sorted({field for record in records for field in record if keep_id or field != 'Id'})
+    null = '' if operation == 'insert' else BULK_NULL
+    results = [None] * len(records)
+
+    for indices, csv_data in _build_csv_uploads(records, columns, null):
+        job_id = _run_ingest_job(sf, object_name, operation, csv_data, external_id_field)
+        _map_job_results(sf, job_id, columns, records, indices, results, null)
+
+    return results
+
+
+def _with_type(object_name, record, keep_id=False):
+    """Monta o corpo de um registro para o sObject Collections."""
+    body = {'attributes': {'type': object_name}}
+    body.update((k, v) for k, v in record.items() if keep_id or k != 'Id')
+    return body
+
+
+def _normalize_result(result):
+    return {
+        'id': result.get('id'),
+        'success': result.get('success', False),
+        'errors': result.get('errors') or [],
+    }
+
+
+def _csv_value(value, null=''):
+    """Converte um valor para a representação esperada pelo Bulk API 2.0; `None` vira `null`."""
+    if value is None:
+        return null
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _build_csv_uploads(records, columns, null=''):
+    """Gera (índices, csv) respeitando o tamanho máximo de upload por job."""
+    header = _csv_line(columns)
+    buffer, indices, size = [header], [], len(header)
+
+    for index, record in enumerate(records):
+        line = _csv_line([_csv_value(record.get(column), null) for column in columns])
+        if indices and size + len(line) > BULK_MAX_UPLOAD_BYTES:
+            yield indices, ''.join(buffer)
+            buffer, indices, size = [header], [], len(header)
+        buffer.append(line)
+        indices.append(index)
+        size += len(line)
+
+    if indices:
+        yield indices, ''.join(buffer)
+
+
+def _csv_line(values):
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerow(values)
+    return output.getvalue()
+
+
+def _bulk2_request(sf, method, path='', **kwargs):
+    """Executa uma chamada no endpoint jobs/ingest reaproveitando a sessão do cliente."""
+    url = sf.base_url + 'jobs/ingest' + (f'/{path}' if path else '')
+    headers = sf.headers.copy()
+    headers.update(kwargs.pop('headers', {}))
+    response = sf.session.request(method, url, headers=headers, **kwargs)
+    if response.status_code >= 300:
+        exception_handler(response, name='jobs/ingest')
+    return response
+
+
+def _run_ingest_job(sf, object_name, operation, csv_data, external_id_field=None):
+    """Cria o job, envia o CSV, fecha o job e aguarda o processamento."""
+    job_spec = {
+        'object': object_name,
+        'operation': operation,
+        'contentType': 'CSV',
+        'lineEnding': 'LF',
+    }
+    if external_id_field:
+        job_spec['externalIdFieldName'] = external_id_field
+
+    job_id = _bulk2_request(sf, 'POST', json=job_spec).json()['id']
+    _bulk2_request(sf, 'PUT', f'{job_id}/batches', data=csv_data.encode('utf-8'),
+                   headers={'Content-Type': 'text/csv'})
+    _bulk2_request(sf, 'PATCH', job_id, json={'state': 'UploadComplete'})
+
+    deadline = time.monotonic() + BULK_JOB_TIMEOUT
+    while True:
+        state = _bulk2_request(sf, 'GET', job_id).json()['state']
+        if state in ('JobComplete', 'Failed', 'Aborted'):
+            return job_id
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Job {job_id} do Bulk API 2.0 não terminou em {BULK_JOB_TIMEOUT} segundos.")
+        time.sleep(BULK_POLL_INTERVAL)
+
+
+def _map_job_results(sf, job_id, columns, records, indices, results, null=''):
+    """
+    Associa cada linha dos resultados do job ao registro de origem.
+    O Bulk API 2.0 não garante a ordem, então a associação é feita pelos valores
+    das colunas enviadas, que o Salesforce devolve junto com sf__Id/sf__Error.
+    """
+    pending = defaultdict(deque)
+    for index in indices:
+        pending[tuple(_csv_value(records[index].get(column), null) for column in columns)].append(index)
+
+    def take(row):
+        queue = pending.get(tuple(row.get(column, '') for column in columns))
+        return queue.popleft() if queue else None
+
+    for row in _read_results(sf, job_id, 'successfulResults'):
+        index = take(row)
+        if index is not None:
+            results[index] = {'id': row['sf__Id'], 'success': True, 'errors': []}
+
+    for row in _read_results(sf, job_id, 'failedResults'):
+        index = take(row)
+        if index is not None:
+            results[index] = {'id': None, 'success': False, 'errors': [_parse_bulk_error(row['sf__Error'])]}
+
+    for index in indices:
+        if results[index] is None:
+            results[index] = {
+                'id': None,
+                'success': False,
+                'errors': [{'statusCode': 'NOT_PROCESSED', 'message': f"Registro não processado pelo job {job_id}", 'fields': []}],
+            }
+
+
+def _read_results(sf, job_id, kind):
+    response = _bulk2_request(sf, 'GET', f'{job_id}/{kind}', headers={'Accept': 'text/csv'})
+    return csv.DictReader(io.StringIO(response.text))
+
+
+def _parse_bulk_error(error):
+    """Converte 'CODIGO:mensagem:Campo1,Campo2 --' no formato de erro do REST."""
+    status_code, _, message = error.partition(':')
+    fields = []
+    if message.endswith(' --') and ':' in message:
+        message, _, field_list = message[:-3].rpartition(':')
+        fields = [field for field in field_list.split(',') if field]
+    return {'statusCode': status_code, 'message': message, 'fields': fields}
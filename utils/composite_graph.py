@@ -0,0 +1,159 @@
+# utils/composite_graph.py
+
+from utils.metrics import metrics
+
+# Limites do Composite Graph API: nós e profundidade de um grafo, grafos por chamada
+GRAPH_MAX_NODES = 500
+GRAPH_MAX_DEPTH = 15
+GRAPHS_PER_REQUEST = 75
+# Mantemos também o total de nós de uma chamada dentro do limite de um grafo
+REQUEST_MAX_NODES = 500
+# Árvores independentes são agrupadas no mesmo grafo até este tamanho, para que uma chamada
+# fique cheia mesmo com árvores de um nó; uma falha desfaz no máximo esse grupo
+GRAPH_PACK_NODES = 10
+
+
+def reference_id(source_id):
+    """Identificador do nó no grafo; os Ids do Salesforce já são alfanuméricos."""
+    return f"ref{source_id}"
+
+
+def reference(source_id):
+    """Referência ao Id do registro criado por outro nó do mesmo grafo."""
+    return f"@{{{reference_id(source_id)}.id}}"
+
+
+def pack_record_graphs(order, parents_of, blocked):
+    """
+    Agrupa registros em grafos para o Composite Graph API.
+    Cada registro entra junto com todos os ancestrais ainda pendentes
+    (`parents_of(Id)` retorna os pais pendentes), pais primeiro. Um registro cujos
+    ancestrais já estão em outro grafo se junta a ele; se estão em mais de um grafo
+    ou o grafo está cheio, o registro espera a próxima rodada, quando esses pais já
+    terão Id no destino. Registros com ancestrais em `blocked`, profundos demais ou
+    com mais de 500 ancestrais pendentes são acrescentados a `blocked`.
+    Retorna (grafos como listas de Ids, Ids que esperam a próxima rodada).
+    """
+    assigned = {}
+    depth = {}
+    graphs, waiting = [], []
+    open_graph = None
+
+    for source_id in order:
+        if source_id in assigned or source_id in blocked:
+            continue
+
+        # Pós-ordem iterativa: ancestrais antes dos descendentes
+        nodes, seen, stack = [], set(), [(source_id, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                nodes.append(node)
+                depth[node] = 1 + max((depth[parent] for parent in parents_of(node)), default=0)
+                continue
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.append((node, True))
+            stack.extend((parent, False) for parent in parents_of(node) if parent not in seen)
+
+        if depth[source_id] > GRAPH_MAX_DEPTH or any(node in blocked for node in nodes):
+            blocked.add(source_id)
+            continue
+
+        new = [node for node in nodes if node not in assigned]
+        touched = {assigned[node] for node in nodes if node in assigned}
+        if len(touched) > 1:
+            waiting.append(source_id)
+            continue
+        if touched:
+            target = touched.pop()
+        elif open_graph is not None and len(graphs[open_graph]) + len(new) <= GRAPH_PACK_NODES:
+            target = open_graph
+        elif len(new) > GRAPH_MAX_NODES:
+            blocked.add(source_id)
+            continue
+        else:
+            graphs.append([])
+            target = open_graph = len(graphs) - 1
+
+        if len(graphs[target]) + len(new) > GRAPH_MAX_NODES:
+            waiting.append(source_id)
+            continue
+        for node in new:
+            assigned[node] = target
+            graphs[target].append(node)
+
+    return graphs, waiting
+
+
+def graph_requests(graphs):
+    """Agrupa os grafos em chamadas de até 75 grafos e 500 nós."""
+    batch, nodes = [], 0
+    for graph in graphs:
+        if batch and (len(batch) >= GRAPHS_PER_REQUEST or nodes + len(graph) > REQUEST_MAX_NODES):
+            yield batch
+            batch, nodes = [], 0
+        batch.append(graph)
+        nodes += len(graph)
+    if batch:
+        yield batch
+
+
+def insert_graphs(sf, graphs):
+    """
+    Insere grafos de registros via POST composite/graph, em chamadas agrupadas por `graph_requests`.
+    Cada grafo é uma lista de (objeto, Id de origem, corpo) com os pais antes dos
+    filhos; os lookups para pais do mesmo grafo usam `reference()`. Cada grafo é
+    tudo ou nada. Retorna, na ordem de `graphs`, {Id de origem: resultado} com
+    resultados no formato {'id': ..., 'success': ..., 'errors': [...]}.
+    """
+    results = []
+    for batch in graph_requests(graphs):
+        payload = {'graphs': [
+            {
+                'graphId': str(index),
+                'compositeRequest': [
+                    {
+                        'method': 'POST',
+                        'url': f"/services/data/v{sf.sf_version}/sobjects/{object_name}/",
+                        'referenceId': reference_id(source_id),
+                        'body': body,
+                    }
+                    for object_name, source_id, body in graph
+                ],
+            }
+            for index, graph in enumerate(batch)
+        ]}
+        with metrics.timed('insert', mode='graph'):
+            response = sf.restful('composite/graph', method='POST', json=payload)
+        by_graph = {item['graphId']: item for item in response['graphs']}
+        for index, graph in enumerate(batch):
+            results.append(_graph_results(graph, by_graph.get(str(index))))
+    return results
+
+
+def _graph_results(graph, response):
+    nodes = {}
+    if response is not None:
+        nodes = {item['referenceId']: item for item in response['graphResponse']['compositeResponse']}
+    successful = response is not None and response.get('isSuccessful', False)
+
+    results = {}
+    for _, source_id, _ in graph:
+        node = nodes.get(reference_id(source_id), {})
+        body = node.get('body')
+        if successful and isinstance(body, dict) and body.get('id'):
+            results[source_id] = {'id': body['id'], 'success': True, 'errors': []}
+        else:
+            # Em grafos que falham, os nós que não causaram o erro vêm com PROCESSING_HALTED
+            errors = body if isinstance(body, list) else [{'errorCode': 'PROCESSING_HALTED', 'message': 'Grafo não processado'}]
+            results[source_id] = {
+                'id': None,
+                'success': False,
+                'errors': [
+                    {'statusCode': error.get('errorCode'), 'message': error.get('message'), 'fields': error.get('fields') or []}
+                    for error in errors
+                ],
+            }
+    return results
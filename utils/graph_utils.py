@@ -0,0 +1,198 @@
+# utils/graph_utils.py
+
+
+class DependencyGraph:
+    """
+    Grafo de relacionamentos entre objetos.
+    Uma aresta source -> target significa que `source` tem um lookup (`field`) para `target`.
+    Os campos ficam indexados por (source, target), então consultar os campos de uma
+    aresta é O(1), e todos os percursos são iterativos, sem risco de estourar a
+    recursão em esquemas profundos.
+    """
+
+    def __init__(self):
+        self._successors = {}
+        self._edge_count = 0
+
+    def add_node(self, node):
+        self._successors.setdefault(node, {})
+
+    def add_edge(self, source, target, field):
+        self.add_node(target)
+        fields = self._successors.setdefault(source, {}).setdefault(target, [])
+        if field not in fields:
+            fields.append(field)
+            self._edge_count += 1
+
+    def remove_edge(self, source, target, field=None):
+        """Remove a aresta inteira ou apenas um dos campos dela."""
+        fields = self._successors[source][target]
+        if field is None:
+            self._edge_count -= len(fields)
+            del self._successors[source][target]
+            return
+        fields.remove(field)
+        self._edge_count -= 1
+        if not fields:
+            del self._successors[source][target]
+
+    def has_node(self, node):
+        return node in self._successors
+
+    def has_edge(self, source, target):
+        return target in self._successors.get(source, {})
+
+    def nodes(self):
+        return list(self._successors)
+
+    def successors(self, node):
+        return list(self._successors.get(node, {}))
+
+    def fields(self, source, target):
+        """Campos de lookup de `source` que apontam para `target`."""
+        return list(self._successors.get(source, {}).get(target, []))
+
+    def edges(self):
+        """Gera (source, target, field) para todos os campos de relacionamento."""
+        for source, targets in self._successors.items():
+            for target, fields in targets.items():
+                for field in fields:
+                    yield source, target, field
+
+    def number_of_nodes(self):
+        return len(self._successors)
+
+    def number_of_edges(self):
+        return self._edge_count
+
+    def __len__(self):
+        return len(self._successors)
+
+    def __contains__(self, node):
+        return node in self._successors
+
+    def copy(self):
+        graph = DependencyGraph()
+        graph._successors = {node: {target: list(fields) for target, fields in targets.items()}
+                             for node, targets in self._successors.items()}
+        graph._edge_count = self._edge_count
+        return graph
+
+    def merge(self, other):
+        """Acrescenta os nós e arestas de outro grafo a este."""
+        for node in other.nodes():
+            self.add_node(node)
+        for source, target, field in other.edges():
+            self.add_edge(source, target, field)
+        return self
+
+    def reachable(self, root):
+        """Objetos alcançáveis a partir de `root` (incluindo ele), em ordem de descoberta."""
+        seen = {root: None}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for successor in self._successors.get(node, {}):
+                if successor not in seen:
+                    seen[successor] = None
+                    stack.append(successor)
+        return list(seen)
+
+    def strongly_connected_components(self):
+        """
+        Componentes fortemente conexas (Tarjan iterativo).
+        As componentes saem das dependências para quem depende delas: cada
+        componente aparece depois de todas as que ela referencia.
+        """
+        index, lowlink, on_stack = {}, {}, set()
+        stack, components = [], []
+        counter = 0
+
+        for start in self._successors:
+            if start in index:
+                continue
+            work = [(start, iter(self._successors[start]))]
+            index[start] = lowlink[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+
+            while work:
+                node, successors = work[-1]
+                advanced = False
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self._successors[successor])))
+                        advanced = True
+                        break
+                    if successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+
+        return components
+
+    def insertion_plan(self, objects=None):
+        """
+        Plano de inserção baseado nas componentes fortemente conexas.
+        Retorna (camadas, adiados):
+        - camadas: listas de objetos, pais primeiro; objetos de uma mesma
+          componente ficam na mesma camada;
+        - adiados: {objeto: {campo: alvo}} com os lookups dentro de uma componente
+          (ciclos e auto-relacionamentos), que são inseridos vazios e preenchidos
+          depois em uma atualização em lote.
+        Com `objects`, o plano fica restrito a esses objetos.
+        """
+        allowed = set(objects) if objects is not None else None
+        components = self.strongly_connected_components()
+        component_of = {node: i for i, component in enumerate(components) for node in component}
+
+        deferred = {}
+        level = [0] * len(components)
+        for i, component in enumerate(components):
+            for node in component:
+                for target, fields in self._successors[node].items():
+                    j = component_of[target]
+                    if j == i:
+                        deferred.setdefault(node, {}).update((field, target) for field in fields)
+                    else:
+                        # Componentes referenciadas já foram visitadas (ordem de Tarjan)
+                        level[i] = max(level[i], level[j] + 1)
+
+        layers = [[] for _ in range(max(level, default=-1) + 1)]
+        for i, component in enumerate(components):
+            layers[level[i]].extend(node for node in component if allowed is None or node in allowed)
+        layers = [sorted(layer) for layer in layers if layer]
+        if allowed is not None:
+            missing = allowed - set(self._successors)
+            if missing:
+                layers.append(sorted(missing))
+            deferred = {node: fields for node, fields in deferred.items() if node in allowed}
+        return layers, deferred
+
+    def to_networkx(self):
+        """Converte para networkx, usado apenas para desenhar o grafo."""
+        import networkx as nx
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(self._successors)
+        for source, target, field in self.edges():
+            graph.add_edge(source, target, field=field)
+        return graph
@@ -0,0 +1,31 @@
+# utils/logging_utils.py
+
+import logging
+
+from colorama import Fore, Style, init
+
+# Cor de cada nível no terminal
+LEVEL_COLORS = {
+    logging.DEBUG: Style.DIM,
+    logging.INFO: Fore.CYAN,
+    logging.WARNING: Fore.YELLOW,
+    logging.ERROR: Fore.RED,
+    logging.CRITICAL: Fore.RED + Style.BRIGHT,
+}
+
+
+class ColorFormatter(logging.Formatter):
+    """Formata as mensagens com a cor do nível, como os prints coloridos de antes."""
+
+    def format(self, record):
+        return LEVEL_COLORS.get(record.levelno, '') + super().format(record) + Style.RESET_ALL
+
+
+def configure_logging(level='INFO'):
+    """Configura o log da aplicação no terminal; mensagens abaixo de `level` não são formatadas."""
+    init()
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColorFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s', '%H:%M:%S'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
@@ -0,0 +1,233 @@
+# utils/metadata_cache.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+from simple_salesforce.util import exception_handler
+
+from utils.metrics import metrics
+
+# Caminho do cache em disco, compartilhado entre execuções
+DEFAULT_CACHE_PATH = os.environ.get('DATASYNC_CACHE_PATH', os.path.join('.datasync', 'metadata.sqlite'))
+
+# Dentro deste intervalo (segundos) o cache em disco é usado sem nenhuma chamada de validação
+DEFAULT_MAX_AGE = int(os.environ.get('DATASYNC_CACHE_MAX_AGE', 24 * 3600))
+
+# Atributos de campo do describe usados pela migração; o resto é descartado para manter o cache compacto
+FIELD_KEYS = (
+    'name', 'type', 'referenceTo', 'relationshipName', 'createable', 'updateable',
+    'nillable', 'defaultedOnCreate', 'externalId', 'idLookup', 'calculated', 'autoNumber',
+)
+
+# O /composite/batch aceita até 25 subrequisições por chamada
+COMPOSITE_BATCH_SIZE = 25
+# Lotes de describe enviados em paralelo
+DESCRIBE_CONCURRENCY = 4
+
+
+def org_key(sf):
+    """Identifica a org de um cliente para separar os describes no cache."""
+    return sf.sf_instance
+
+
+def _http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+class MetadataCache:
+    """
+    Cache de describes das duas orgs.
+    Mantém os describes em memória durante a execução e em SQLite entre execuções.
+    Depois de `max_age` segundos a org é revalidada com um describe global
+    condicional (If-Modified-Since); se algo mudou, cada objeto é revalidado
+    individualmente também com If-Modified-Since antes de ser baixado de novo,
+    inclusive no `prefetch`, que só baixa em lote os objetos que não estão em disco.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._describes = {}
+        self._derived = {}
+        self._checked_orgs = set()
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS describes (
+                    org TEXT NOT NULL,
+                    object TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    stale INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (org, object)
+                );
+                CREATE TABLE IF NOT EXISTS orgs (
+                    org TEXT PRIMARY KEY,
+                    validated_at REAL NOT NULL
+                );
+            """)
+        return self._conn
+
+    def describe(self, sf, object_name):
+        """Retorna o describe (compactado) do objeto, consultando a org apenas quando necessário."""
+        key = (org_key(sf), object_name)
+        with self._lock:
+            describe, row = self._cached(sf, key)
+            if describe is not None:
+                return describe
+
+            describe = self._fetch_describe(sf, object_name, since=row[0] if row else None)
+            if describe is None:
+                describe = json.loads(row[1])
+            self._store(key, describe)
+            self._describes[key] = describe
+            return describe
+
+    def prefetch(self, sf, object_names, max_concurrency=DESCRIBE_CONCURRENCY):
+        """
+        Garante que os describes dos objetos estejam no cache, baixando os que
+        faltam em lotes de até 25 por chamada do /composite/batch, com alguns
+        lotes em paralelo. Os que estão em disco mas precisam de revalidação
+        usam o describe condicional, que na maioria das vezes responde 304.
+        Objetos que falharem no lote ficam para o `describe` individual, que
+        reporta o erro normalmente.
+        """
+        with self._lock:
+            rows = {}
+            for obj in dict.fromkeys(object_names):
+                describe, row = self._cached(sf, (org_key(sf), obj))
+                if describe is None:
+                    rows[obj] = row
+        if not rows:
+            return
+
+        missing = [obj for obj, row in rows.items() if row is None]
+        tasks = [lambda batch=missing[i:i + COMPOSITE_BATCH_SIZE]: self._fetch_batch(sf, batch)
+                 for i in range(0, len(missing), COMPOSITE_BATCH_SIZE)]
+        tasks += [lambda obj=obj, row=row: self._revalidate(sf, obj, row) for obj, row in rows.items() if row is not None]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(tasks)))) as executor:
+            for fetched in executor.map(lambda task: task(), tasks):
+                for object_name, describe in fetched:
+                    self.store_describe(sf, object_name, describe)
+
+    def _revalidate(self, sf, object_name, row):
+        """Revalida um describe em disco com If-Modified-Since; retorna [(objeto, describe)]."""
+        describe = self._fetch_describe(sf, object_name, since=row[0])
+        return [(object_name, describe if describe is not None else json.loads(row[1]))]
+
+    def _cached(self, sf, key):
+        """Retorna (describe, linha em disco); o describe é None se precisar ser baixado."""
+        if key in self._describes:
+            return self._describes[key], None
+
+        self._check_org(sf)
+        row = self._db().execute(
+            "SELECT fetched_at, payload, stale FROM describes WHERE org = ? AND object = ?", key
+        ).fetchone()
+        if row and not row[2]:
+            describe = json.loads(row[1])
+            self._describes[key] = describe
+            return describe, row
+        return None, row
+
+    @staticmethod
+    def _fetch_batch(sf, object_names):
+        """Baixa vários describes em uma única chamada do /composite/batch."""
+        payload = {
+            'batchRequests': [
+                {'method': 'GET', 'url': f'v{sf.sf_version}/sobjects/{object_name}/describe'}
+                for object_name in object_names
+            ]
+        }
+        with metrics.timed('describe'):
+            response = sf.restful('composite/batch', method='POST', json=payload)
+        return [
+            (object_name, result['result'])
+            for object_name, result in zip(object_names, response['results'])
+            if result['statusCode'] == 200
+        ]
+
+    def store_describe(self, sf, object_name, describe):
+        """Registra um describe obtido por outro caminho (ex.: composite batch)."""
+        key = (org_key(sf), object_name)
+        describe = compact_describe(describe)
+        with self._lock:
+            self._store(key, describe)
+            self._describes[key] = describe
+        return describe
+
+    def derived(self, key, compute):
+        """Memoriza valores calculados a partir dos describes (campos comuns, campos de referência...)."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = compute()
+            return self._derived[key]
+
+    def _store(self, key, describe):
+        conn = self._db()
+        conn.execute(
+            "INSERT OR REPLACE INTO describes (org, object, fetched_at, payload) VALUES (?, ?, ?, ?)",
+            (key[0], key[1], time.time(), json.dumps(describe, separators=(',', ':'))),
+        )
+        conn.commit()
+
+    def _check_org(self, sf):
+        """Valida os describes em disco da org uma única vez por execução."""
+        org = org_key(sf)
+        if org in self._checked_orgs:
+            return
+        self._checked_orgs.add(org)
+
+        conn = self._db()
+        row = conn.execute("SELECT validated_at FROM orgs WHERE org = ?", (org,)).fetchone()
+        now = time.time()
+        if row and now - row[0] < self.max_age:
+            return
+
+        if row:
+            response = self._request(sf, 'sobjects', since=row[0])
+            if response.status_code != 304:
+                # Todos os describes da org em disco passam a exigir revalidação, nesta e nas próximas execuções
+                conn.execute("UPDATE describes SET stale = 1 WHERE org = ?", (org,))
+        conn.execute("INSERT OR REPLACE INTO orgs (org, validated_at) VALUES (?, ?)", (org, now))
+        conn.commit()
+
+    def _fetch_describe(self, sf, object_name, since=None):
+        """Baixa o describe; retorna None quando o Salesforce responde 304 (não modificado)."""
+        with metrics.timed('describe'):
+            response = self._request(sf, f'sobjects/{object_name}/describe', since=since)
+        if response.status_code == 304:
+            return None
+        return compact_describe(response.json())
+
+    @staticmethod
+    def _request(sf, path, since=None):
+        headers = sf.headers.copy()
+        if since is not None:
+            headers['If-Modified-Since'] = _http_date(since)
+        response = sf.session.get(sf.base_url + path, headers=headers)
+        if response.status_code >= 300 and response.status_code != 304:
+            exception_handler(response, name=path)
+        return response
+
+
+def compact_describe(describe):
+    """Mantém apenas os atributos do describe usados pela migração."""
+    if 'fields' in describe and describe['fields'] and set(describe['fields'][0]) <= set(FIELD_KEYS):
+        return describe
+    return {
+        'name': describe['name'],
+        'fields': [{k: field.get(k) for k in FIELD_KEYS} for field in describe['fields']],
+    }
@@ -0,0 +1,201 @@
+# utils/metrics.py
+
+import bisect
+import contextlib
+import cProfile
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets dos histogramas de latência, no estilo do Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Prefixo dos nomes das métricas no formato texto do Prometheus
+METRIC_PREFIX = 'datasync_'
+
+# Classificação das URLs da API REST em endpoints (a primeira regra que casar vale)
+ENDPOINT_RULES = (
+    (re.compile(r'/jobs/ingest'), 'bulk_ingest'),
+    (re.compile(r'/composite/batch$'), 'composite_batch'),
+    (re.compile(r'/composite/graph$'), 'composite_graph'),
+    (re.compile(r'/composite/sobjects'), 'collections'),
+    (re.compile(r'/sobjects/?$'), 'describe_global'),
+    (re.compile(r'/sobjects/[^/]+/describe/?$'), 'describe'),
+    (re.compile(r'/sobjects/[^/]+/deleted'), 'deleted'),
+    (re.compile(r'/sobjects/'), 'sobject'),
+    (re.compile(r'/query(All)?(/|$)'), 'query'),
+    (re.compile(r'/limits/?$'), 'limits'),
+)
+
+
+def classify_endpoint(url):
+    """Reduz a URL de uma chamada ao nome do endpoint usado nos contadores."""
+    path = urlsplit(url).path
+    for pattern, endpoint in ENDPOINT_RULES:
+        if pattern.search(path):
+            return endpoint
+    return 'other'
+
+
+class Metrics:
+    """
+    Contadores e histogramas de latência da migração, seguros entre threads.
+    Cada série é identificada pelo nome e pelos rótulos (ex.: object='Account').
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """Soma `value` ao contador."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, seconds, **labels):
+        """Registra uma duração no histograma."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @contextlib.contextmanager
+    def timed(self, phase, **labels):
+        """Mede o bloco e registra a duração em `phase_seconds{phase=...}`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase_seconds', time.perf_counter() - start, phase=phase, **labels)
+
+    def instrument_session(self, session, org=None):
+        """
+        Conta as chamadas HTTP feitas pela sessão (requests.Session) por endpoint,
+        método e status, e registra a latência de cada uma.
+        """
+        def on_response(response, *args, **kwargs):
+            endpoint = classify_endpoint(response.url)
+            labels = {'endpoint': endpoint, 'org': org} if org else {'endpoint': endpoint}
+            self.inc('api_calls_total', method=response.request.method, status=response.status_code, **labels)
+            self.observe('api_latency_seconds', response.elapsed.total_seconds(), **labels)
+            return response
+
+        session.hooks.setdefault('response', []).append(on_response)
+        return session
+
+    def quantile(self, histogram, fraction):
+        """Estimativa de um quantil pelo limite superior do bucket em que ele cai."""
+        target = fraction * histogram['count']
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), histogram['buckets']):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return 0.0
+
+    def snapshot(self):
+        """Retorna todas as séries como estruturas simples, prontas para JSON."""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items(), key=lambda item: str(item[0]))
+            ]
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram['count'],
+                    'sum': histogram['sum'],
+                    'p50': self.quantile(histogram, 0.50),
+                    'p99': self.quantile(histogram, 0.99),
+                    'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], histogram['buckets'])),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: str(item[0]))
+            ]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Exporta as séries no formato texto de exposição do Prometheus."""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot['counters']:
+            name = METRIC_PREFIX + counter['name']
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(counter['labels'])} {counter['value']:g}")
+        for histogram in snapshot['histograms']:
+            name = METRIC_PREFIX + histogram['name']
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(dict(histogram['labels'], le=bound))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(histogram['labels'])} {histogram['sum']:g}")
+            lines.append(f"{name}_count{_labels(histogram['labels'])} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Grava as métricas em `path`: texto do Prometheus para .prom/.txt, JSON nos demais casos."""
+        content = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        logger.info("Métricas gravadas em %s", path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    # O formato de exposição exige escapar barra invertida, aspas e quebra de linha nos valores
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """
+    Executa o bloco sob o cProfile e grava as estatísticas em `path` (abrir com
+    `python -m pstats` ou snakeviz). Sem `path`, não faz nada. O cProfile só
+    enxerga a thread atual; use um único worker para perfilar a carga inteira.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info("Perfil gravado em %s", path)
+
+
+# Métricas do processo, compartilhadas por todos os módulos
+metrics = Metrics()
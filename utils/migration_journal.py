@@ -0,0 +1,137 @@
+# utils/migration_journal.py
+
+import os
+import sqlite3
+import threading
+
+from utils.metadata_cache import org_key
+
+# Caminho do diário de migração em disco
+DEFAULT_JOURNAL_PATH = os.environ.get('DATASYNC_JOURNAL_PATH', os.path.join('.datasync', 'journal.sqlite'))
+
+
+class MigrationJournal:
+    """
+    Diário local da migração entre duas orgs.
+    Guarda o mapa Id de origem -> Id de destino de todos os registros migrados e,
+    para cada objeto, o cursor do último bloco confirmado e as marcas d'água da
+    sincronização incremental. Cada bloco é gravado em uma única transação, então
+    uma execução interrompida retoma exatamente do último bloco confirmado.
+    """
+
+    def __init__(self, sf_sandbox, sf_dev, path=DEFAULT_JOURNAL_PATH):
+        self.source = org_key(sf_sandbox)
+        self.target = org_key(sf_dev)
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS id_map (
+                source_org TEXT NOT NULL,
+                target_org TEXT NOT NULL,
+                object TEXT NOT NULL,
+                source_id TEXT NOT NULL,
+                target_id TEXT NOT NULL,
+                PRIMARY KEY (source_org, target_org, source_id)
+            );
+            CREATE TABLE IF NOT EXISTS progress (
+                source_org TEXT NOT NULL,
+                target_org TEXT NOT NULL,
+                object TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                cursor TEXT,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source_org, target_org, object, scope)
+            );
+            CREATE TABLE IF NOT EXISTS watermarks (
+                source_org TEXT NOT NULL,
+                target_org TEXT NOT NULL,
+                object TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (source_org, target_org, object, scope, kind)
+            );
+        """)
+
+    def load_id_map(self):
+        """Carrega em memória o mapa {Id de origem: Id de destino} deste par de orgs."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_id, target_id FROM id_map WHERE source_org = ? AND target_org = ?",
+                (self.source, self.target),
+            )
+            return dict(rows)
+
+    def get_cursor(self, object_name, scope=''):
+        """Retorna (cursor, concluído) do objeto; cursor é o maior Id de origem já confirmado."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cursor, done FROM progress WHERE source_org = ? AND target_org = ? AND object = ? AND scope = ?",
+                (self.source, self.target, object_name, scope),
+            ).fetchone()
+        return (row[0], bool(row[1])) if row else (None, False)
+
+    def commit_chunk(self, object_name, mappings, cursor=None, scope='', watermark=None):
+        """
+        Grava os novos mapeamentos [(objeto, Id de origem, Id de destino)], o cursor
+        e a marca d'água de alterações (`watermark`) em uma transação.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO id_map (source_org, target_org, object, source_id, target_id) VALUES (?, ?, ?, ?, ?)",
+                [(self.source, self.target, obj, source_id, target_id) for obj, source_id, target_id in mappings],
+            )
+            if cursor is not None:
+                self._upsert_progress(object_name, scope, cursor, False)
+            if watermark is not None:
+                self._upsert_watermark(object_name, scope, 'modified', watermark)
+
+    def get_watermark(self, object_name, scope='', kind='modified'):
+        """Retorna a marca d'água do objeto ('modified' ou 'deleted'), ou None se nunca foi sincronizado."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM watermarks WHERE source_org = ? AND target_org = ? AND object = ? AND scope = ? AND kind = ?",
+                (self.source, self.target, object_name, scope, kind),
+            ).fetchone()
+        return row[0] if row else None
+
+    def commit_deletes(self, object_name, source_ids, watermark, scope=''):
+        """Remove do mapa os registros excluídos e avança a marca d'água de exclusões em uma transação."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM id_map WHERE source_org = ? AND target_org = ? AND source_id = ?",
+                [(self.source, self.target, source_id) for source_id in source_ids],
+            )
+            self._upsert_watermark(object_name, scope, 'deleted', watermark)
+
+    def mark_done(self, object_name, scope=''):
+        """Marca o objeto como concluído; uma nova execução não o extrai de novo."""
+        with self._lock, self._conn:
+            cursor, _ = self._conn.execute(
+                "SELECT cursor, done FROM progress WHERE source_org = ? AND target_org = ? AND object = ? AND scope = ?",
+                (self.source, self.target, object_name, scope),
+            ).fetchone() or (None, 0)
+            self._upsert_progress(object_name, scope, cursor, True)
+
+    def reset(self):
+        """Apaga o mapa de IDs e o progresso deste par de orgs."""
+        with self._lock, self._conn:
+            for table in ('id_map', 'progress', 'watermarks'):
+                self._conn.execute(f"DELETE FROM {table} WHERE source_org = ? AND target_org = ?", (self.source, self.target))
+
+    def _upsert_watermark(self, object_name, scope, kind, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO watermarks (source_org, target_org, object, scope, kind, value) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.source, self.target, object_name, scope, kind, value),
+        )
+
+    def _upsert_progress(self, object_name, scope, cursor, done):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO progress (source_org, target_org, object, scope, cursor, done) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.source, self.target, object_name, scope, cursor, int(done)),
+        )
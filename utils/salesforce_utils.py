@@ -1,13 +1,21 @@
+import logging
+import queue
+import re
+import threading
+
 from simple_salesforce import Salesforce
-import networkx as nx
-from colorama import Fore
 
-import matplotlib.pyplot as plt
+from simple_salesforce.exceptions import SalesforceError
+
+from utils.graph_utils import DependencyGraph
+from utils.metadata_cache import MetadataCache, org_key
+from utils.metrics import metrics
+from utils.transport import DEFAULT_POOL_SIZE, GovernedSession
 
-from simple_salesforce.exceptions import SalesforceMalformedRequest, SalesforceError
+logger = logging.getLogger(__name__)
 
-# Inicializar o cache globalmente
-cache = {}
+# Cache de describes das duas orgs, em memória e em disco
+metadata_cache = MetadataCache()
 
 # Lista de campos do sistema que devem ser ignorados
 system_fields = {
@@ -15,35 +23,174 @@ system_fields = {
     'IsDeleted', 'LastModifiedById', 'CreatedById', 'LastViewedDate', 'LastReferencedDate', 'IsActive', 'NamespacePrefix', 'OwnerId'
 }
 
+# Erros em que o campo não pode ser gravado no destino e deve ser removido do registro
+FIELD_ERROR_CODES = {'INVALID_FIELD_FOR_INSERT_UPDATE', 'INVALID_FIELD', 'INVALID_TYPE_ON_FIELD_IN_RECORD'}
+
+# As queries vão na URL do GET, que o Salesforce limita a ~16 mil bytes; mantemos cada SOQL bem abaixo disso
+SOQL_MAX_LENGTH = 10000
+# Espaço mínimo reservado à lista do IN, mesmo para objetos com muitos campos
+IN_CLAUSE_MIN_LENGTH = 2000
+
+# Tamanho dos blocos entregues pelo extrator e tamanho de página pedido ao Salesforce (2000 é o máximo do REST)
+EXTRACT_CHUNK_SIZE = 2000
+QUERY_BATCH_SIZE = 2000
+# Quantos blocos o extrator pode baixar à frente da carga
+PREFETCH_DEPTH = 2
+
+# Palavra-chave no início de uma cláusula WHERE, seguida de qualquer espaço em branco
+WHERE_KEYWORD = re.compile(r'^\s*where\b', re.IGNORECASE)
+
 # Lista de objetos de sistema que devem ser ignorados
 system_objects = ['UserRole', 'ApexClass', 'NamedCredential', 'EmailTemplate', 'Task', 'Case', 'EmailMessage', 'ContentAsset', 'AuthProvider', 'ExternalDataSource', 'StaticResource', 'AuthProvider', 'Network', 'Document', 'Folder', 'Network', 'BrandTemplate', 'ContentVersion', 'ContentBody', 'ContentDocument', 'ContentFolder', 'ContentWorkspace','UserLicense', 'Profile', 'PermissionSetAssignment', 'User' ]  # Exemplo de objetos de sistema
-def authenticate_salesforce(username, password, security_token, domain='login'):
+def authenticate_salesforce(username, password, security_token, domain='login', max_workers=None):
     # O argumento 'domain' especifica se estamos usando um ambiente de produção ('login') ou sandbox ('test')
-    sf = Salesforce(username=username, password=password, security_token=security_token, domain=domain)
+    # Cada org tem a sua sessão: pool de conexões do tamanho do número de workers, gzip, controle de taxa e backoff
+    session = GovernedSession(username, pool_size=max_workers or DEFAULT_POOL_SIZE)
+    sf = Salesforce(username=username, password=password, security_token=security_token, domain=domain, session=session)
+    session.governor.name = sf.sf_instance
+    metrics.instrument_session(sf.session, org=sf.sf_instance)
+
+    # A cota diária inicial; depois ela é acompanhada pelo cabeçalho Sforce-Limit-Info de cada resposta
+    try:
+        daily = sf.limits()['DailyApiRequests']
+        session.governor.record_usage(daily['Max'] - daily['Remaining'], daily['Max'])
+    except SalesforceError as e:
+        logger.warning("Não foi possível ler os limites de %s: %s", sf.sf_instance, e)
     return sf
 
 def get_object_fields(sf_sandbox, sf_dev, object_name):
-    """Obtém os campos do objeto especificado."""
-    fields_info_sandbox = sf_sandbox.__getattr__(object_name).describe()
-    fields_info_dev = sf_dev.__getattr__(object_name).describe()
+    """Obtém os campos do objeto que existem nas duas orgs."""
+    def compute():
+        sandbox_fields = {field['name'] for field in metadata_cache.describe(sf_sandbox, object_name)['fields']}
+        dev_fields = {field['name'] for field in metadata_cache.describe(sf_dev, object_name)['fields']}
+        # Usar apenas campos que existem em ambos os ambientes
+        return sorted(sandbox_fields & dev_fields - system_fields)
 
-    # Usar apenas campos que existem em ambos os ambientes
-    sandbox_fields = {field['name'] for field in fields_info_sandbox['fields']}
-    dev_fields = {field['name'] for field in fields_info_dev['fields']}
-    common_fields = sandbox_fields & dev_fields - system_fields
+    return metadata_cache.derived(('common_fields', org_key(sf_sandbox), org_key(sf_dev), object_name), compute)
 
-    return list(common_fields)
+def iter_query_chunks(sf, query, chunk_size=EXTRACT_CHUNK_SIZE, object_name=None):
+    """
+    Executa a query seguindo o nextRecordsUrl e entrega blocos de até `chunk_size` registros.
+    Cada página é descartada assim que seus registros são entregues, então a memória
+    fica limitada ao bloco atual independentemente do tamanho do objeto.
+    """
+    headers = {'Sforce-Query-Options': f'batchSize={QUERY_BATCH_SIZE}'}
+    labels = {'object': object_name} if object_name else {}
+    logger.debug("SOQL em %s: %s", sf.sf_instance, query)
+    with metrics.timed('query', **labels):
+        result = sf.query(query, headers=headers)
+    chunk = []
+    while True:
+        metrics.inc('rows_extracted_total', len(result['records']), **labels)
+        for record in result['records']:
+            record.pop('attributes', None)
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if result.get('done', True):
+            break
+        with metrics.timed('query', **labels):
+            result = sf.query_more(result['nextRecordsUrl'], identifier_is_url=True, headers=headers)
+    if chunk:
+        yield chunk
+
+def iter_object_records(sf, object_name, fields, where_clause="", limit=None, chunk_size=EXTRACT_CHUNK_SIZE, order_by=None):
+    """Extrai os registros de um objeto em blocos, sem carregar o resultado inteiro em memória."""
+    query = f"SELECT {', '.join(fields)} FROM {object_name} {where_clause}".strip()
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    if limit:
+        query += f" LIMIT {limit}"
+    logger.info("Extraindo registros de %s em %s", object_name, sf.sf_instance)
+    return iter_query_chunks(sf, query, chunk_size, object_name)
+
+def where_condition(where_clause):
+    """Condição de uma cláusula WHERE, sem a palavra-chave ("WHERE\tA = 1" -> "A = 1")."""
+    return WHERE_KEYWORD.sub('', where_clause or '', count=1).strip()
 
-def selectObject(sf_sandbox, object_name, fields, where_clause=""):
+def add_condition(where_clause, condition):
+    """Acrescenta uma condição a uma cláusula WHERE (que pode estar vazia)."""
+    existing = where_condition(where_clause)
+    if not existing:
+        return f"WHERE {condition}"
+    return f"WHERE ({existing}) AND {condition}"
+
+def selectObject(sf_sandbox, object_name, fields, where_clause="", limit=None):
     """Seleciona um objeto no Salesforce e retorna os registros."""
-    fields_str = ', '.join(fields)
+    records = [record for chunk in iter_object_records(sf_sandbox, object_name, fields, where_clause, limit) for record in chunk]
+    logger.debug("Número de registros encontrados em %s: %d para o objeto %s", sf_sandbox.sf_instance, len(records), object_name)
+    return records
 
-    query = f"SELECT {fields_str} FROM {object_name} {where_clause} LIMIT 1"  # Limitando a 10 registros
-    print(Fore.GREEN + f"Executando query para buscar registros de {object_name}: {query}")
-    records = sf_sandbox.query(query)['records']
-    records = [{k: v for k, v in record.items() if k != 'attributes'} for record in records]
+def prefetch(iterable, depth=PREFETCH_DEPTH):
+    """
+    Consome `iterable` em uma thread em segundo plano, mantendo até `depth` itens prontos.
+    Permite carregar um bloco enquanto as próximas páginas ainda estão sendo baixadas.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
 
-    print(Fore.BLUE + f"Número de registros encontrados em {sf_sandbox.sf_instance}: {len(records)} para o objeto {object_name}")
+def soql_quote(value):
+    """Escapa um valor para uso como literal em uma query SOQL."""
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def build_in_queries(select_clause, field, values, max_length=SOQL_MAX_LENGTH):
+    """
+    Gera queries `<select_clause> WHERE <field> IN (...)` dividindo os valores
+    para que cada query respeite o tamanho máximo.
+    """
+    prefix = f"{select_clause} WHERE {field} IN ("
+    budget = max(max_length - len(prefix), IN_CLAUSE_MIN_LENGTH)
+    chunk, length = [], 0
+    for value in sorted(values):
+        quoted = soql_quote(value)
+        if chunk and length + len(quoted) + 2 > budget:
+            yield prefix + ', '.join(chunk) + ')'
+            chunk, length = [], 0
+        chunk.append(quoted)
+        length += len(quoted) + 2
+    if chunk:
+        yield prefix + ', '.join(chunk) + ')'
+
+def select_records_in(sf, object_name, fields, field, values):
+    """Busca todos os registros cujo `field` está em `values`, usando queries IN em blocos."""
+    select_clause = f"SELECT {', '.join(fields)} FROM {object_name}"
+    records = []
+    for query in build_in_queries(select_clause, field, values):
+        for chunk in iter_query_chunks(sf, query, object_name=object_name):
+            records.extend(chunk)
+    logger.debug("Número de registros encontrados em %s: %d para o objeto %s", sf.sf_instance, len(records), object_name)
     return records
 
 def get_reference_fields(sf, object_name):
@@ -51,195 +198,160 @@ def get_reference_fields(sf, object_name):
     Retorna um dicionário com o nome do campo do objeto e o objeto de referência,
     excluindo os campos e objetos de sistema especificados.
     """
-    # Verificar se o objeto já está no cache
-    if object_name in cache:
-        return cache[object_name]
-
-    try:
-        metadata = sf.__getattr__(object_name).describe()
+    def compute():
         reference_fields = {}
-        for field in metadata['fields']:
+        for field in metadata_cache.describe(sf, object_name)['fields']:
             if field['type'] == 'reference' and field['referenceTo'] and field['name'] not in system_fields:
                 if field['referenceTo'][0] not in system_objects:
                     reference_fields[field['name']] = field['referenceTo'][0]
-        cache[object_name] = reference_fields
         return reference_fields
+
+    try:
+        return metadata_cache.derived(('reference_fields', org_key(sf), object_name), compute)
     except Exception as e:
-        print(f"Erro ao obter metadados de {object_name}: {e}")
+        logger.warning("Erro ao obter metadados de %s: %s", object_name, e)
         return {}
 
+class LoadPlan:
+    """
+    Plano de carga de um objeto no destino, compilado uma vez a partir do describe.
+    Guarda os campos que podem ser gravados na criação e a tabela de lookups a
+    remapear, e projeta cada registro em uma única passada. Campos que o Salesforce
+    ainda recusar saem do plano (`reject`), e os registros seguintes já não os enviam.
+    """
+
+    def __init__(self, object_name, fields, lookups):
+        self.object_name = object_name
+        self.fields = frozenset(fields)
+        self.lookups = dict(lookups)
+        self.rejected = frozenset()
+        self._lock = threading.Lock()
+
+    def project(self, record, id_map=None, deferred=()):
+        """
+        Monta a linha a inserir: só os campos do plano, com os lookups reescritos
+        pelo `id_map` (pais sem correspondente ficam vazios) e os lookups em
+        `deferred` vazios. Sem `id_map`, os lookups são mantidos como estão.
+        """
+        fields, lookups = self.fields, self.lookups
+        row = {}
+        for field, value in record.items():
+            if field not in fields:
+                continue
+            if value:
+                if field in deferred:
+                    value = None
+                elif id_map is not None and field in lookups:
+                    value = id_map.get(value)
+            row[field] = value
+        return row
+
+    def reject(self, fields):
+        """Remove campos do plano; retorna os que ainda faziam parte dele."""
+        with self._lock:
+            removed = set(fields) & self.fields
+            if removed:
+                self.fields = self.fields - removed
+                self.rejected = self.rejected | removed
+        return removed
+
+def get_load_plan(sf, object_name):
+    """
+    Retorna o plano de carga do objeto na org de destino: campos criáveis (sem os
+    campos de sistema) e lookups para objetos migrados. É compilado uma vez por execução.
+    """
+    def compute():
+        fields, lookups = [], {}
+        for field in metadata_cache.describe(sf, object_name)['fields']:
+            if not field['createable'] or field['name'] in system_fields:
+                continue
+            fields.append(field['name'])
+            if field['type'] == 'reference' and field['referenceTo'] and field['referenceTo'][0] not in system_objects:
+                lookups[field['name']] = field['referenceTo'][0]
+        return LoadPlan(object_name, fields, lookups)
+
+    return metadata_cache.derived(('load_plan', org_key(sf), object_name), compute)
+
+def rejected_fields(errors):
+    """Campos que o Salesforce recusou gravar, segundo os erros de uma linha."""
+    return {
+        field for error in errors
+        if (error.get('statusCode') or error.get('errorCode')) in FIELD_ERROR_CODES
+        for field in error.get('fields') or []
+    }
+
 def build_relationship_graph(sf, root_object):
-    """Cria um grafo de relacionamento a partir de um objeto raiz, excluindo campos e objetos de sistema especificados."""
-    graph = nx.MultiDiGraph()
-    visited = set()
-
-    def traverse(object_name):
-        reference_fields = get_reference_fields(sf, object_name)
-        for field_name, related_object in reference_fields.items():
-            if (object_name, field_name) not in visited:
-                visited.add((object_name, field_name))
-                graph.add_edge(object_name, related_object, field=field_name)
-                traverse(related_object)
-
-    traverse(root_object)
+    """
+    Cria um grafo de relacionamento a partir de um objeto raiz, excluindo campos e objetos de sistema especificados.
+    O esquema é percorrido em largura: os describes de cada nível são baixados
+    juntos via /composite/batch antes de o nível ser processado.
+    """
+    graph = DependencyGraph()
+    graph.add_node(root_object)
+    frontier = [root_object]
+
+    while frontier:
+        metadata_cache.prefetch(sf, frontier)
+        next_frontier = []
+        for object_name in frontier:
+            for field_name, related_object in get_reference_fields(sf, object_name).items():
+                if not graph.has_node(related_object):
+                    next_frontier.append(related_object)
+                graph.add_edge(object_name, related_object, field_name)
+        frontier = next_frontier
+
     return graph
 
+def prefetch_object_fields(sf_sandbox, sf_dev, objects):
+    """Baixa em lote os describes dos objetos nas duas orgs, antes de começar a mover dados."""
+    objects = list(objects)
+    metadata_cache.prefetch(sf_sandbox, objects)
+    metadata_cache.prefetch(sf_dev, objects)
+
 def get_edge_field_name(graph, source, target):
     """
     Retorna o nome do campo de relacionamento entre dois nós no grafo.
     """
-    if graph.has_edge(source, target):
-        return [data['field'] for u, v, data in graph.edges(source, data=True) if v == target]
-    return None
+    return graph.fields(source, target) or None
 
 def get_direct_dependencies(graph, root_object):
     """
-    Retorna um dicionário com as dependências diretas de cada objeto no grafo.
+    Retorna um dicionário com as dependências diretas de cada objeto alcançável a partir da raiz.
     """
-    visited = set()
     direct_dependencies = {}
-
-    def traverse(object_name):
-        reference_fields = graph.successors(object_name)
-        for successor in reference_fields:
-            field_names = get_edge_field_name(graph, object_name, successor)
-            if field_names:
-                for field_name in field_names:
-                    if (object_name, field_name) in visited:
-                        continue
-                    print(f"Campo de relacionamento entre {object_name} e {successor}: {field_name}")
-                    visited.add((object_name, field_name))
-                    if object_name not in direct_dependencies:
-                        direct_dependencies[object_name] = []
-                    direct_dependencies[object_name].append((field_name, successor))
-                    traverse(successor)
-
-    traverse(root_object)
+    for object_name in graph.reachable(root_object):
+        for successor in graph.successors(object_name):
+            for field_name in graph.fields(object_name, successor):
+                logger.debug("Campo de relacionamento entre %s e %s: %s", object_name, successor, field_name)
+                direct_dependencies.setdefault(object_name, []).append((field_name, successor))
     return direct_dependencies
 
-def process_record_with_dependencies(sf_sandbox, sf_dev, object_name, record, direct_dependencies, processed_records=None):
-    """
-    Processa um registro no Salesforce, navegando e inserindo dependências antes de inserir o registro principal.
-    """
-    if processed_records is None:
-        processed_records = set()
-
-    record_id = record.get('Id')
-    if record_id in processed_records:
-        print(f"Registro {record_id} já processado, evitando loop.")
-        return
-
-    processed_records.add(record_id)
-
-    for field, value in record.items():
-        # Verificar se o campo está em direct_dependencies
-        if object_name in direct_dependencies:
-            for dep_field, dep_successor in direct_dependencies[object_name]:
-                if field == dep_field and value:
-                    print(f"  -> Campo de relacionamento encontrado: {dep_field} (Objeto: {dep_successor})")
-                    # Obter os campos do objeto de dependência
-                    fields = get_object_fields(sf_sandbox, sf_dev, dep_successor)
-                    # Selecionar o registro de dependência
-                    dependent_records = selectObject(sf_sandbox, dep_successor, fields, where_clause=f" WHERE Id = '{value}' ")
-                    for dep_record in dependent_records:
-                        # Processar o registro de dependência recursivamente
-                        process_record_with_dependencies(sf_sandbox, sf_dev, dep_successor, dep_record, direct_dependencies, processed_records)
-                        # Verificar se o registro de dependência já existe no Salesforce de destino
-                        existing_records = selectObject(sf_dev, dep_successor, fields, where_clause=f" WHERE Name = '{dep_record['Name']}' ")
-                        if existing_records:
-                            print(f"Registro de dependência já existe: {existing_records[0]['Name']}")
-                            new_id = existing_records[0]['Id']
-                        else:
-                            # Tentar inserir o registro de dependência no Salesforce de destino
-                            result = try_insert_record(sf_dev, dep_successor, dep_record)
-                            new_id = result['id']
-                        # Atualizar o campo de dependência no registro principal com o novo ID
-                        record[field] = new_id
-    
-    # Verificar se o registro principal já existe no Salesforce de destino
-    if 'Id' in record:
-        existing_records = selectObject(sf_dev, object_name, ['Id', 'Name'], where_clause=f" WHERE Id = '{record['Id']}' ")
-        if existing_records:
-            print(f"Registro principal já existe: {existing_records[0]['Id']} (Nome: {existing_records[0]['Name']})")
-            return existing_records[0]
-    
-    # Tentar inserir o registro principal no Salesforce de destino
-    result = try_insert_record(sf_dev, object_name, record)
-    return result
-
 def remove_cycles(graph):
-    """Remove ciclos do grafo."""
-    try:
-        while True:
-            cycle = nx.find_cycle(graph, orientation='original')
-            if not cycle:
-                break
-            graph.remove_edge(cycle[0][0], cycle[0][1])
-    except nx.NetworkXNoCycle:
-        pass
+    """
+    Remove do grafo os lookups que formam ciclos (arestas dentro de uma mesma
+    componente fortemente conexa) e retorna {objeto: {campo: alvo}} com eles,
+    para que possam ser preenchidos depois da inserção.
+    """
+    _, deferred = graph.insertion_plan()
+    for source, fields in deferred.items():
+        for field, target in fields.items():
+            graph.remove_edge(source, target, field)
+    return deferred
 
 def find_insertion_order(graph):
-    """Determina a ordem de inserção dos objetos com base na ordenação topológica."""
-    remove_cycles(graph)
-    if not nx.is_directed_acyclic_graph(graph):
-        raise ValueError("Dependências circulares detectadas no grafo!")
-    return list(nx.topological_sort(graph))
+    """Determina a ordem topológica dos objetos: quem referencia vem antes de quem é referenciado."""
+    layers, _ = graph.insertion_plan()
+    return [obj for layer in reversed(layers) for obj in layer]
 
 def visualize_graph(graph, filename="./path.png"):
     """Desenha e salva o grafo."""
     import matplotlib.pyplot as plt
+    import networkx as nx
+    graph = graph.to_networkx()
     plt.figure(figsize=(10, 6))
     pos = nx.spring_layout(graph)
-    edge_labels = {(u, v): data['field'] for u, v, key, data in graph.edges(data=True)}
+    edge_labels = {(u, v): data['field'] for u, v, key, data in graph.edges(keys=True, data=True)}
     nx.draw(graph, pos, with_labels=True, node_color="lightblue", edge_color="gray", node_size=3000, font_size=10)
     nx.draw_networkx_edge_labels(graph, pos, edge_labels=edge_labels)
     plt.savefig(filename)
     plt.show()
-
-def try_insert_record(sf, object_name, record, max_attempts=3):
-    """
-    Tenta inserir um registro no Salesforce até um máximo de tentativas.
-    Se ocorrer um erro de campo, remove o campo problemático e tenta novamente.
-    """
-    attempt = 0
-    problematic_fields = set()
-
-    while attempt < max_attempts:
-        try:
-            record = {k: v for k, v in record.items() if k not in problematic_fields}
-            record['Id'] = None  # Forçar a criação de um novo registro
-
-            result = sf.__getattr__(object_name).create(record)
-            if result['success']:
-                print(Fore.GREEN + f"Registro inserido com sucesso: {result['id']}")
-                print(Fore.MAGENTA + f"Dados inseridos: {record}")  # Novo print colorido
-                return result;  # Sair do loop se a inserção for bem-sucedida
-            else:
-                print(Fore.RED + f"Erro ao inserir registro: {result['errors']}")
-                # Adicionar campos problemáticos à lista
-                for error in result['errors']:
-                    if 'fields' in error:
-                        problematic_fields.update(error['fields'])
-            return result
-        except SalesforceMalformedRequest as e:
-            print(Fore.RED + f"Erro ao processar registro: {str(e)}")
-            # Extrair campos problemáticos da mensagem de erro
-            if 'Unable to create/update fields:' in str(e):
-                error_fields = str(e).split('Unable to create/update fields:')[1].split('.')[0].strip().split(', ')
-                problematic_fields.update(error_fields)
-            elif 'INSUFFICIENT_ACCESS_ON_CROSS_REFERENCE_ENTITY' in str(e):
-                print(Fore.YELLOW + "Erro de permissão detectado. Ignorando este registro.")
-                break  # Sair do loop, pois não podemos inserir este registro devido a restrições de permissão
-            elif 'DUPLICATE_VALUE' in str(e):
-                print(Fore.YELLOW + "Valor duplicado detectado. Ignorando este registro.")
-                return selectObject(sf, object_name, ['Id'], where_clause=f" WHERE Name = '{record['Name']}' ")[0]
-        except SalesforceError as e:
-            print(Fore.RED + f"Erro do Salesforce: {str(e)}")
-            if 'INSUFFICIENT_ACCESS_OR_READONLY' in str(e):
-                print(Fore.YELLOW + "Erro de permissão detectado. Ignorando este registro.")
-                break  # Sair do loop, pois não podemos inserir este registro devido a restrições de permissão
-            else:
-                print("Erro desconhecido, não há campos para remover.")
-                break
-        attempt += 1
-    raise Exception(f"Falha ao inserir o registro após {max_attempts} tentativas.")
\ No newline at end of file
@@ -0,0 +1,160 @@
+# utils/staging.py
+
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.metadata_cache import org_key
+
+# Diretório da área de staging; cada org de origem e objeto raiz tem o seu subdiretório
+DEFAULT_STAGING_PATH = os.environ.get('DATASYNC_STAGING_PATH', os.path.join('.datasync', 'staging'))
+
+# Linhas lidas de cada vez dos arquivos Parquet
+READ_BATCH_SIZE = 2000
+
+# Tipos do describe com coluna própria no Parquet; os demais (textos, datas, Ids...) vão como texto
+ARROW_TYPES = {
+    'boolean': pa.bool_(),
+    'int': pa.int64(),
+    'long': pa.int64(),
+    'double': pa.float64(),
+    'currency': pa.float64(),
+    'percent': pa.float64(),
+}
+# Campos compostos (endereço, geolocalização) repetem os campos que os formam e não podem ser gravados
+COMPOUND_TYPES = {'address', 'location'}
+
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+class StagingArea:
+    """
+    Área de staging local da extração de um objeto raiz, com o filtro `scope` (cláusula WHERE).
+    Cada bloco extraído do objeto raiz é gravado, com as dependências coletadas
+    para ele, em um arquivo Parquet por objeto; o manifest registra os blocos na
+    ordem de extração e o cursor (maior Id raiz) de cada um. A carga lê os
+    arquivos de volta por mapeamento em memória, sem tocar na org de origem, e
+    pode ser repetida quantas vezes for preciso e em mais de uma org de destino.
+    """
+
+    def __init__(self, sf_sandbox, object_name, path=DEFAULT_STAGING_PATH, scope=''):
+        self.source = org_key(sf_sandbox)
+        self.object_name = object_name
+        self.scope = scope
+        # Cada filtro do mesmo objeto tem o seu diretório
+        name = _safe_name(object_name) + (f"-{hashlib.sha1(scope.encode('utf-8')).hexdigest()[:10]}" if scope else '')
+        self.directory = os.path.join(path, _safe_name(self.source), name)
+        self._manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {'source': self.source, 'object': self.object_name, 'scope': self.scope, 'chunks': [], 'done': False}
+
+    def _write_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self._manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self._manifest_path)
+
+    @property
+    def cursor(self):
+        """Maior Id raiz já gravado, ou None se nada foi extraído."""
+        chunks = self.manifest['chunks']
+        return chunks[-1]['cursor'] if chunks else None
+
+    @property
+    def done(self):
+        return self.manifest['done']
+
+    def write_chunk(self, cursor, collected, describes):
+        """
+        Grava um bloco: {objeto: {Id: registro}} vira um arquivo Parquet por objeto,
+        com colunas tipadas a partir dos `describes` ({objeto: describe} da origem).
+        O manifest só passa a citar o bloco depois que todos os arquivos foram gravados.
+        """
+        index = len(self.manifest['chunks'])
+        parts = {}
+        for object_name, records in collected.items():
+            if not records:
+                continue
+            relative_path = os.path.join(_safe_name(object_name), f'part-{index:05d}.parquet')
+            path = os.path.join(self.directory, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            schema = arrow_schema(describes[object_name], records.values())
+            table = pa.Table.from_pylist(list(records.values()), schema=schema)
+            pq.write_table(table, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            parts[object_name] = {'path': relative_path, 'rows': len(records)}
+
+        self.manifest['chunks'].append({'cursor': cursor, 'parts': parts})
+        self._write_manifest()
+
+    def mark_done(self):
+        """Marca a extração como completa."""
+        self.manifest['done'] = True
+        self._write_manifest()
+
+    def reset(self):
+        """Apaga os arquivos e o manifest desta extração."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.manifest = self._read_manifest()
+
+    def has_cursor(self, cursor):
+        """Indica se `cursor` é o cursor de um dos blocos gravados."""
+        return any(chunk['cursor'] == cursor for chunk in self.manifest['chunks'])
+
+    def staged_ids(self):
+        """Retorna {objeto: Ids já gravados}, lendo só a coluna Id dos arquivos."""
+        staged = {}
+        for chunk in self.manifest['chunks']:
+            for object_name, part in chunk['parts'].items():
+                table = pq.read_table(os.path.join(self.directory, part['path']), columns=['Id'], memory_map=True)
+                staged.setdefault(object_name, set()).update(table.column('Id').to_pylist())
+        return staged
+
+    def iter_chunks(self, after=None):
+        """
+        Lê os blocos na ordem de extração e entrega (cursor, {objeto: {Id: registro}}).
+        Com `after`, pula os blocos até o de cursor `after`, inclusive (já carregados);
+        um `after` que não é o cursor de nenhum bloco gera ValueError.
+        Os arquivos são mapeados em memória e lidos em lotes de `READ_BATCH_SIZE` linhas.
+        """
+        chunks = self.manifest['chunks']
+        if after is not None:
+            cursors = [chunk['cursor'] for chunk in chunks]
+            if after not in cursors:
+                raise ValueError(f"O cursor {after} não corresponde a nenhum bloco gravado em {self.directory}")
+            chunks = chunks[cursors.index(after) + 1:]
+
+        for chunk in chunks:
+            collected = {}
+            for object_name, part in chunk['parts'].items():
+                records = collected.setdefault(object_name, {})
+                with pa.memory_map(os.path.join(self.directory, part['path'])) as source:
+                    for batch in pq.ParquetFile(source).iter_batches(batch_size=READ_BATCH_SIZE):
+                        for record in batch.to_pylist():
+                            records[record['Id']] = record
+            yield chunk['cursor'], collected
+
+
+def arrow_schema(describe, records):
+    """
+    Esquema Arrow de um bloco: os campos do describe presentes em algum dos `records`,
+    na ordem do describe e com os tipos dele. Campos que faltam em um registro ficam nulos.
+    """
+    present = set().union(*(record.keys() for record in records))
+    return pa.schema([
+        (field['name'], ARROW_TYPES.get(field['type'], pa.string()))
+        for field in describe['fields'] if field['name'] in present and field['type'] not in COMPOUND_TYPES
+    ])
@@ -1,31 +1,45 @@
 # utils/storage_utils.py
 
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tamanho cobrado pelo Salesforce por registro, na maioria dos objetos (KB)
+DEFAULT_RECORD_SIZE_KB = 2
+
+# Exceções documentadas pelo Salesforce para o armazenamento de dados (KB por registro)
+RECORD_SIZE_KB = {
+    'Campaign': 8,
+    'CampaignMember': 1,
+    'KnowledgeArticleVersion': 4,
+}
+
+# Sufixos de objetos com regra própria: versões de artigo contam 4 KB, big objects não contam no armazenamento de dados
+SUFFIX_RECORD_SIZE_KB = {
+    '__kav': 4,
+    '__b': 0,
+}
+
+
 # Função para obter o armazenamento restante na org de destino
 def get_storage_limits(sf):
     # A consulta da API 'limits' retorna vários limites, incluindo armazenamento
     limits = sf.limits()
     storage_used = limits['DataStorageMB']['Max'] - limits['DataStorageMB']['Remaining']
     storage_remaining = limits['DataStorageMB']['Remaining']
-    print(f"Armazenamento utilizado: {storage_used} MB")
-    print(f"Armazenamento restante: {storage_remaining} MB")
+    logger.info("Armazenamento utilizado: %s MB", storage_used)
+    logger.info("Armazenamento restante: %s MB", storage_remaining)
     return storage_remaining
 
-# Função para estimar o tamanho dos dados (em MB)
-def estimate_data_size(records):
-    # Estimar o tamanho de cada registro em 3 KB
-    estimated_size_per_record_kb = 3  # Assumido como uma média
-    total_records = len(records)
-    total_size_kb = total_records * estimated_size_per_record_kb
-    total_size_mb = total_size_kb / 1024  # Converter para MB
-    return total_size_mb
-
-def get_storage_limits(sf):
-    """Obtém o limite de armazenamento restante em MB."""
-    # Esta é uma implementação simplificada. Você pode precisar ajustar conforme a API do Salesforce
-    limits = sf.limits()
-    return limits['DataStorageMB']['Remaining']
+def record_size_kb(object_name):
+    """Retorna quantos KB de armazenamento de dados um registro do objeto consome."""
+    if object_name in RECORD_SIZE_KB:
+        return RECORD_SIZE_KB[object_name]
+    for suffix, size_kb in SUFFIX_RECORD_SIZE_KB.items():
+        if object_name.endswith(suffix):
+            return size_kb
+    return DEFAULT_RECORD_SIZE_KB
 
-def estimate_data_size(records):
-    """Estima o tamanho dos dados em MB."""
-    # Esta é uma estimativa muito simplificada. Você pode precisar de uma implementação mais precisa
-    return len(str(records)) / (1024 * 1024)
+def estimate_storage_mb(object_name, record_count):
+    """Estima o armazenamento de dados (em MB) que `record_count` registros do objeto vão ocupar."""
+    return record_count * record_size_kb(object_name) / 1024
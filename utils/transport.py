@@ -0,0 +1,225 @@
+# utils/transport.py
+
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Teto de chamadas por segundo em cada org; o governador reduz a taxa quando a org dá sinais de saturação
+MAX_REQUESTS_PER_SECOND = float(os.environ.get('DATASYNC_MAX_RPS', 25))
+MIN_REQUESTS_PER_SECOND = 0.5
+# Abaixo desta fração da cota diária restante a taxa cai proporcionalmente
+BUDGET_SLOWDOWN = 0.2
+# Fração da cota diária que nunca é consumida: outras integrações da org continuam funcionando
+BUDGET_RESERVE = float(os.environ.get('DATASYNC_API_RESERVE', 0.05))
+# Recuperação da taxa depois de um sinal de saturação: fração do teto recuperada a cada sucesso
+RECOVERY_STEP = 0.02
+
+# Conexões mantidas abertas por org quando o número de workers não é informado
+DEFAULT_POOL_SIZE = 10
+
+# Tentativas extras para falhas transitórias e limites do backoff exponencial (segundos)
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+
+# Corpos de requisição a partir deste tamanho são enviados com gzip
+COMPRESS_MIN_BYTES = 64 * 1024
+
+TRANSIENT_STATUS = {502, 503, 504}
+# Falhas do gateway: o Salesforce pode ter gravado antes de a resposta se perder
+AMBIGUOUS_STATUS = {502, 504}
+# Métodos que podem ser repetidos depois de uma falha de conexão ou do gateway sem risco de gravar duas vezes
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+LIMIT_INFO_PATTERN = re.compile(r'api-usage=(\d+)/(\d+)')
+
+
+class ApiBudgetExhausted(Exception):
+    """A cota diária de chamadas da org chegou à reserva configurada."""
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Espera antes da tentativa `attempt` (0, 1, ...): exponencial com jitter completo."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ApiGovernor:
+    """
+    Balde de fichas que limita a taxa de chamadas a uma org.
+    A taxa parte de `max_rate` e é ajustada por dois sinais: a cota diária
+    (Sforce-Limit-Info em cada resposta, DailyApiRequests no início), que reduz a
+    taxa quando está acabando e interrompe a execução ao chegar à reserva; e as
+    respostas de saturação (503, REQUEST_LIMIT_EXCEEDED, UNABLE_TO_LOCK_ROW), que
+    cortam a taxa pela metade, recuperada aos poucos a cada sucesso.
+    """
+
+    def __init__(self, name, max_rate=MAX_REQUESTS_PER_SECOND, reserve=BUDGET_RESERVE):
+        self.name = name
+        self.max_rate = max_rate
+        self.reserve = reserve
+        self.rate = max_rate
+        self.used = None
+        self.limit = None
+        self._capacity = max(1.0, max_rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._budget_factor = 1.0
+        self._congestion = 1.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Reserva uma ficha e espera até ela estar disponível."""
+        with self._lock:
+            if self.limit and self.limit - self.used <= self.limit * self.reserve:
+                raise ApiBudgetExhausted(
+                    f"{self.name}: {self.used} de {self.limit} chamadas diárias usadas; a reserva de "
+                    f"{self.reserve:.0%} fica para outras integrações. Retome a migração mais tarde."
+                )
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            metrics.observe('api_throttle_seconds', wait, org=self.name)
+            time.sleep(wait)
+
+    def record_usage(self, used, limit):
+        """Atualiza o consumo da cota diária e a taxa derivada dela."""
+        with self._lock:
+            self.used, self.limit = used, limit
+            remaining = (limit - used) / limit if limit else 1.0
+            self._budget_factor = min(1.0, remaining / BUDGET_SLOWDOWN)
+            self._apply_rate()
+
+    def record_limit_info(self, header):
+        """Lê o cabeçalho Sforce-Limit-Info (ex.: 'api-usage=25/15000')."""
+        match = LIMIT_INFO_PATTERN.search(header)
+        if match:
+            self.record_usage(int(match.group(1)), int(match.group(2)))
+
+    def on_success(self):
+        with self._lock:
+            if self._congestion < 1.0:
+                self._congestion = min(1.0, self._congestion + RECOVERY_STEP)
+                self._apply_rate()
+
+    def on_throttled(self):
+        with self._lock:
+            self._congestion = max(MIN_REQUESTS_PER_SECOND / self.max_rate, self._congestion / 2)
+            self._apply_rate()
+        logger.debug("%s: taxa reduzida para %.1f chamadas/s", self.name, self.rate)
+
+    def _apply_rate(self):
+        self.rate = max(MIN_REQUESTS_PER_SECOND, self.max_rate * self._budget_factor * self._congestion)
+
+
+def is_transient(response, method='GET'):
+    """
+    Indica se a resposta é uma falha transitória, que vale repetir depois de uma espera.
+    503, REQUEST_LIMIT_EXCEEDED de concorrência e UNABLE_TO_LOCK_ROW garantem que nada
+    foi gravado; 502 e 504 não, então só são repetidos para métodos idempotentes.
+    """
+    if response.status_code in AMBIGUOUS_STATUS:
+        return method.upper() in IDEMPOTENT_METHODS
+    if response.status_code in TRANSIENT_STATUS:
+        return True
+    if response.status_code not in (400, 403, 500):
+        return False
+    try:
+        errors = response.json()
+    except ValueError:
+        return False
+    errors = [error for error in (errors if isinstance(errors, list) else [errors]) if isinstance(error, dict)]
+    codes = {error.get('errorCode') for error in errors}
+    if 'UNABLE_TO_LOCK_ROW' in codes:
+        return True
+    # O limite de requisições concorrentes passa; o da cota diária (TotalRequests) não
+    return 'REQUEST_LIMIT_EXCEEDED' in codes and not any('TotalRequests' in (error.get('message') or '') for error in errors)
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+
+
+class GovernedSession(requests.Session):
+    """
+    Sessão HTTP de uma org com conexões keep-alive reaproveitadas (pool do tamanho
+    do número de workers), respostas e corpos grandes comprimidos com gzip, taxa
+    controlada pelo `ApiGovernor` e novas tentativas com backoff exponencial e
+    jitter apenas para falhas transitórias.
+    """
+
+    def __init__(self, name, pool_size=DEFAULT_POOL_SIZE, max_retries=MAX_RETRIES, governor=None):
+        super().__init__()
+        self.governor = governor or ApiGovernor(name)
+        self.max_retries = max_retries
+        # As novas tentativas são feitas aqui, onde o governador fica sabendo de cada uma
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers['Accept-Encoding'] = 'gzip'
+
+    def request(self, method, url, *args, **kwargs):
+        _compress_body(kwargs)
+        for attempt in range(self.max_retries + 1):
+            self.governor.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if method.upper() not in IDEMPOTENT_METHODS or attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                reason = type(e).__name__
+            else:
+                limit_info = response.headers.get('Sforce-Limit-Info')
+                if limit_info:
+                    self.governor.record_limit_info(limit_info)
+                if attempt == self.max_retries or not is_transient(response, method):
+                    if response.status_code < 300:
+                        self.governor.on_success()
+                    return response
+                self.governor.on_throttled()
+                delay = max(_retry_after(response), backoff_delay(attempt))
+                reason = response.status_code
+
+            metrics.inc('api_retries_total', org=self.governor.name)
+            logger.debug("%s %s falhou (%s); nova tentativa em %.1fs", method, url, reason, delay)
+            time.sleep(delay)
+
+
+def _compress_body(kwargs):
+    """Comprime com gzip corpos de requisição grandes (o Salesforce aceita Content-Encoding: gzip)."""
+    body = kwargs.get('data')
+    if body is None and kwargs.get('json') is not None:
+        body = json.dumps(kwargs['json']).encode('utf-8')
+        content_type = 'application/json'
+    else:
+        content_type = None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes) or len(body) < COMPRESS_MIN_BYTES:
+        return
+
+    headers = dict(kwargs.get('headers') or {})
+    headers['Content-Encoding'] = 'gzip'
+    if content_type:
+        headers.setdefault('Content-Type', content_type)
+        kwargs.pop('json')
+    kwargs['headers'] = headers
+    kwargs['data'] = gzip.compress(body)